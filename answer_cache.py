@@ -0,0 +1,215 @@
+"""
+Cache câu trả lời cho app hỏi đáp: câu hỏi lặp lại được trả lời ngay, không gọi webhook.
+
+- Khớp chính xác: hash của câu hỏi đã chuẩn hoá (chữ thường, bỏ dấu câu/khoảng trắng thừa).
+- Khớp gần giống: cosine TF-IDF (text_vectors.py) giữa câu hỏi mới và các câu đã cache,
+  nhân ma trận NumPy một lần cho tất cả; đạt ANSWER_CACHE_THRESHOLD thì dùng lại câu trả
+  lời. So khớp trên dạng bỏ dấu nên câu gõ không dấu khớp với câu có dấu đã cache.
+  Hai câu chứa số khác nhau (giá, mã sản phẩm...) hoặc khác phủ định ("shop có nhận thẻ
+  không" / "shop không nhận thẻ à") không bao giờ được coi là giống.
+  So khớp theo từ nên hai câu chỉ khác một từ khoá ("mở cửa" / "đóng cửa") vẫn có điểm
+  khá cao (~0.8): hạ ngưỡng để bắt nhiều cách hỏi hơn thì phải chấp nhận rủi ro này.
+- Câu hỏi quá ngắn (dưới ANSWER_CACHE_MIN_WORDS từ, thường phụ thuộc ngữ cảnh như
+  "còn gì nữa?") và câu trả lời lỗi không được cache.
+- Cache dùng chung mọi session nên chỉ áp dụng cho câu hỏi mở đầu hội thoại: session đã có
+  lượt trước (context có summary/recentMessages) thì không đọc cũng không ghi cache, vì
+  câu nối tiếp như "còn cái thứ hai thì sao?" phụ thuộc vào hội thoại của chính session đó.
+- Entry hết hạn theo TTL, vượt ANSWER_CACHE_MAX_ENTRIES thì bỏ entry ít dùng nhất (LRU).
+
+Cache nằm trong bộ nhớ của process; số hit/miss xem qua stats() hoặc /metrics.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from metrics import Counter
+from text_vectors import VECTOR_DIM, normalize_text, vectorize
+
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", 24 * 60 * 60))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.85"))
+ANSWER_CACHE_MIN_WORDS = int(os.environ.get("ANSWER_CACHE_MIN_WORDS", "3"))
+
+ANSWER_CACHE_LOOKUPS = Counter(
+    "answer_cache_lookups", "Tra cứu cache câu trả lời (exact / semantic / miss / skipped)", ["result"]
+)
+ANSWER_CACHE_EVICTIONS = Counter("answer_cache_evictions", "Entry bị bỏ khỏi cache câu trả lời", ["reason"])
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    created_at: float
+    slot: int
+    numbers: frozenset
+    polarity: tuple
+    hits: int = 0
+
+
+@dataclass
+class AnswerMatch:
+    answer: str
+    question: str
+    kind: str  # "exact" hoặc "semantic"
+    score: float
+
+
+# "khong" đã được tokenize đổi thành "không"; "chua" gõ không dấu thì tính luôn
+_NEGATIONS = {"không", "chưa", "chẳng", "chả", "đừng", "chua"}
+
+
+def _numbers(normalized: str) -> frozenset:
+    return frozenset(word for word in normalized.split() if any(ch.isdigit() for ch in word))
+
+
+def _polarity(normalized: str) -> tuple:
+    """Các từ phủ định trong câu, trừ từ cuối câu (trợ từ hỏi của "có ... không", "đã ... chưa")"""
+    words = normalized.split()
+    return tuple(word for word in words[:-1] if word in _NEGATIONS)
+
+
+def _has_history(context: dict) -> bool:
+    """Session đã có lượt chat trước câu hỏi này"""
+    return bool(context and (context.get("summary") or context.get("recentMessages")))
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        min_words: int = ANSWER_CACHE_MIN_WORDS,
+        dim: int = VECTOR_DIM,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.min_words = min_words
+        self.dim = dim
+        # Mỗi entry giữ một hàng cố định của ma trận tf; hàng trống được dùng lại
+        self._tf = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._df = np.zeros(dim, dtype=np.float32)
+        self._weighted = None  # tf * idf đã chuẩn hoá, tính lại khi cache thay đổi
+        self._entries = OrderedDict()  # key → CachedAnswer, theo thứ tự LRU
+        self._slot_keys = {}
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+        self._stats = {"exact": 0, "semantic": 0, "miss": 0, "skipped": 0}
+        self._evicted = {"ttl": 0, "lru": 0}
+        self._lock = threading.Lock()
+
+    def get(self, question: str, context: dict = None) -> AnswerMatch:
+        """Câu trả lời đã cache cho câu hỏi này (hoặc câu gần giống), ngược lại None
+
+        context: context hội thoại của session (ChatSession.context()) trước câu hỏi này
+        """
+        normalized = normalize_text(question)
+        if len(normalized.split()) < self.min_words or _has_history(context):
+            self._count("skipped")
+            return None
+        key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._expire_locked()
+            entry = self._entries.get(key)
+            if entry is not None:
+                return self._hit_locked(key, entry, "exact", 1.0)
+            if not self._entries:
+                self._count("miss")
+                return None
+            query = vectorize(normalized, self.dim) * self._idf_locked()
+            norm = np.linalg.norm(query)
+            if not norm:
+                self._count("miss")
+                return None
+            scores = self._weighted_locked() @ (query / norm)
+            numbers = _numbers(normalized)
+            polarity = _polarity(normalized)
+            # Xét theo điểm giảm dần, bỏ qua câu có số khác hoặc khác phủ định
+            for slot in np.argsort(scores)[::-1][:5]:
+                score = float(scores[slot])
+                if score < self.threshold:
+                    break
+                key = self._slot_keys.get(int(slot))
+                entry = self._entries.get(key) if key is not None else None
+                if entry is not None and entry.numbers == numbers and entry.polarity == polarity:
+                    return self._hit_locked(key, entry, "semantic", score)
+            self._count("miss")
+            return None
+
+    def put(self, question: str, answer: str, context: dict = None):
+        normalized = normalize_text(question)
+        if len(normalized.split()) < self.min_words or _has_history(context):
+            return
+        if not answer or str(answer).startswith("Error:"):
+            return
+        key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            if not self._free_slots:
+                self._remove_locked(next(iter(self._entries)), "lru")
+            slot = self._free_slots.pop()
+            self._tf[slot] = vectorize(normalized, self.dim)
+            self._df += self._tf[slot] > 0
+            self._entries[key] = CachedAnswer(
+                question, str(answer), time.time(), slot, _numbers(normalized), _polarity(normalized)
+            )
+            self._slot_keys[slot] = key
+            self._weighted = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = sum(self._stats.values()) - self._stats["skipped"]
+            hits = self._stats["exact"] + self._stats["semantic"]
+            return {
+                **self._stats,
+                "evicted": dict(self._evicted),
+                "entries": len(self._entries),
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+    def _count(self, result: str):
+        self._stats[result] += 1
+        ANSWER_CACHE_LOOKUPS.labels(result=result).inc()
+
+    def _hit_locked(self, key: str, entry: CachedAnswer, kind: str, score: float) -> AnswerMatch:
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self._count(kind)
+        return AnswerMatch(entry.answer, entry.question, kind, score)
+
+    def _idf_locked(self) -> np.ndarray:
+        count = len(self._entries)
+        return np.log((1 + count) / (1 + self._df)) + 1
+
+    def _weighted_locked(self) -> np.ndarray:
+        if self._weighted is None:
+            weighted = self._tf * self._idf_locked()
+            norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            self._weighted = weighted / norms
+        return self._weighted
+
+    def _expire_locked(self):
+        cutoff = time.time() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            self._remove_locked(key, "ttl")
+
+    def _remove_locked(self, key: str, reason: str = None):
+        entry = self._entries.pop(key)
+        if reason:
+            self._evicted[reason] += 1
+            ANSWER_CACHE_EVICTIONS.labels(reason=reason).inc()
+        self._df -= self._tf[entry.slot] > 0
+        self._tf[entry.slot] = 0
+        del self._slot_keys[entry.slot]
+        self._free_slots.append(entry.slot)
+        self._weighted = None
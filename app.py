@@ -1,22 +1,48 @@
 """
 Streamlit Video Generator - Tạo video từ prompt qua n8n
 Nhập prompt → Gọi n8n → Sinh video → Hiển thị
+
+Gọi n8n, tải và lưu video nằm trong video_service.py (dùng chung với HTTP API ở
+video_api.py); file này chỉ lo phần giao diện.
 """
 
 import streamlit as st
-import requests
+import streamlit.components.v1 as components
 import os
 from pathlib import Path
 import time
 import json
-import threading
+import html
+import hashlib
+import uuid
+
+import metrics
+from async_runtime import run_coroutine
+from batch import BATCH_CONCURRENCY, BATCH_RATE, completed_row_ids, load_rows, run_batch
+from jobs import JOB_FAILED, JOB_QUEUED, JOB_SUCCEEDED
+from log_utils import get_logger, set_correlation_id
+from tracing import begin_span, set_current_span
+from media_server import MediaServer
+from renditions import master_playlist
+from resources import ensure_dir, script_timer, style_tag
+from scheduler import PRIORITY_LABELS
+from thumbnails import ThumbnailPipeline
+from video_api import VideoAPI, can_expose
+from video_service import VideoService, shared_service
+import sidecar
 
 # ============================================
 # CẤU HÌNH N8N - THAY ĐỔI Ở ĐÂY
 # ============================================
 N8N_WEBHOOK_URL = st.secrets.get("WEBHOOK_URL")
+# URL mà n8n dùng để gọi lại khi render xong (trỏ tới sidecar), bỏ trống nếu workflow trả kết quả đồng bộ
+JOB_CALLBACK_BASE_URL = st.secrets.get("JOB_CALLBACK_BASE_URL")
+# URL công khai của sidecar để trình duyệt xem/tải video (qua Traefik khi deploy)
+MEDIA_BASE_URL = st.secrets.get("MEDIA_BASE_URL", f"http://localhost:{sidecar.SIDECAR_PORT}")
 # ============================================
 
+log = get_logger("app")
+
 # Cấu hình trang
 st.set_page_config(
     page_title="AI Video Generator",
@@ -25,275 +51,44 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Tạo thư mục lưu video
-VIDEO_DIR = Path("generated_videos")
-VIDEO_DIR.mkdir(exist_ok=True)
+# Thư mục lưu video (tạo một lần mỗi process)
+VIDEO_DIR = ensure_dir("generated_videos")
+# File prompt + manifest của các batch tải lên từ UI
+BATCH_DIR = VIDEO_DIR / ".batches"
 
-# CSS tùy chỉnh
-st.markdown("""
-    <style>
-    .main-header {
-        text-align: center;
-        padding: 40px;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border-radius: 20px;
-        margin-bottom: 30px;
-        box-shadow: 0 10px 30px rgba(0,0,0,0.2);
-    }
-    .main-header h1 {
-        color: white;
-        margin: 0;
-        font-size: 3em;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-    }
-    .main-header p {
-        color: rgba(255,255,255,0.9);
-        margin-top: 10px;
-        font-size: 1.2em;
-    }
-    .stButton>button {
-        width: 100%;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        border-radius: 10px;
-        padding: 15px;
-        font-weight: bold;
-        font-size: 18px;
-        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.4);
-        transition: all 0.3s ease;
-    }
-    .stButton>button:hover {
-        background: linear-gradient(135deg, #764ba2 0%, #667eea 100%);
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(102, 126, 234, 0.6);
-    }
-    .prompt-box {
-        padding: 25px;
-        background: linear-gradient(135deg, #a78bfa 0%, #8b5cf6 100%);
-        border-radius: 15px;
-        margin: 20px 0;
-        border-left: 5px solid #667eea;
-        box-shadow: 0 4px 10px rgba(0,0,0,0.1);
-        color: white;
-    }
-    .video-card {
-        padding: 25px;
-        background: white;
-        border-radius: 15px;
-        margin: 20px 0;
-        box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-        border-top: 4px solid #667eea;
-    }
-    .success-box {
-        padding: 20px;
-        background: linear-gradient(135deg, #d4edda 0%, #c3e6cb 100%);
-        border-radius: 12px;
-        border-left: 5px solid #28a745;
-        margin: 20px 0;
-        box-shadow: 0 4px 10px rgba(0,0,0,0.1);
-    }
-    .info-section {
-        background: #f8f9fa;
-        padding: 20px;
-        border-radius: 10px;
-        margin: 15px 0;
-    }
-    .progress-container {
-        background: white;
-        padding: 25px;
-        border-radius: 15px;
-        margin: 20px 0;
-        box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-        border-left: 5px solid #667eea;
-    }
-    .progress-text {
-        text-align: center;
-        font-size: 18px;
-        font-weight: bold;
-        color: #667eea;
-        margin-top: 10px;
-    }
-    .stVideo {
-        max-width: 100% !important;
-        margin: 0 auto;
-    }
-    video {
-        width: 100% !important;
-        max-height: 600px !important;
-        object-fit: contain !important;
-    }
-    </style>
-""", unsafe_allow_html=True)
+GALLERY_PAGE_SIZES = [5, 10, 20, 50]
+# Chu kỳ fragment tiến độ đọc lại trạng thái job (chỉ đọc bộ nhớ, không gọi n8n)
+JOB_WATCH_SECONDS = 1
 
-def call_n8n_webhook(prompt: str, n8n_url: str, additional_params: dict = None) -> dict:
-    """Gọi webhook n8n để tạo video"""
-    print("\n" + "="*80)
-    print("🚀 BẮT ĐẦU GỌI N8N WEBHOOK")
-    print("="*80)
-    print(f"📝 Prompt: {prompt}")
-    print(f"🔗 URL: {n8n_url}")
-    print(f"⏰ Timestamp: {int(time.time())}")
-    
-    start_time = time.time()  # Định nghĩa trước để dùng trong exception handler
-    try:
-        # Chuẩn bị payload
-        payload = {
-            "prompt": prompt,
-            "timestamp": int(time.time())
-        }
-        
-        # Thêm các tham số bổ sung nếu có
-        if additional_params:
-            payload.update(additional_params)
-            print(f"📦 Additional params: {json.dumps(additional_params, indent=2, ensure_ascii=False)}")
-        
-        print(f"\n📤 PAYLOAD GỬI ĐI:")
-        print(json.dumps(payload, indent=2, ensure_ascii=False))
-        
-        # Gọi n8n webhook với timeout dài hơn (15 phút)
-        print(f"\n⏳ Đang gửi request đến n8n...")
-        print(f"⏱️ Timeout: 15 phút (900 giây)")
-        start_time = time.time()
-        response = requests.post(
-            n8n_url,
-            json=payload,
-            timeout=2900  # Timeout 15 phút (900 giây) để xử lý video dài
-        )
-        elapsed_time = time.time() - start_time
-        elapsed_minutes = int(elapsed_time // 60)
-        elapsed_seconds = int(elapsed_time % 60)
-        print(f"✅ Nhận được response sau {elapsed_minutes} phút {elapsed_seconds} giây ({elapsed_time:.2f} giây)")
-        print(f"📊 Status Code: {response.status_code}")
-        print(f"📋 Response Headers: {dict(response.headers)}")
-        
-        response.raise_for_status()
-        
-        # Kiểm tra response content trước khi parse
-        response_text = response.text
-        print(f"\n📥 Response text (first 500 chars): {response_text[:500]}")
-        print(f"📏 Response text length: {len(response_text)}")
-        
-        # Kiểm tra nếu response rỗng
-        if not response_text or not response_text.strip():
-            print(f"\n❌ ERROR: Response rỗng!")
-            print("="*80 + "\n")
-            return {
-                "success": False,
-                "error": "Response từ server rỗng. Vui lòng kiểm tra n8n workflow."
-            }
-        
-        # Parse response JSON
-        print(f"\n📥 Đang parse response JSON...")
-        try:
-            result = response.json()
-            print(f"✅ Parse thành công!")
-            print(f"\n📦 RESPONSE DATA:")
-            print(json.dumps(result, indent=2, ensure_ascii=False))
-            print("="*80 + "\n")
-            
-            return {
-                "success": True,
-                "data": result
-            }
-        except json.JSONDecodeError as json_err:
-            print(f"\n❌ JSON DECODE ERROR: {str(json_err)}")
-            print(f"📄 Response text: {response_text[:1000]}")
-            print("="*80 + "\n")
-            return {
-                "success": False,
-                "error": f"Response không phải JSON hợp lệ. Response: {response_text[:200]}"
-            }
-    except requests.exceptions.Timeout:
-        elapsed_time = time.time() - start_time
-        elapsed_minutes = int(elapsed_time // 60)
-        elapsed_seconds = int(elapsed_time % 60)
-        print(f"\n❌ TIMEOUT ERROR sau {elapsed_minutes} phút {elapsed_seconds} giây")
-        print(f"⏱️ Timeout limit: 15 phút (900 giây)")
-        print("="*80 + "\n")
-        return {
-            "success": False,
-            "error": f"Timeout: Quá trình xử lý mất hơn 15 phút ({elapsed_minutes} phút {elapsed_seconds} giây). Vui lòng thử lại với prompt ngắn hơn hoặc liên hệ hỗ trợ."
-        }
-    except requests.exceptions.RequestException as e:
-        print(f"\n❌ REQUEST ERROR: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"Response status: {e.response.status_code}")
-            print(f"Response text: {e.response.text[:500]}")
-        print("="*80 + "\n")
-        return {
-            "success": False,
-            "error": f"Request error: {str(e)}"
-        }
-    except Exception as e:
-        print(f"\n❌ UNEXPECTED ERROR: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback:\n{traceback.format_exc()}")
-        print("="*80 + "\n")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+HLS_PLAYER_TEMPLATE = """
+<video id="player" controls playsinline style="width: 100%; max-height: 600px; background: #000;"></video>
+<script src="https://cdn.jsdelivr.net/npm/hls.js@1"></script>
+<script>
+    var video = document.getElementById("player");
+    var masterUrl = {master_url};
+    if (video.canPlayType("application/vnd.apple.mpegurl")) {{
+        video.src = masterUrl;
+    }} else if (window.Hls && Hls.isSupported()) {{
+        var hls = new Hls({{ capLevelToPlayerSize: true }});
+        hls.loadSource(masterUrl);
+        hls.attachMedia(video);
+    }} else {{
+        video.src = {fallback_url};
+    }}
+</script>
+"""
 
-def download_video_from_url(url: str, filename: str = None) -> str:
-    """Tải video từ URL về local"""
-    print("\n" + "="*80)
-    print("📥 BẮT ĐẦU TẢI VIDEO")
-    print("="*80)
-    print(f"🔗 URL: {url}")
-    print(f"📁 Filename: {filename}")
-    
-    try:
-        if not filename:
-            filename = f"video_{int(time.time())}.mp4"
-        
-        filepath = VIDEO_DIR / filename
-        print(f"💾 Filepath: {filepath}")
-        
-        # Tải video
-        print(f"⏳ Đang gửi request GET...")
-        start_time = time.time()
-        response = requests.get(url, stream=True, timeout=120)
-        elapsed = time.time() - start_time
-        print(f"✅ Nhận được response sau {elapsed:.2f} giây")
-        print(f"📊 Status Code: {response.status_code}")
-        print(f"📋 Headers: {dict(response.headers)}")
-        
-        response.raise_for_status()
-        
-        # Lưu file
-        total_size = int(response.headers.get('content-length', 0))
-        print(f"📏 Total size: {total_size} bytes ({total_size / (1024*1024):.2f} MB)" if total_size > 0 else "📏 Total size: Unknown")
-        
-        print(f"💾 Đang lưu file...")
-        with open(filepath, 'wb') as f:
-            if total_size > 0:
-                downloaded = 0
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if downloaded % (1024 * 1024) == 0:  # Log mỗi MB
-                        print(f"  ⬇️ Đã tải: {downloaded / (1024*1024):.2f} MB / {total_size / (1024*1024):.2f} MB")
-            else:
-                f.write(response.content)
-                print(f"  ✅ Đã tải toàn bộ content")
-        
-        file_size = os.path.getsize(filepath)
-        print(f"✅ Tải thành công!")
-        print(f"📊 File size: {file_size} bytes ({file_size / (1024*1024):.2f} MB)")
-        print(f"📁 File path: {filepath}")
-        print("="*80 + "\n")
-        
-        return str(filepath)
-    except Exception as e:
-        print(f"\n❌ LỖI KHI TẢI VIDEO: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        print("="*80 + "\n")
-        st.error(f"❌ Lỗi khi tải video: {str(e)}")
-        return None
+def show_video_links(videos: list, embed: bool = False):
+    """Link gốc của từng video khi không tải được; embed=True thử nhúng iframe cho video Drive"""
+    for video in videos:
+        if embed and video.preview_url:
+            st.markdown("**Thử xem video từ Google Drive:**")
+            st.markdown(f'<iframe src="{video.preview_url}" width="100%" height="480" allow="autoplay"></iframe>', unsafe_allow_html=True)
+        else:
+            st.info(f"🔗 Link video: {video.url}")
+
+def format_size(size_bytes: int) -> str:
+    return f"{size_bytes / (1024 * 1024):.2f} MB"
 
 def get_video_size(filepath: str) -> str:
     """Lấy kích thước file"""
@@ -304,7 +99,188 @@ def get_video_size(filepath: str) -> str:
     except:
         return "N/A"
 
+# Nhãn hiển thị cho các stage mà n8n báo về
+STAGE_LABELS = {
+    "queued": "📝 Đang gửi prompt đến server...",
+    "submitted": "📝 Đã gửi prompt, đang chờ n8n xử lý...",
+    "classify": "🔍 Đang phân loại prompt...",
+    "script": "🤖 Đang tạo kịch bản video với AI...",
+    "render": "🎬 Đang render video...",
+    "upload": "☁️ Đang tải video lên Drive...",
+}
+
+# Các tài nguyên gọi ở mọi rerun: tắt spinner để lần cache hit không phải dựng element + thread
+@st.cache_resource(show_spinner=False)
+def get_service() -> VideoService:
+    """Lõi tạo video + sidecar (callback job, /media, /metrics, /api/videos) dùng chung trong process"""
+    # Hàm này chạy lại khi cache bị xoá: dùng lại service cũ, đăng ký lại route chỉ thay handler
+    service = shared_service(VIDEO_DIR, N8N_WEBHOOK_URL, callback_base_url=JOB_CALLBACK_BASE_URL, media_base_url=MEDIA_BASE_URL)
+    service.register_routes()
+    if can_expose(sidecar.SIDECAR_HOST):
+        VideoAPI(service).register_routes()
+    else:
+        # Sidecar nghe mọi địa chỉ (cổng 8503 được public): không mở API tạo video khi chưa có token
+        log.info("Không bật /api/videos: chưa đặt VIDEO_API_TOKEN", extra={"host": sidecar.SIDECAR_HOST})
+    metrics.register_routes()
+    service.start()
+    return service
+
+def get_media_server() -> MediaServer:
+    return get_service().media
+
+def get_thumbnail_pipeline() -> ThumbnailPipeline:
+    return get_service().thumbnails
+
+@st.cache_resource(show_spinner=False)
+def get_batch_runs() -> dict:
+    """batch_id -> Future của batch đang chạy nền (dùng chung mọi session)"""
+    return {}
+
+@st.fragment(run_every=5)
+def show_batch_progress(batch_id: str, rows: list, manifest_path: Path):
+    """Tiến độ batch đọc từ manifest, chỉ fragment này tự vẽ lại"""
+    done_ids = completed_row_ids(manifest_path)
+    done = sum(1 for row in rows if row["row_id"] in done_ids)
+    st.progress(done / len(rows), text=f"✅ {done}/{len(rows)} dòng thành công")
+    future = get_batch_runs().get(batch_id)
+    if future is not None and not future.done():
+        st.info("⏳ Batch đang chạy nền, có thể rời trang và quay lại sau.")
+    elif future is not None and future.exception():
+        st.error(f"❌ Batch dừng vì lỗi: {future.exception()}")
+    elif future is not None:
+        stats = future.result()
+        st.success(f"📊 Bỏ qua {stats['skipped']} · thành công {stats['succeeded']} · lỗi {stats['failed']}")
+    if manifest_path.exists():
+        st.download_button(
+            "📄 Tải manifest kết quả",
+            data=manifest_path.read_bytes(),
+            file_name=f"batch_{batch_id}.manifest.jsonl",
+            mime="application/jsonl",
+            key=f"manifest_{batch_id}",
+        )
+
+@st.fragment(run_every=JOB_WATCH_SECONDS)
+def show_job_progress(job_id: str):
+    """Tiến độ job đọc từ JobStore (không chờ), xong thì chạy lại cả trang để hiện kết quả
+
+    Fragment chạy lại mỗi JOB_WATCH_SECONDS dù stage có đổi hay không: lần chạy lại không vẽ
+    phần tử nào thì Streamlit xoá phần tử đó, nên không thể bỏ qua lần vẽ khi job.version
+    không đổi. Mỗi lần chạy chỉ đọc job từ bộ nhớ (không gọi n8n), và phần tử giống hệt lần
+    trước không gây nhấp nháy trên trình duyệt.
+    """
+    job_manager = get_service().jobs
+    job = job_manager.get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    st.markdown("""
+        <div class="progress-container">
+            <h3 style="text-align: center; color: #667eea; margin-bottom: 20px;">🎬 Đang tạo video...</h3>
+        </div>
+    """, unsafe_allow_html=True)
+    elapsed_minute = int((time.time() - job.created_at) // 60)
+    position = job_manager.queue_position(job.id) if job.status == JOB_QUEUED else None
+    if position is not None:
+        step_message = f"⏳ Đang xếp hàng: vị trí thứ {position} (ưu tiên {PRIORITY_LABELS[job.priority]})"
+    else:
+        step_message = html.escape(job.stage_message) if job.stage_message else STAGE_LABELS.get(job.stage, STAGE_LABELS["queued"])
+    st.progress(job.progress / 100)
+    st.markdown(f"""
+        <div class="progress-text">
+            {step_message} <span style="color: #764ba2;">{job.progress}%</span>
+            <br><small>⏱️ Đã chờ {elapsed_minute} phút</small>
+        </div>
+    """, unsafe_allow_html=True)
+
+def show_video_preview(video_name: str):
+    """Poster + preview ngắn cho gallery; tạo nền nếu chưa có"""
+    thumbnails = get_thumbnail_pipeline()
+    if not thumbnails.is_fresh(video_name):
+        thumbnails.submit(video_name)
+        st.info("🖼️ Đang tạo ảnh xem trước...")
+        return
+    media = get_media_server()
+    if media.available():
+        preview_url = media.url_for(thumbnails.preview_path(video_name))
+        poster_url = media.url_for(thumbnails.poster_path(video_name))
+        st.markdown(
+            f'<video src="{preview_url}" poster="{poster_url}" muted loop autoplay playsinline '
+            f'style="width: 100%; max-height: 360px; object-fit: contain; border-radius: 10px;"></video>',
+            unsafe_allow_html=True
+        )
+    else:
+        st.image(str(thumbnails.poster_path(video_name)), use_column_width=True)
+
+def show_video_player(video_path: str):
+    """Player trỏ tới sidecar (stream theo Range), không đẩy bytes qua websocket"""
+    media = get_media_server()
+    if not media.available():
+        st.video(str(video_path))
+        return
+    master = master_playlist(VIDEO_DIR, os.path.basename(video_path))
+    if master is None:
+        st.video(media.url_for(video_path))
+        return
+    # Có bản HLS: hls.js (hoặc HLS native của Safari) tự chọn rendition theo băng thông
+    components.html(HLS_PLAYER_TEMPLATE.format(
+        master_url=json.dumps(media.url_for(master)),
+        fallback_url=json.dumps(media.url_for(video_path)),
+    ), height=610)
+
+def show_download_button(video_path: str, label: str = "📥 Tải Video Về Máy", key: str = None, **kwargs):
+    """Nút tải về dạng link tới sidecar; chỉ đọc file vào bộ nhớ khi sidecar không chạy"""
+    media = get_media_server()
+    if media.available():
+        st.link_button(label, media.url_for(video_path, download=True), **kwargs)
+        return
+    with open(video_path, "rb") as f:
+        st.download_button(
+            label=label,
+            data=f.read(),
+            file_name=os.path.basename(video_path),
+            mime="video/mp4",
+            key=key,
+            **kwargs
+        )
+
+def show_video(video_path: str):
+    """Hiển thị video local kèm thông tin và nút tải xuống"""
+    log.debug("Hiển thị video", extra={"video": str(video_path)})
+    # Wrap video trong container để control size (rộng hơn)
+    video_col1, video_col2, video_col3 = st.columns([0.5, 5, 0.5])
+    with video_col2:
+        show_video_player(video_path)
+    
+    # Hiển thị thông tin
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("📁 Tên file", os.path.basename(video_path))
+    with col2:
+        st.metric("📊 Kích thước", get_video_size(video_path))
+    
+    # Nút tải xuống
+    show_download_button(video_path, use_container_width=True)
+
 def main():
+    # Thread chạy script được tái sử dụng giữa các lần rerun → xoá correlation id / span cũ
+    set_correlation_id(None)
+    set_current_span(None)
+    # CSS tùy chỉnh (assets/app.css, đọc lại khi file thay đổi)
+    st.markdown(style_tag("app.css"), unsafe_allow_html=True)
+    service = get_service()
+    job_manager = service.jobs
+    video_index = service.index
+    video_index.sync()
+    # Quota của Scheduler tính theo session
+    owner_id = st.session_state.setdefault("owner_id", uuid.uuid4().hex)
+    
+    # Mở lại job từ URL (sau khi refresh hoặc server khởi động lại) thay vì gửi lại prompt
+    url_job_id = st.query_params.get("job")
+    if url_job_id and st.session_state.get("reattached_job") != url_job_id:
+        st.session_state.reattached_job = url_job_id
+        url_job = job_manager.get(url_job_id)
+        if url_job is not None:
+            st.session_state.active_job = {"id": url_job.id, "prompt": url_job.prompt}
+    
     # Header
     st.markdown("""
         <div class="main-header">
@@ -342,18 +318,33 @@ def main():
         
         st.markdown("---")
         
-        # Thống kê
+        # Job gần đây (lưu bền vững), bấm để mở lại kết quả
+        with st.expander("🕘 Job Gần Đây"):
+            recent_jobs = job_manager.recent(5)
+            if not recent_jobs:
+                st.caption("Chưa có job nào.")
+            for recent_job in recent_jobs:
+                icon = {JOB_SUCCEEDED: "✅", JOB_FAILED: "❌"}.get(recent_job.status, "⏳")
+                if st.button(f"{icon} {recent_job.prompt[:40]}", key=f"reattach_{recent_job.id}", help=time.ctime(recent_job.created_at)):
+                    st.session_state.active_job = {"id": recent_job.id, "prompt": recent_job.prompt}
+                    st.session_state.reattached_job = recent_job.id
+                    st.query_params["job"] = recent_job.id
+        
+        st.markdown("---")
+        
+        # Thống kê (đọc từ chỉ mục, không glob thư mục)
         st.header("📊 Thống Kê")
-        saved_videos = list(VIDEO_DIR.glob("*.mp4"))
-        st.metric("Video đã tạo", len(saved_videos))
+        video_count = video_index.count()
+        st.metric("Video đã tạo", video_count)
+        queue = job_manager.scheduler.stats()
+        st.caption(f"🎛️ Đang render {queue['running']}/{queue['max_concurrent']} · chờ {queue['waiting']}")
         
-        if saved_videos and st.button("🗑️ Xóa tất cả video"):
-            for video in saved_videos:
-                video.unlink()
+        if video_count and st.button("🗑️ Xóa tất cả video"):
+            service.delete_all()
             st.rerun()
     
     # Main content
-    tab1, tab2 = st.tabs(["✨ Tạo Video Mới", "📁 Video Đã Tạo"])
+    tab1, tab2, tab3 = st.tabs(["✨ Tạo Video Mới", "📁 Video Đã Tạo", "📦 Tạo Hàng Loạt"])
     
     # Tab 1: Tạo video mới
     with tab1:
@@ -404,110 +395,59 @@ def main():
             if not prompt.strip():
                 st.error("⚠️ Vui lòng nhập prompt!")
             else:
-                # Tạo placeholder riêng cho "Đang tạo video..." để có thể clear dễ dàng
-                creating_video_placeholder = st.empty()
-                creating_video_placeholder.markdown("""
-                    <div class="progress-container">
-                        <h3 style="text-align: center; color: #667eea; margin-bottom: 20px;">🎬 Đang tạo video...</h3>
-                    </div>
-                """, unsafe_allow_html=True)
-                
-                # Tạo progress bar
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
                 # Lấy tham số tùy chỉnh
                 params = st.session_state.get("video_params", {})
                 
-                # Biến để lưu kết quả API
-                api_result = {"result": None, "done": False, "error": None}
-                
-                def call_api():
-                    """Gọi API trong thread riêng"""
-                    print("\n" + "="*80)
-                    print("🔄 THREAD: Bắt đầu gọi API")
-                    print(f"📝 Prompt: {prompt[:100]}...")
-                    print(f"🔗 URL: {N8N_WEBHOOK_URL}")
-                    print(f"📦 Params: {params}")
-                    print("="*80)
-                    try:
-                        result = call_n8n_webhook(
-                            prompt, 
-                            N8N_WEBHOOK_URL,
-                            params
-                        )
-                        print(f"\n✅ THREAD: API call thành công")
-                        print(f"📊 Result success: {result.get('success')}")
-                        api_result["result"] = result
-                    except Exception as e:
-                        print(f"\n❌ THREAD: Exception trong call_api: {str(e)}")
-                        import traceback
-                        print(traceback.format_exc())
-                        api_result["error"] = str(e)
-                        api_result["result"] = {"success": False, "error": str(e)}
-                    finally:
-                        api_result["done"] = True
-                        print(f"🏁 THREAD: Hoàn thành, done = True\n")
-                
-                # Bắt đầu gọi API trong thread riêng
-                api_thread = threading.Thread(target=call_api, daemon=True)
-                api_thread.start()
-                
-                # Progress steps với thông điệp
-                progress_steps = [
-                    (5, "📝 Đang gửi prompt đến server..."),
-                    (15, "🔍 Đang phân loại prompt..."),
-                    (30, "🤖 Đang tạo kịch bản video với AI..."),
-                    (50, "📊 Đang xử lý dữ liệu..."),
-                    (70, "🎬 Đang tạo kịch bản chi tiết..."),
-                    (85, "⏳ Đang hoàn thiện kịch bản..."),
-                    (95, "✨ Đang xử lý cuối cùng..."),
-                ]
-                
-                # Update progress bar trong khi đợi API
-                current_progress = 0
-                step_index = 0
-                start_time = time.time()
-                
-                while not api_result["done"]:
-                    # Tính progress dựa trên thời gian (tối đa 95%)
-                    elapsed = time.time() - start_time
-                    time_based_progress = min(95, int(elapsed * 2))  # Tăng 2% mỗi giây
-                    
-                    # Update progress với các bước đã định nghĩa
-                    if step_index < len(progress_steps):
-                        step_progress, step_message = progress_steps[step_index]
-                        if time_based_progress >= step_progress:
-                            current_progress = step_progress
-                            progress_bar.progress(current_progress / 100)
-                            status_text.markdown(f"""
-                                <div class="progress-text">
-                                    {step_message} <span style="color: #764ba2;">{current_progress}%</span>
-                                </div>
-                            """, unsafe_allow_html=True)
-                            step_index += 1
-                    else:
-                        # Nếu đã qua tất cả các bước, dùng time-based progress
-                        if time_based_progress > current_progress:
-                            current_progress = time_based_progress
-                            progress_bar.progress(current_progress / 100)
-                            status_text.markdown(f"""
-                                <div class="progress-text">
-                                    ⏳ Đang xử lý với AI... <span style="color: #764ba2;">{current_progress}%</span>
-                                </div>
-                            """, unsafe_allow_html=True)
-                    
-                    time.sleep(0.1)  # Update mỗi 0.1 giây
-                
-                # API đã hoàn thành
-                result = api_result["result"]
-                
-                # Clear NGAY LẬP TỨC phần "🎬 Đang tạo video..." và progress bar
-                creating_video_placeholder.empty()
-                progress_bar.empty()
-                status_text.empty()
+                # Span của thao tác trên UI; job tạo bên trong gắn vào cùng trace
+                action_span = begin_span("ui.generate_video", {"prompt.length": len(prompt), **params})
+                set_current_span(action_span)
                 
+                # Cùng prompt + params đã từng tạo → trả về ngay từ cache, ngược lại submit job
+                # (job id có ngay, việc gọi n8n chạy trên loop nền)
+                submission = service.submit(prompt, params, owner=owner_id)
+                cached = submission.cached
+                action_span.set_attribute("cache.hit", bool(cached))
+                if cached:
+                    st.markdown("""
+                        <div class="success-box">
+                            <h3 style="color: #28a745; margin: 0;">⚡ Video đã có sẵn trong cache!</h3>
+                        </div>
+                    """, unsafe_allow_html=True)
+                    st.info(f"💭 Prompt: {prompt}")
+                    show_video(cached["video_path"])
+                else:
+                    job_id = submission.job_id
+                    st.session_state.active_job = {"id": job_id, "prompt": prompt}
+                    # Giữ job id trên URL để refresh trang vẫn mở lại được job
+                    st.query_params["job"] = job_id
+                    st.session_state.reattached_job = job_id
+                    action_span.set_attribute("job.id", job_id)
+                action_span.end()
+                set_current_span(None)
+        
+        # Theo dõi job đang chạy (kể cả sau khi rerun)
+        active_job = st.session_state.get("active_job")
+        job = job_manager.get(active_job["id"]) if active_job else None
+        if active_job and job is None:
+            st.session_state.pop("active_job", None)
+            st.warning("⚠️ Không tìm thấy job trước đó. Vui lòng tạo lại video.")
+        elif job is not None:
+            set_correlation_id(job.id)
+            job_prompt = active_job["prompt"]
+            
+            if not job.finished:
+                # Tiến độ tự vẽ lại trong fragment; script chính không bị chặn nên các nút,
+                # phân trang, tab vẫn phản hồi ngay khi job đang chạy
+                show_job_progress(job.id)
+            else:
+                # Job đã hoàn thành: phần xử lý kết quả là span con trong trace của job
+                result_span = begin_span("ui.show_result", {"job.id": job.id, "job.status": job.status}, parent=job.trace_parent)
+                set_current_span(result_span)
+                result = job.to_result()
+                st.session_state.pop("active_job", None)
+            
                 if not result["success"]:
+                    result_span.set_error(result["error"])
                     st.error(f"❌ Lỗi: {result['error']}")
                 else:
                     # Hiển thị thông báo thành công
@@ -516,232 +456,159 @@ def main():
                             <h3 style="color: #28a745; margin: 0;">✅ Tạo kịch bản thành công!</h3>
                         </div>
                     """, unsafe_allow_html=True)
+                
+                    # Tìm video trong response (xem extractors.py cho các dạng được hỗ trợ)
+                    videos = service.extract(result["data"])
+                
+                    if videos:
+                        # Nhiều clip thì tải hết rồi ghép thành một video
+                        filename = service.output_filename(job, videos)
                     
-                    # Lấy URL video từ response
-                    response_data = result["data"]
-                    
-                    # Log response để debug
-                    print("\n" + "="*80)
-                    print("📥 XỬ LÝ RESPONSE DATA")
-                    print("="*80)
-                    print(f"📊 Response data type: {type(response_data).__name__}")
-                    print(f"📏 Response data length/size: {len(response_data) if hasattr(response_data, '__len__') else 'N/A'}")
-                    print(f"\n📦 FULL RESPONSE DATA:")
-                    print(json.dumps(response_data, indent=2, ensure_ascii=False))
-                    print("="*80)
-                    
-                    # Tìm URL video trong response
-                    video_url = None
-                    video_name = None
-                    
-                    print(f"\n🔍 BẮT ĐẦU TÌM VIDEO URL...")
-                    
-                    # Xử lý response có thể là array (Google Drive response)
-                    if isinstance(response_data, list):
-                        print(f"✅ Response là LIST, có {len(response_data)} phần tử")
-                        if len(response_data) > 0:
-                            # Lấy phần tử đầu tiên nếu là array
-                            drive_file = response_data[0]
-                            print(f"📄 Phần tử đầu tiên type: {type(drive_file).__name__}")
-                            if isinstance(drive_file, dict):
-                                print(f"📋 Keys trong drive_file: {list(drive_file.keys())[:10]}...")
-                                # Lấy URL từ Google Drive
-                                video_url = (
-                                    drive_file.get("webContentLink") or
-                                    drive_file.get("webViewLink") or
-                                    drive_file.get("downloadUrl")
-                                )
-                                video_name = drive_file.get("name") or drive_file.get("originalFilename")
-                                print(f"🔗 webContentLink: {drive_file.get('webContentLink')}")
-                                print(f"🔗 webViewLink: {drive_file.get('webViewLink')}")
-                                print(f"🔗 downloadUrl: {drive_file.get('downloadUrl')}")
-                                print(f"📝 name: {drive_file.get('name')}")
-                                print(f"📝 originalFilename: {drive_file.get('originalFilename')}")
-                                
-                                # Convert Google Drive view link to direct download
-                                if video_url and "drive.google.com/file/d/" in video_url:
-                                    file_id = video_url.split("/file/d/")[1].split("/")[0]
-                                    print(f"🆔 Extracted file_id: {file_id}")
-                                    video_url = f"https://drive.google.com/uc?export=download&id={file_id}"
-                                    print(f"✅ Converted to direct download: {video_url}")
-                                elif video_url and "uc?id=" in video_url:
-                                    print(f"✅ Đã là direct download link")
-                        else:
-                            print("⚠️ List rỗng!")
-                    elif isinstance(response_data, dict):
-                        print(f"✅ Response là DICT")
-                        print(f"📋 Keys: {list(response_data.keys())}")
-                        # Thử các khả năng response structure
-                        video_url = (
-                            response_data.get("webContentLink") or
-                            response_data.get("webViewLink") or
-                            response_data.get("video_url") or
-                            response_data.get("url") or
-                            response_data.get("videoUrl") or
-                            response_data.get("file_url") or
-                            response_data.get("downloadUrl")
-                        )
-                        video_name = response_data.get("name") or response_data.get("originalFilename")
-                        print(f"🔗 Tìm thấy URL: {video_url}")
-                        print(f"📝 Tìm thấy name: {video_name}")
-                        
-                        # Convert Google Drive view link to direct download
-                        if video_url and "drive.google.com/file/d/" in video_url:
-                            file_id = video_url.split("/file/d/")[1].split("/")[0]
-                            print(f"🆔 Extracted file_id: {file_id}")
-                            video_url = f"https://drive.google.com/uc?export=download&id={file_id}"
-                            print(f"✅ Converted to direct download: {video_url}")
-                    elif isinstance(response_data, str):
-                        print(f"✅ Response là STRING")
-                        video_url = response_data
-                        print(f"🔗 URL: {video_url}")
-                    else:
-                        print(f"⚠️ Response type không xác định: {type(response_data)}")
-                    
-                    # Log video URL
-                    print(f"\n📊 KẾT QUẢ TÌM KIẾM:")
-                    if video_url:
-                        print(f"✅ VIDEO URL: {video_url}")
-                        print(f"✅ VIDEO NAME: {video_name}")
-                    else:
-                        print("❌ Không tìm thấy video URL trong response!")
-                    print("="*80 + "\n")
-                    
-                    if video_url:
                         # Hiển thị thông tin video
                         st.markdown("### 🎬 Video đã được tạo!")
-                        
-                        if video_name:
-                            st.info(f"📁 Tên file: **{video_name}**")
-                        
+                    
+                        if len(videos) > 1:
+                            st.info(f"🎞️ Response có **{len(videos)}** clip, sẽ ghép thành **{filename}**")
+                        elif videos[0].name:
+                            st.info(f"📁 Tên file: **{videos[0].name}**")
+                    
                         # Hiển thị prompt đã dùng
-                        st.info(f"💭 Prompt: {prompt}")
-                        
+                        st.info(f"💭 Prompt: {job_prompt}")
+                    
                         # Tự động tải video về local để hiển thị
                         st.markdown("#### 📺 Xem Video:")
-                        
-                        try:
-                            # Tạo filename
-                            filename = video_name or f"video_{int(time.time())}.mp4"
-                            if not filename.endswith('.mp4'):
-                                filename += '.mp4'
-                            
-                            # Kiểm tra xem file đã tồn tại chưa
-                            filepath = VIDEO_DIR / filename
-                            
-                            # Nếu file chưa tồn tại, hiển thị spinner khi tải
-                            video_path = None
-                            if not filepath.exists():
-                                print(f"📥 File chưa tồn tại, đang tải từ: {video_url}")
-                                # Sử dụng spinner và đảm bảo nó tự tắt khi xong
-                                loading_placeholder = st.empty()
-                                with loading_placeholder.container():
-                                    with st.spinner("⏳ Đang tải video để hiển thị..."):
-                                        video_path = download_video_from_url(video_url, filename)
-                                # Clear spinner placeholder sau khi tải xong
-                                loading_placeholder.empty()
-                            else:
-                                print(f"✅ File đã tồn tại: {filepath}")
-                                video_path = str(filepath)
-                            
-                            # Hiển thị video sau khi đã tải xong (spinner đã tắt)
-                            if video_path and os.path.exists(video_path):
-                                # Hiển thị video từ local file với kích thước nhỏ hơn
-                                print(f"🎬 Đang hiển thị video từ: {video_path}")
-                                # Wrap video trong container để control size (rộng hơn)
-                                video_col1, video_col2, video_col3 = st.columns([0.5, 5, 0.5])
-                                with video_col2:
-                                    st.video(video_path)
-                                
-                                # Hiển thị thông tin
-                                col1, col2 = st.columns(2)
-                                with col1:
-                                    st.metric("📁 Tên file", os.path.basename(video_path))
-                                with col2:
-                                    st.metric("📊 Kích thước", get_video_size(video_path))
-                                
-                                # Nút tải xuống
-                                with open(video_path, "rb") as f:
-                                    st.download_button(
-                                        label="📥 Tải Video Về Máy",
-                                        data=f.read(),
-                                        file_name=os.path.basename(video_path),
-                                        mime="video/mp4",
-                                        use_container_width=True
-                                    )
-                            else:
-                                st.error("❌ Không thể tải video về. Vui lòng thử lại.")
-                                st.info(f"🔗 Link video: {video_url}")
-                        except Exception as e:
-                            print(f"❌ Lỗi khi tải/hiển thị video: {str(e)}")
-                            import traceback
-                            print(traceback.format_exc())
-                            st.error(f"❌ Lỗi: {str(e)}")
-                            
-                            # Thử hiển thị bằng iframe cho Google Drive
-                            if "drive.google.com" in video_url:
-                                st.markdown("**Thử xem video từ Google Drive:**")
-                                # Extract file ID
-                                if "/file/d/" in video_url:
-                                    file_id = video_url.split("/file/d/")[1].split("/")[0]
-                                    embed_url = f"https://drive.google.com/file/d/{file_id}/preview"
-                                    st.markdown(f'<iframe src="{embed_url}" width="100%" height="480" allow="autoplay"></iframe>', unsafe_allow_html=True)
-                                else:
-                                    st.info(f"🔗 Link video: {video_url}")
-                            else:
-                                st.info(f"🔗 Link video: {video_url}")
+                    
+                        # Tải / ghép / tối ưu chạy trong VideoService (dùng chung với API, mỗi job chỉ tải một lần)
+                        loading_message = "⏳ Đang tải video để hiển thị..." if len(videos) == 1 else f"⏳ Đang tải {len(videos)} clip và ghép video..."
+                        with st.spinner(loading_message):
+                            outcome = service.materialize(job.id)
+                    
+                        if outcome.ready:
+                            show_video(outcome.video_path)
+                        else:
+                            result_span.set_error(outcome.error)
+                            st.error(f"❌ {outcome.error}")
+                            show_video_links(videos, embed=True)
                     else:
                         st.warning("⚠️ Không tìm thấy URL video trong response. Vui lòng kiểm tra n8n workflow.")
-                        st.json(response_data)  # Hiển thị toàn bộ response để debug
-    
+                        st.json(result["data"])  # Hiển thị toàn bộ response để debug
+                result_span.end()
+                set_current_span(None)
+
     # Tab 2: Video đã tạo
     with tab2:
         st.subheader("📁 Video Đã Tạo")
         
-        saved_videos = sorted(
-            VIDEO_DIR.glob("*.mp4"), 
-            key=os.path.getmtime, 
-            reverse=True
-        )
+        # Tìm kiếm + phân trang trên chỉ mục, chi phí render không tăng theo số video
+        search_col, size_col = st.columns([3, 1])
+        with search_col:
+            search = st.text_input("🔍 Tìm theo tên file hoặc prompt", key="gallery_search")
+        with size_col:
+            page_size = st.selectbox("Số video/trang", GALLERY_PAGE_SIZES, key="gallery_page_size")
         
-        if not saved_videos:
-            st.info("📭 Chưa có video nào. Hãy tạo video mới ở tab 'Tạo Video Mới'!")
+        total = video_index.count(search)
+        
+        if not total:
+            if search:
+                st.info("🔍 Không có video nào khớp với từ khoá.")
+            else:
+                st.info("📭 Chưa có video nào. Hãy tạo video mới ở tab 'Tạo Video Mới'!")
         else:
-            for video_path in saved_videos:
+            page_count = (total + page_size - 1) // page_size
+            page = st.number_input(f"Trang (1–{page_count})", min_value=1, max_value=page_count, value=1, key="gallery_page")
+            st.caption(f"{total} video")
+            
+            for item in video_index.page((page - 1) * page_size, page_size, search):
+                video_path = VIDEO_DIR / item["name"]
                 with st.container():
                     st.markdown(f"""
                         <div class="video-card">
-                            <h4>🎬 {video_path.name}</h4>
+                            <h4>🎬 {html.escape(item["name"])}</h4>
                         </div>
                     """, unsafe_allow_html=True)
                     
                     col1, col2, col3 = st.columns([2, 1, 1])
                     
                     with col1:
-                        st.metric("📊 Kích thước", get_video_size(str(video_path)))
-                        st.caption(f"Tạo lúc: {time.ctime(video_path.stat().st_mtime)}")
+                        st.metric("📊 Kích thước", format_size(item["size"]))
+                        caption = f"Tạo lúc: {time.ctime(item['mtime'])}"
+                        if item["duration"]:
+                            caption += f" · ⏱️ {item['duration']:.1f} giây"
+                        st.caption(caption)
+                        if item["prompt"]:
+                            st.caption(f"💭 {item['prompt']}")
                     
                     with col2:
-                        with open(video_path, "rb") as f:
-                            st.download_button(
-                                "📥 Tải về",
-                                f.read(),
-                                file_name=video_path.name,
-                                mime="video/mp4",
-                                key=f"download_{video_path.name}"
-                            )
+                        show_download_button(video_path, label="📥 Tải về", key=f"download_{item['name']}")
                     
                     with col3:
-                        if st.button("🗑️ Xóa", key=f"delete_{video_path.name}"):
-                            video_path.unlink()
+                        if st.button("🗑️ Xóa", key=f"delete_{item['name']}"):
+                            service.delete_video(item["name"])
                             st.rerun()
                     
-                    # Hiển thị video với kích thước rộng hơn
+                    # Chỉ tải video gốc khi người dùng bấm xem, còn lại hiển thị preview nhẹ
                     video_col1, video_col2, video_col3 = st.columns([0.5, 5, 0.5])
                     with video_col2:
-                        st.video(str(video_path))
+                        if st.session_state.get("gallery_open") == item["name"]:
+                            show_video_player(video_path)
+                            if st.button("⏹️ Đóng", key=f"close_{item['name']}"):
+                                st.session_state.gallery_open = None
+                                st.rerun()
+                        else:
+                            show_video_preview(item["name"])
+                            if st.button("▶️ Xem video", key=f"open_{item['name']}"):
+                                st.session_state.gallery_open = item["name"]
+                                st.rerun()
                     
                     st.markdown("---")
 
+    # Tab 3: Tạo video hàng loạt từ file
+    with tab3:
+        st.subheader("📦 Tạo Video Hàng Loạt")
+        st.caption("File JSONL hoặc CSV có cột prompt; các cột id/duration/quality/style (tuỳ chọn) ghi đè tham số ở sidebar.")
+        
+        uploaded = st.file_uploader("Chọn file prompt", type=["jsonl", "csv"], key="batch_file")
+        col1, col2 = st.columns(2)
+        with col1:
+            # Cả batch chạy dưới một owner nên Scheduler không cho quá per_owner job cùng lúc
+            max_concurrency = min(job_manager.scheduler.per_owner, job_manager.scheduler.max_concurrent)
+            concurrency = st.number_input(
+                "Số job chạy đồng thời",
+                min_value=1,
+                max_value=max_concurrency,
+                value=min(BATCH_CONCURRENCY, max_concurrency),
+                help=f"Tối đa {max_concurrency}: quota mỗi người dùng/batch của hàng đợi render (SCHEDULER_PER_OWNER)",
+            )
+        with col2:
+            rate = st.number_input("Request/giây (0 = không giới hạn)", min_value=0.0, max_value=50.0, value=BATCH_RATE, step=0.5)
+        
+        if uploaded is not None:
+            # Cùng nội dung file → cùng batch id, chạy lại sẽ tiếp tục từ manifest cũ
+            content = uploaded.getvalue()
+            batch_id = hashlib.sha256(content).hexdigest()[:16]
+            BATCH_DIR.mkdir(exist_ok=True)
+            input_path = BATCH_DIR / f"{batch_id}{Path(uploaded.name).suffix.lower()}"
+            manifest_path = BATCH_DIR / f"{batch_id}.manifest.jsonl"
+            if not input_path.exists():
+                input_path.write_bytes(content)
+            
+            try:
+                rows = load_rows(input_path, st.session_state.get("video_params"))
+            except (ValueError, KeyError) as e:
+                rows = []
+                st.error(f"❌ File không hợp lệ: {e}")
+            
+            if rows:
+                st.caption(f"{len(rows)} prompt")
+                batch_runs = get_batch_runs()
+                future = batch_runs.get(batch_id)
+                running = future is not None and not future.done()
+                if st.button("🚀 Chạy batch", type="primary", disabled=running):
+                    batch_runs[batch_id] = run_coroutine(
+                        run_batch(rows, service, manifest_path, int(concurrency), rate, owner=f"batch:{batch_id}")
+                    )
+                show_batch_progress(batch_id, rows, manifest_path)
+
 if __name__ == "__main__":
-    main()
+    with script_timer("video", st.session_state):
+        main()
@@ -0,0 +1,31 @@
+"""
+Event loop nền dùng chung cho cả process Streamlit.
+
+Streamlit chạy lại script chính ở mỗi lần rerun nhưng các module đã import thì giữ nguyên,
+nên loop + thread ở đây chỉ được tạo đúng một lần cho toàn bộ process.
+Các tác vụ I/O dài (gọi n8n, chờ callback, ...) chạy dưới dạng coroutine trên loop này
+thay vì mỗi request giữ riêng một thread.
+"""
+
+import asyncio
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Lấy (hoặc khởi tạo) event loop nền"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="async-runtime", daemon=True)
+            thread.start()
+            _loop = loop
+    return _loop
+
+
+def run_coroutine(coro):
+    """Đưa coroutine vào loop nền, trả về concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
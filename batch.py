@@ -0,0 +1,210 @@
+"""
+Chế độ batch: tạo video hàng loạt từ file JSONL/CSV.
+
+Mỗi dòng có "prompt" và (tuỳ chọn) "id", "duration", "quality", "style" ghi đè tham số mặc định.
+Các dòng được gửi qua VideoService (giới hạn số job chạy đồng thời + tốc độ gửi): prompt
+đã có trong ResultCache trả về ngay, job mới được tải video về thư viện và lưu cache như job
+tạo từ UI. Kết quả từng dòng được ghi nối vào manifest JSONL ngay khi xong. Chạy lại với cùng manifest sẽ
+bỏ qua các dòng đã thành công, nên crash giữa chừng không phải làm lại từ đầu.
+
+Dùng từ dòng lệnh:
+    python batch.py prompts.jsonl --manifest results.jsonl --concurrency 4 --rate 0.5
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from async_runtime import run_coroutine
+from jobs import JOB_FAILED, JOB_SUCCEEDED
+from result_cache import cache_key
+from scheduler import Scheduler
+from tracing import start_span
+from video_service import VideoService
+
+PARAM_KEYS = ("duration", "quality", "style")
+DEFAULT_PARAMS = {"duration": 10, "quality": "HD", "style": "Realistic"}
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+# Số request gửi tới n8n mỗi giây (0 = không giới hạn)
+BATCH_RATE = float(os.environ.get("BATCH_RATE", "1.0"))
+
+
+def load_rows(path, default_params: dict = None) -> list:
+    """Đọc file JSONL hoặc CSV thành danh sách {"row_id", "prompt", "params"}"""
+    path = Path(path)
+    defaults = dict(DEFAULT_PARAMS if default_params is None else default_params)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            records = list(csv.DictReader(f))
+        else:
+            records = [json.loads(line) for line in f if line.strip()]
+
+    rows = []
+    for line_no, record in enumerate(records, start=1):
+        prompt = (record.get("prompt") or "").strip()
+        if not prompt:
+            continue
+        params = dict(defaults)
+        for key in PARAM_KEYS:
+            value = record.get(key)
+            if value not in (None, ""):
+                params[key] = int(value) if key == "duration" else value
+        # id ổn định để resume: id trong file, hoặc số dòng + hash nội dung
+        row_id = str(record.get("id") or f"{line_no}:{cache_key(prompt, params)[:12]}")
+        rows.append({"row_id": row_id, "prompt": prompt, "params": params})
+    return rows
+
+
+def completed_row_ids(manifest_path) -> set:
+    """Các dòng đã thành công trong manifest (bỏ qua khi chạy lại)"""
+    done = set()
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # dòng cuối có thể bị cắt ngang nếu crash
+                if entry.get("status") == JOB_SUCCEEDED:
+                    done.add(entry["row_id"])
+    except FileNotFoundError:
+        pass
+    return done
+
+
+class RateLimiter:
+    """Giãn cách tối thiểu giữa hai lần gửi (rate request mỗi giây)"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+async def run_batch(
+    rows: list,
+    service: VideoService,
+    manifest_path,
+    concurrency: int = BATCH_CONCURRENCY,
+    rate: float = BATCH_RATE,
+    on_row_done=None,
+    owner: str = "batch",
+) -> dict:
+    """Chạy các dòng chưa xong, ghi manifest; trả về thống kê
+
+    owner: tên dùng cho quota của Scheduler, để batch không chiếm hết slot render
+    """
+    done_ids = completed_row_ids(manifest_path)
+    pending = [row for row in rows if row["row_id"] not in done_ids]
+    stats = {"total": len(rows), "skipped": len(rows) - len(pending), "succeeded": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    limiter = RateLimiter(rate)
+    Path(manifest_path).parent.mkdir(parents=True, exist_ok=True)
+
+    with open(manifest_path, "a", encoding="utf-8") as manifest:
+
+        async def process(row: dict):
+            async with semaphore:
+                await limiter.acquire()
+                started_at = time.time()
+                with start_span("batch.row", {"batch.row_id": row["row_id"]}) as span:
+                    submission = service.submit(row["prompt"], row["params"], owner=owner)
+                    span.set_attribute("batch.cached", bool(submission.cached))
+                    entry = await _row_result(service, submission)
+                entry = {
+                    "row_id": row["row_id"],
+                    "prompt": row["prompt"],
+                    "params": row["params"],
+                    **entry,
+                    "started_at": started_at,
+                    "finished_at": time.time(),
+                }
+                # Ghi ngay từng dòng để crash không mất kết quả đã có
+                manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                manifest.flush()
+                stats["succeeded" if entry["status"] == JOB_SUCCEEDED else "failed"] += 1
+                if on_row_done:
+                    on_row_done(entry)
+
+        await asyncio.gather(*(process(row) for row in pending))
+    return stats
+
+
+async def _row_result(service: VideoService, submission) -> dict:
+    """job_id/status/data/video_path/error của một dòng: từ cache, hoặc chờ job xong rồi tải video"""
+    if submission.cached:
+        cached = submission.cached
+        return {"job_id": None, "status": JOB_SUCCEEDED, "data": cached["response"], "video_path": cached["video_path"], "error": None}
+    job_id = submission.job_id
+    job = await service.jobs.wait_finished(job_id)
+    if job is None:
+        return {"job_id": job_id, "status": JOB_FAILED, "data": None, "video_path": None, "error": "Job bị mất"}
+    result = job.to_result()
+    entry = {"job_id": job_id, "status": job.status, "data": result.get("data"), "video_path": None, "error": result.get("error")}
+    if job.status == JOB_SUCCEEDED:
+        # Cùng Future với lần tải mà VideoService đã bắt đầu khi job xong
+        outcome = await asyncio.wrap_future(service.submit_materialize(job_id))
+        if outcome.ready:
+            entry["video_path"] = outcome.video_path
+        else:
+            # Không có file thì đánh dấu lỗi để lần chạy lại xử lý dòng này
+            entry.update(status=JOB_FAILED, error=outcome.error)
+    return entry
+
+
+def _load_webhook_url() -> str:
+    """WEBHOOK_URL từ biến môi trường hoặc .streamlit/secrets.toml (giống app.py)"""
+    if os.environ.get("WEBHOOK_URL"):
+        return os.environ["WEBHOOK_URL"]
+    import toml
+    secrets_path = Path(__file__).parent / ".streamlit" / "secrets.toml"
+    return toml.load(secrets_path).get("WEBHOOK_URL") if secrets_path.exists() else None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Tạo video hàng loạt từ file JSONL/CSV qua n8n")
+    parser.add_argument("input", help="File JSONL hoặc CSV chứa cột prompt")
+    parser.add_argument("--manifest", help="File JSONL ghi kết quả (mặc định <input>.manifest.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Số job chạy đồng thời")
+    parser.add_argument("--rate", type=float, default=BATCH_RATE, help="Số request mỗi giây (0 = không giới hạn)")
+    parser.add_argument("--webhook-url", default=None, help="URL webhook n8n (mặc định WEBHOOK_URL)")
+    parser.add_argument("--video-dir", default=os.environ.get("VIDEO_DIR", "generated_videos"), help="Thư mục lưu video và cache kết quả")
+    for key, value in DEFAULT_PARAMS.items():
+        parser.add_argument(f"--{key}", type=type(value), default=value, help=f"{key} mặc định")
+    args = parser.parse_args(argv)
+
+    webhook_url = args.webhook_url or _load_webhook_url()
+    if not webhook_url:
+        parser.error("Chưa cấu hình WEBHOOK_URL")
+    manifest_path = args.manifest or f"{args.input}.manifest.jsonl"
+    rows = load_rows(args.input, {key: getattr(args, key) for key in DEFAULT_PARAMS})
+
+    def report(entry: dict):
+        icon = "✅" if entry["status"] == JOB_SUCCEEDED else "❌"
+        print(f"{icon} [{entry['row_id']}] {entry['prompt'][:60]} {entry['error'] or ''}")
+
+    # Chạy headless: cả process chỉ phục vụ batch nên quota owner = concurrency
+    service = VideoService(Path(args.video_dir), webhook_url, scheduler=Scheduler(args.concurrency, args.concurrency))
+    stats = run_coroutine(run_batch(rows, service, manifest_path, args.concurrency, args.rate, report)).result()
+    print(f"📊 Tổng {stats['total']} · bỏ qua {stats['skipped']} · thành công {stats['succeeded']} · lỗi {stats['failed']}")
+    print(f"📄 Manifest: {manifest_path}")
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Lịch sử chat của một session cho app trợ lý (n8n-streamlit-agent-basic-auth.py).
+
+- Mỗi tin nhắn được ghi nối (append) ngay vào file JSONL của session trong CHAT_HISTORY_DIR,
+  nên restart/redeploy không làm mất lượt chat nào. Bộ nhớ chỉ giữ bản sao của tối đa
+  CHAT_HISTORY_MAX_MESSAGES tin nhắn gần nhất; phần cũ hơn đọc lại từ file.
+- Vị trí byte của từng dòng đã ghi được giữ lại, nên khi người dùng bấm xem tin cũ chỉ
+  cần seek và đọc đúng đoạn cần hiển thị, không đọc lại cả file.
+- Mở lại ChatHistory với cùng session_id (sau khi session bị đẩy khỏi bộ nhớ hoặc process
+  khởi động lại) thì đọc tiếp từ file đó.
+- File của session bỏ đi quá CHAT_HISTORY_RETENTION_SECONDS được dọn bằng prune_spilled().
+
+Không phụ thuộc Streamlit; app chỉ render window(n) tin nhắn cuối.
+"""
+
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+from log_utils import get_logger
+
+log = get_logger("chat_history")
+
+CHAT_HISTORY_DIR = Path(os.environ.get("CHAT_HISTORY_DIR", ".chat_history"))
+CHAT_HISTORY_MAX_MESSAGES = int(os.environ.get("CHAT_HISTORY_MAX_MESSAGES", "100"))
+CHAT_HISTORY_RETENTION_SECONDS = int(os.environ.get("CHAT_HISTORY_RETENTION_SECONDS", 7 * 24 * 60 * 60))
+
+_SAFE_ID_RE = re.compile(r"[^\w-]")
+
+
+class ChatHistory:
+    def __init__(self, session_id: str, max_in_memory: int = CHAT_HISTORY_MAX_MESSAGES, spill_dir: Path = CHAT_HISTORY_DIR):
+        self.session_id = session_id
+        self.max_in_memory = max(2, max_in_memory)
+        self.spill_path = Path(spill_dir) / f"{_SAFE_ID_RE.sub('_', session_id)}.jsonl"
+        self._recent = []
+        self._recent_bytes = 0
+        self._offsets = []  # vị trí byte của từng tin nhắn trong file
+        self._load_offsets()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @property
+    def spilled(self) -> int:
+        """Số tin nhắn chỉ còn trên đĩa (không có bản sao trong bộ nhớ)"""
+        return len(self._offsets) - len(self._recent)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Ước lượng bộ nhớ của phần tin nhắn còn giữ trong RAM"""
+        return self._recent_bytes + 8 * len(self._offsets)
+
+    def append(self, role: str, content):
+        message = {"role": role, "content": content}
+        self._write(message)
+        self._recent.append(message)
+        self._recent_bytes += _message_size(content)
+        if len(self._recent) > self.max_in_memory:
+            # Bỏ một lần nửa cũ nhất khỏi bộ nhớ (đã có trên đĩa) thay vì mỗi tin nhắn một lần
+            self._evict(len(self._recent) - self.max_in_memory // 2)
+
+    def window(self, count: int) -> list:
+        """count tin nhắn cuối cùng (đọc thêm từ file nếu vượt phần trong bộ nhớ)"""
+        return self.slice(max(0, len(self) - count), len(self))
+
+    def slice(self, start: int, end: int) -> list:
+        start, end = max(0, start), min(len(self), end)
+        if start >= end:
+            return []
+        messages = []
+        if start < self.spilled:
+            messages = self._read_spilled(start, min(end, self.spilled))
+        if end > self.spilled:
+            messages += self._recent[max(0, start - self.spilled):end - self.spilled]
+        return messages
+
+    def _load_offsets(self):
+        """Session đã có file (mở lại sau khi bị đẩy khỏi bộ nhớ): dựng lại vị trí từng dòng"""
+        try:
+            with open(self.spill_path, "rb") as f:
+                offset = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._offsets.append(offset)
+                    offset += len(line)
+            # Bỏ dòng ghi dở khi process bị dừng giữa chừng để lần ghi sau không nối vào nó
+            if self.spill_path.stat().st_size > offset:
+                os.truncate(self.spill_path, offset)
+        except FileNotFoundError:
+            pass
+
+    def _write(self, message: dict):
+        """Ghi nối một tin nhắn vào file (write-through, một dòng mỗi lần write)"""
+        line = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.spill_path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+        self._offsets.append(offset)
+
+    def _evict(self, count: int):
+        evicted, self._recent = self._recent[:count], self._recent[count:]
+        self._recent_bytes -= sum(_message_size(message["content"]) for message in evicted)
+        log.debug("Đã bỏ tin nhắn cũ khỏi bộ nhớ", extra={"count": count, "file": str(self.spill_path)})
+
+    def _read_spilled(self, start: int, end: int) -> list:
+        try:
+            with open(self.spill_path, "rb") as f:
+                f.seek(self._offsets[start])
+                return [json.loads(f.readline()) for _ in range(end - start)]
+        except (OSError, ValueError) as e:
+            # File bị xoá/hỏng: vẫn hiển thị được phần còn trong bộ nhớ
+            log.warning("Không đọc được lịch sử trên đĩa", extra={"file": str(self.spill_path), "error": str(e)})
+            return []
+
+
+def _message_size(content) -> int:
+    if isinstance(content, str):
+        return len(content) + 64
+    return len(json.dumps(content, ensure_ascii=False)) + 64
+
+
+def prune_spilled(spill_dir: Path = CHAT_HISTORY_DIR, max_age: int = CHAT_HISTORY_RETENTION_SECONDS) -> int:
+    """Xoá file của các session không còn ghi thêm trong max_age giây"""
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in Path(spill_dir).glob("*.json*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    if removed:
+        log.info("Đã dọn lịch sử chat cũ", extra={"removed": removed})
+    return removed
@@ -0,0 +1,175 @@
+"""
+Kho session chat phía server cho app trợ lý, khoá theo session_id.
+
+Mỗi request gửi n8n kèm một context có kích thước cố định thay vì để n8n nạp lại toàn bộ
+bộ nhớ hội thoại:
+    {"summary": "...", "recentMessages": [{"role": "user", "content": "..."}, ...]}
+- recentMessages: CHAT_CONTEXT_TURNS lượt gần nhất, mỗi tin cắt ở CHAT_CONTEXT_MESSAGE_CHARS.
+- summary: tóm tắt cuộn của các lượt cũ hơn. Lượt nào trượt khỏi cửa sổ gần nhất thì được
+  gấp vào summary thành một dòng "Hỏi: … → Đáp: …" (trích đoạn đầu, không gọi LLM); summary
+  bị cắt từ đầu khi vượt CHAT_SUMMARY_MAX_CHARS. Nhờ vậy payload mỗi lượt không lớn dần
+  theo độ dài hội thoại.
+
+Mọi thay đổi được ghi xuống đĩa ngay: mỗi tin nhắn nối vào lịch sử JSONL, summary ghi lại
+vào file .meta.json mỗi khi có lượt được gấp vào. Restart/redeploy vì vậy không mất lượt
+chat hay summary của session nào.
+
+Session nằm trong bộ nhớ theo thứ tự LRU. Khi tổng bộ nhớ vượt CHAT_SESSION_MEMORY_BYTES
+hoặc session không hoạt động quá CHAT_SESSION_IDLE_SECONDS, session cũ nhất bị bỏ khỏi bộ
+nhớ; truy cập lại thì nạp lại từ đĩa.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from chat_history import CHAT_HISTORY_DIR, ChatHistory
+from log_utils import get_logger
+from metrics import Counter, Gauge
+
+log = get_logger("chat_sessions")
+
+CHAT_CONTEXT_TURNS = int(os.environ.get("CHAT_CONTEXT_TURNS", "6"))
+CHAT_CONTEXT_MESSAGE_CHARS = int(os.environ.get("CHAT_CONTEXT_MESSAGE_CHARS", "2000"))
+CHAT_SUMMARY_MAX_CHARS = int(os.environ.get("CHAT_SUMMARY_MAX_CHARS", "3000"))
+# Độ dài trích mỗi câu hỏi / câu trả lời khi gấp vào summary
+CHAT_SUMMARY_LINE_CHARS = int(os.environ.get("CHAT_SUMMARY_LINE_CHARS", "200"))
+CHAT_SESSION_MEMORY_BYTES = int(os.environ.get("CHAT_SESSION_MEMORY_BYTES", 64 * 1024 * 1024))
+CHAT_SESSION_IDLE_SECONDS = int(os.environ.get("CHAT_SESSION_IDLE_SECONDS", 30 * 60))
+
+SESSIONS_IN_MEMORY = Gauge("chat_sessions_in_memory", "Số session chat đang giữ trong bộ nhớ")
+SESSIONS_EVICTED = Counter("chat_sessions_evicted", "Session chat bị bỏ khỏi bộ nhớ", ["reason"])
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+class ChatSession:
+    def __init__(self, session_id: str, spill_dir: Path = CHAT_HISTORY_DIR):
+        self.session_id = session_id
+        self.history = ChatHistory(session_id, spill_dir=spill_dir)
+        self.meta_path = self.history.spill_path.with_suffix(".meta.json")
+        self.summary_lines = []
+        self.summarized = 0  # số tin nhắn đầu tiên đã được gấp vào summary
+        self.last_access = time.monotonic()
+        self._load_meta()
+        # Thiếu/hỏng file meta (process dừng đột ngột): dựng lại summary từ lịch sử
+        self._fold_old_turns()
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.history.memory_bytes + sum(len(line) for line in self.summary_lines) + 256
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(self.summary_lines)
+
+    def append(self, role: str, content: str):
+        self.history.append(role, content)
+        self._fold_old_turns()
+
+    def context(self) -> dict:
+        """Context gửi kèm request: summary + các tin nhắn gần nhất chưa gấp vào summary"""
+        recent = self.history.slice(self.summarized, len(self.history))
+        return {
+            "summary": self.summary,
+            "recentMessages": [
+                {"role": message["role"], "content": _clip(message["content"], CHAT_CONTEXT_MESSAGE_CHARS)}
+                for message in recent
+            ],
+        }
+
+    def _save_meta(self):
+        self.meta_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.meta_path.with_name(self.meta_path.name + ".tmp")
+        tmp.write_text(json.dumps({"summary_lines": self.summary_lines, "summarized": self.summarized}, ensure_ascii=False))
+        os.replace(tmp, self.meta_path)
+
+    def _load_meta(self):
+        try:
+            meta = json.loads(self.meta_path.read_text())
+        except (OSError, ValueError):
+            return
+        self.summary_lines = meta.get("summary_lines", [])
+        self.summarized = min(meta.get("summarized", 0), len(self.history))
+
+    def _fold_old_turns(self):
+        # Giữ CHAT_CONTEXT_TURNS lượt (user + assistant) ngoài summary; gấp theo từng lượt
+        summarized = self.summarized
+        while len(self.history) - self.summarized > CHAT_CONTEXT_TURNS * 2 + 1:
+            turn = self.history.slice(self.summarized, self.summarized + 2)
+            parts = [
+                f"{'Hỏi' if message['role'] == 'user' else 'Đáp'}: {_clip(message['content'], CHAT_SUMMARY_LINE_CHARS)}"
+                for message in turn
+            ]
+            self.summary_lines.append(" → ".join(parts))
+            self.summarized += len(turn)
+        while self.summary_lines and sum(len(line) + 1 for line in self.summary_lines) > CHAT_SUMMARY_MAX_CHARS:
+            self.summary_lines.pop(0)
+        if self.summarized != summarized:
+            self._save_meta()
+
+
+class ChatSessionStore:
+    def __init__(
+        self,
+        memory_budget: int = CHAT_SESSION_MEMORY_BYTES,
+        idle_seconds: int = CHAT_SESSION_IDLE_SECONDS,
+        spill_dir: Path = CHAT_HISTORY_DIR,
+    ):
+        self.memory_budget = memory_budget
+        self.idle_seconds = idle_seconds
+        self.spill_dir = Path(spill_dir)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        SESSIONS_IN_MEMORY.set_function(lambda: len(self._sessions))
+
+    def append(self, session_id: str, role: str, content: str):
+        with self._lock:
+            self._get_locked(session_id).append(role, content)
+            self._evict_locked(session_id)
+
+    def context(self, session_id: str) -> dict:
+        with self._lock:
+            return self._get_locked(session_id).context()
+
+    def window(self, session_id: str, count: int) -> list:
+        with self._lock:
+            return self._get_locked(session_id).history.window(count)
+
+    def length(self, session_id: str) -> int:
+        with self._lock:
+            return len(self._get_locked(session_id).history)
+
+    def _get_locked(self, session_id: str) -> ChatSession:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = ChatSession(session_id, self.spill_dir)
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_access = time.monotonic()
+        return session
+
+    def _evict_locked(self, keep: str):
+        """Bỏ session ít dùng nhất khỏi bộ nhớ khi quá hạn chờ hoặc vượt ngân sách bộ nhớ (đã có trên đĩa)"""
+        now = time.monotonic()
+        total = sum(session.memory_bytes for session in self._sessions.values())
+        for session_id in list(self._sessions):
+            if session_id == keep:
+                continue
+            session = self._sessions[session_id]
+            if now - session.last_access > self.idle_seconds:
+                reason = "idle"
+            elif total > self.memory_budget:
+                reason = "memory"
+            else:
+                break
+            total -= session.memory_bytes
+            del self._sessions[session_id]
+            SESSIONS_EVICTED.labels(reason=reason).inc()
+            log.info("Đã bỏ session chat khỏi bộ nhớ", extra={"session": session_id, "reason": reason})
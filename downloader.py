@@ -0,0 +1,274 @@
+"""
+Tải file lớn (video 4K) song song theo HTTP Range.
+
+- Thăm dò bằng GET "Range: bytes=0-0": server trả 206 + Content-Range thì chia file
+  thành nhiều đoạn và tải trên nhiều kết nối, mỗi đoạn ghi thẳng vào đúng offset
+  của file .part (os.pwrite), không bao giờ giữ toàn bộ body trong RAM.
+- Tiến độ từng đoạn được lưu vào .part.json; lần tải sau (hoặc retry khi lỗi) tiếp tục
+  từ byte đã có, miễn là kích thước/ETag của file trên server không đổi.
+- Xong thì fsync rồi os.replace .part → file đích (atomic), người đọc không bao giờ
+  thấy file dở dang.
+- Server không hỗ trợ Range thì stream tuần tự vào .part, vẫn rename atomic.
+"""
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+import http_client
+from log_utils import get_logger
+from metrics import BYTES_BUCKETS, Counter, Histogram
+
+log = get_logger("downloader")
+
+DOWNLOAD_SECONDS = Histogram("download_seconds", "Thời gian tải video", ["mode"])
+DOWNLOAD_SIZE = Histogram("download_size_bytes", "Kích thước file đã tải", buckets=BYTES_BUCKETS)
+DOWNLOAD_BYTES = Counter("download_bytes", "Số byte thực sự tải qua mạng (không tính phần resume)")
+DOWNLOAD_ERRORS = Counter("download_errors", "Lỗi khi tải theo loại", ["type"])
+
+DOWNLOAD_CONNECTIONS = int(os.environ.get("DOWNLOAD_CONNECTIONS", "4"))
+DOWNLOAD_MIN_SEGMENT = int(os.environ.get("DOWNLOAD_MIN_SEGMENT", 8 * 1024 * 1024))
+DOWNLOAD_SEGMENT_RETRIES = int(os.environ.get("DOWNLOAD_SEGMENT_RETRIES", "3"))
+# Số file tải cùng lúc khi response có nhiều video
+DOWNLOAD_PARALLEL_FILES = int(os.environ.get("DOWNLOAD_PARALLEL_FILES", "3"))
+
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+# Lưu trạng thái .part.json tối đa mỗi giây một lần
+STATE_SAVE_INTERVAL = 1.0
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+# Mỗi file đích chỉ có một luồng tải tại một thời điểm (các session trùng job sẽ chờ)
+_dest_locks = {}
+_dest_locks_guard = threading.Lock()
+
+
+def _dest_lock(dest: Path) -> threading.Lock:
+    with _dest_locks_guard:
+        return _dest_locks.setdefault(str(dest.resolve()), threading.Lock())
+
+
+def chunk_size_for(total_size: int, connections: int) -> int:
+    """Chunk lớn cho file lớn: khoảng 64 lần đọc mỗi đoạn, giới hạn 256KB–4MB"""
+    if not total_size:
+        return MIN_CHUNK_SIZE
+    return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, total_size // (connections * 64)))
+
+
+def _probe(url: str):
+    """
+    Kiểm tra server có hỗ trợ Range không và lấy kích thước file.
+    Trả về (info, response): response còn mở khi server bỏ qua Range và trả 200 toàn bộ body,
+    để stream tiếp luôn mà không phải gửi lại request.
+    """
+    response = http_client.request("GET", url, headers={"Range": "bytes=0-0"}, stream=True)
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError:
+        response.close()
+        raise
+    info = {
+        "url": str(response.url),
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+        "size": None,
+        "ranged": False,
+    }
+    match = _CONTENT_RANGE_RE.match(response.headers.get("content-range", ""))
+    if response.status_code == 206 and match and match.group(3) != "*":
+        info["size"] = int(match.group(3))
+        info["ranged"] = True
+        response.close()
+        return info, None
+    if response.headers.get("content-length"):
+        info["size"] = int(response.headers["content-length"])
+    return info, response
+
+
+def _plan_segments(size: int, connections: int) -> list:
+    count = max(1, min(connections, -(-size // DOWNLOAD_MIN_SEGMENT)))
+    step = -(-size // count)
+    return [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)]
+
+
+def _load_state(state_path: Path, info: dict) -> list:
+    """Đọc tiến độ cũ nếu file trên server vẫn là file đó"""
+    try:
+        state = json.loads(state_path.read_text())
+    except (OSError, ValueError):
+        return None
+    if state.get("size") != info["size"] or state.get("etag") != info["etag"]:
+        return None
+    return state.get("segments")
+
+
+def _save_state(state_path: Path, info: dict, segments: list):
+    tmp = state_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"size": info["size"], "etag": info["etag"], "segments": segments}))
+    os.replace(tmp, state_path)
+
+
+class _RangedDownload:
+    """Tải các đoạn song song vào file .part"""
+
+    def __init__(self, info: dict, part_path: Path, state_path: Path, segments: list, connections: int, progress_cb=None):
+        self.info = info
+        self.part_path = part_path
+        self.state_path = state_path
+        self.segments = segments
+        self.connections = connections
+        self.progress_cb = progress_cb
+        self.chunk_size = chunk_size_for(info["size"], connections)
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    def downloaded(self) -> int:
+        return sum(seg[2] for seg in self.segments)
+
+    def run(self):
+        fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != self.info["size"]:
+                os.ftruncate(fd, self.info["size"])
+            pending = [i for i, seg in enumerate(self.segments) if seg[0] + seg[2] <= seg[1]]
+            with ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix="download") as pool:
+                for future in [pool.submit(contextvars.copy_context().run, self._fetch_segment, fd, i) for i in pending]:
+                    future.result()
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+            with self._lock:
+                _save_state(self.state_path, self.info, self.segments)
+
+    def _fetch_segment(self, fd: int, index: int):
+        segment = self.segments[index]
+        for attempt in range(DOWNLOAD_SEGMENT_RETRIES + 1):
+            start, end, done = segment
+            if start + done > end:
+                return
+            headers = {"Range": f"bytes={start + done}-{end}"}
+            # If-Range: nếu file trên server đã đổi thì không ghép nhầm dữ liệu cũ/mới
+            if self.info["etag"] or self.info["last_modified"]:
+                headers["If-Range"] = self.info["etag"] or self.info["last_modified"]
+            try:
+                response = http_client.request("GET", self.info["url"], headers=headers, stream=True)
+                try:
+                    if response.status_code != 206:
+                        raise httpx.HTTPStatusError(
+                            f"Server trả {response.status_code} cho request Range",
+                            request=response.request,
+                            response=response,
+                        )
+                    offset = start + done
+                    for chunk in response.iter_bytes(chunk_size=self.chunk_size):
+                        os.pwrite(fd, chunk, offset)
+                        offset += len(chunk)
+                        self._advance(index, len(chunk))
+                        DOWNLOAD_BYTES.inc(len(chunk))
+                finally:
+                    response.close()
+                return
+            except httpx.TransportError as e:
+                if attempt == DOWNLOAD_SEGMENT_RETRIES:
+                    raise
+                DOWNLOAD_ERRORS.labels(type="segment_retry").inc()
+                log.warning("Đoạn tải lỗi, tải tiếp", extra={"segment": index, "offset": segment[0] + segment[2], "error": str(e)})
+                time.sleep(min(2 ** attempt, 10))
+
+    def _advance(self, index: int, nbytes: int):
+        with self._lock:
+            self.segments[index][2] += nbytes
+            now = time.monotonic()
+            if now - self._last_save >= STATE_SAVE_INTERVAL:
+                self._last_save = now
+                _save_state(self.state_path, self.info, self.segments)
+                if self.progress_cb:
+                    self.progress_cb(self.downloaded(), self.info["size"])
+
+
+def _stream_download(response: httpx.Response, part_path: Path, progress_cb=None):
+    """Server không hỗ trợ Range: stream tuần tự, ghi từng chunk xuống đĩa"""
+    try:
+        total = int(response.headers.get("content-length", 0)) or None
+        downloaded = 0
+        last_report = time.monotonic()
+        with open(part_path, "wb") as f:
+            for chunk in response.iter_bytes(chunk_size=chunk_size_for(total, 1)):
+                f.write(chunk)
+                downloaded += len(chunk)
+                DOWNLOAD_BYTES.inc(len(chunk))
+                if progress_cb and time.monotonic() - last_report >= STATE_SAVE_INTERVAL:
+                    last_report = time.monotonic()
+                    progress_cb(downloaded, total)
+            f.flush()
+            os.fsync(f.fileno())
+    finally:
+        response.close()
+
+
+def download_file(url: str, dest: Path, connections: int = DOWNLOAD_CONNECTIONS, progress_cb=None) -> Path:
+    """
+    Tải url về dest. Trả về đường dẫn file đích.
+    progress_cb(downloaded_bytes, total_bytes) được gọi định kỳ (total có thể None).
+    """
+    dest = Path(dest)
+    part_path = dest.with_name(dest.name + ".part")
+    state_path = dest.with_name(dest.name + ".part.json")
+
+    with _dest_lock(dest):
+        # Session khác vừa tải xong file này
+        if dest.exists():
+            return dest
+
+        start = time.perf_counter()
+        mode = "probe"
+        try:
+            info, response = _probe(url)
+            if response is None:
+                segments = _load_state(state_path, info) if part_path.exists() else None
+                if segments:
+                    mode = "resume"
+                    log.info("Tiếp tục tải từ file .part", extra={"file": dest.name, "offset": sum(s[2] for s in segments)})
+                else:
+                    mode = "ranged"
+                    segments = _plan_segments(info["size"], connections)
+                _RangedDownload(info, part_path, state_path, segments, connections, progress_cb).run()
+            else:
+                mode = "stream"
+                _stream_download(response, part_path, progress_cb)
+        except Exception as e:
+            DOWNLOAD_ERRORS.labels(type=f"{mode}_{type(e).__name__}").inc()
+            raise
+        DOWNLOAD_SECONDS.labels(mode=mode).observe(time.perf_counter() - start)
+        DOWNLOAD_SIZE.observe(part_path.stat().st_size)
+
+        os.replace(part_path, dest)
+        if state_path.exists():
+            state_path.unlink()
+    return dest
+
+
+def download_many(items: list, max_files: int = DOWNLOAD_PARALLEL_FILES, progress_cb=None) -> list:
+    """
+    Tải nhiều file (url, dest) cùng lúc, trả về đường dẫn theo đúng thứ tự của items.
+    Số kết nối Range được chia đều cho các file đang tải; file nào lỗi thì raise lỗi đó
+    (file đã tải xong hoặc .part dở dang vẫn giữ lại để lần sau tiếp tục).
+    """
+    if not items:
+        return []
+    workers = max(1, min(max_files, len(items)))
+    connections = max(1, DOWNLOAD_CONNECTIONS // workers)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download-file") as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, download_file, url, dest, connections, progress_cb)
+            for url, dest in items
+        ]
+        return [future.result() for future in futures]
@@ -0,0 +1,250 @@
+"""
+Tách URL video từ response của workflow n8n.
+
+Mỗi dạng response là một extractor đăng ký theo thứ tự ưu tiên, dữ liệu được kiểm tra
+bằng model pydantic (schema biên dịch một lần lúc import):
+
+- drive_file:  file Google Drive (webContentLink / webViewLink, hoặc id + mimeType video)
+- generic_url: object có video_url / url / videoUrl / file_url / downloadUrl
+- plain_url:   response là chuỗi URL
+- n8n_item:    item dạng {"json": {...}} của n8n
+- multi_file:  object chứa danh sách video (videos / files / clips / items / data / results)
+
+Response là array thì mọi phần tử đều được xét (không chỉ phần tử đầu), nên workflow trả
+nhiều clip sẽ cho ra nhiều VideoRef. Link Drive luôn được chuẩn hoá về link tải trực tiếp
+tại một chỗ duy nhất (direct_download_url).
+
+Module không phụ thuộc Streamlit, chạy độc lập để thử hoặc đo tốc độ:
+    python extractors.py response.json
+    python extractors.py bench response.json [số_lần]
+"""
+
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, ValidationError, field_validator, model_validator
+
+_DRIVE_ID_RE = re.compile(r"drive\.google\.com/(?:file/d/([\w-]+)|(?:uc|open)\?(?:[^#]*&)?id=([\w-]+))")
+_UNSAFE_FILENAME_RE = re.compile(r"[^\w.\- ()]+")
+
+# mimeType của Drive chắc chắn không phải video
+_NON_VIDEO_MIME_PREFIXES = ("image/", "text/", "application/json", "application/vnd.google-apps.folder")
+
+# Key chứa URL video của object thường, theo thứ tự ưu tiên
+_URL_KEYS = ("video_url", "url", "videoUrl", "file_url", "downloadUrl")
+
+# Key chứa danh sách file trong response nhiều video
+_CONTAINER_KEYS = ("videos", "files", "clips", "items", "data", "results")
+
+
+def drive_file_id(url: str) -> Optional[str]:
+    match = _DRIVE_ID_RE.search(url or "")
+    if not match:
+        return None
+    return match.group(1) or match.group(2)
+
+
+def direct_download_url(url: str) -> str:
+    """Link Drive (view/open/uc) → link tải trực tiếp; URL khác giữ nguyên"""
+    file_id = drive_file_id(url)
+    if file_id:
+        return f"https://drive.google.com/uc?export=download&id={file_id}"
+    return url
+
+
+def safe_filename(name: str, fallback: str) -> str:
+    """Chỉ giữ tên file (bỏ thư mục, ký tự lạ) và đảm bảo đuôi .mp4"""
+    name = _UNSAFE_FILENAME_RE.sub("_", Path(name or "").name).strip(" .")
+    if not name:
+        name = fallback
+    if not name.lower().endswith(".mp4"):
+        name += ".mp4"
+    return name
+
+
+class VideoRef(BaseModel):
+    """Một video tìm được trong response"""
+
+    model_config = ConfigDict(frozen=True)
+
+    url: str
+    name: Optional[str] = None
+    source: str = "url"
+
+    @property
+    def preview_url(self) -> Optional[str]:
+        """Link nhúng iframe khi không tải được video (chỉ có với Drive)"""
+        file_id = drive_file_id(self.url)
+        return f"https://drive.google.com/file/d/{file_id}/preview" if file_id else None
+
+    def filename(self, fallback: str) -> str:
+        return safe_filename(self.name, fallback)
+
+
+def _http_url(value):
+    """Bỏ giá trị không phải URL http(s) (chuỗi rỗng, id, đường dẫn nội bộ...)"""
+    if value is not None and not (isinstance(value, str) and value.startswith(("http://", "https://"))):
+        return None
+    return value
+
+
+class DriveFile(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    id: Optional[str] = None
+    name: Optional[str] = Field(None, validation_alias=AliasChoices("name", "originalFilename"))
+    mime_type: Optional[str] = Field(None, validation_alias="mimeType")
+    web_content_link: Optional[str] = Field(None, validation_alias="webContentLink")
+    web_view_link: Optional[str] = Field(None, validation_alias="webViewLink")
+    download_url: Optional[str] = Field(None, validation_alias="downloadUrl")
+
+    @field_validator("web_content_link", "web_view_link", "download_url", mode="before")
+    @classmethod
+    def check_links(cls, value):
+        return _http_url(value)
+
+    def to_ref(self) -> Optional[VideoRef]:
+        if self.mime_type and self.mime_type.startswith(_NON_VIDEO_MIME_PREFIXES):
+            return None
+        url = self.web_content_link or self.web_view_link or self.download_url
+        if not url and self.id and (self.mime_type or "").startswith("video/"):
+            url = f"https://drive.google.com/uc?export=download&id={self.id}"
+        if not url:
+            return None
+        return VideoRef(url=direct_download_url(url), name=self.name, source="drive_file")
+
+
+class GenericVideo(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    url: Optional[str] = None
+    name: Optional[str] = Field(None, validation_alias=AliasChoices("name", "originalFilename", "filename"))
+
+    @model_validator(mode="before")
+    @classmethod
+    def pick_url(cls, data):
+        # Lấy URL hợp lệ đầu tiên theo thứ tự key (key có mặt nhưng rỗng thì xét key sau)
+        if isinstance(data, dict):
+            data = {**data, "url": next((data[key] for key in _URL_KEYS if _http_url(data.get(key))), None)}
+        return data
+
+    def to_ref(self) -> Optional[VideoRef]:
+        if not self.url:
+            return None
+        return VideoRef(url=direct_download_url(self.url), name=self.name, source="generic_url")
+
+
+# Danh sách (tên, hàm) theo thứ tự ưu tiên; hàm nhận một phần tử và trả về list VideoRef
+# nếu nhận ra dạng dữ liệu, None nếu không phải việc của nó
+_extractors = []
+
+
+def register_extractor(name: str, first: bool = False):
+    """Đăng ký extractor cho dạng response mới (first=True để xét trước các extractor có sẵn)"""
+
+    def decorator(function):
+        entry = (name, function)
+        if first:
+            _extractors.insert(0, entry)
+        else:
+            _extractors.append(entry)
+        return function
+
+    return decorator
+
+
+def _model_extractor(model, keys: tuple):
+    keys = frozenset(keys)
+
+    def extract(item):
+        # Lọc rẻ trước khi validate: dict không có key nào của model thì bỏ qua luôn
+        if not isinstance(item, dict) or keys.isdisjoint(item):
+            return None
+        try:
+            ref = model.model_validate(item).to_ref()
+        except ValidationError:
+            return None
+        return [ref] if ref else None
+
+    return extract
+
+
+register_extractor("drive_file")(
+    _model_extractor(DriveFile, ("webContentLink", "webViewLink", "mimeType"))
+)
+register_extractor("generic_url")(
+    _model_extractor(GenericVideo, _URL_KEYS)
+)
+
+
+@register_extractor("plain_url")
+def _plain_url(item):
+    if isinstance(item, str) and item.strip().startswith(("http://", "https://")):
+        return [VideoRef(url=direct_download_url(item.strip()), source="plain_url")]
+    return None
+
+
+@register_extractor("n8n_item")
+def _n8n_item(item):
+    if isinstance(item, dict) and isinstance(item.get("json"), (dict, list)):
+        return _walk(item["json"])
+    return None
+
+
+@register_extractor("multi_file")
+def _multi_file(item):
+    if not isinstance(item, dict):
+        return None
+    for key in _CONTAINER_KEYS:
+        if isinstance(item.get(key), (list, dict)):
+            refs = _walk(item[key])
+            if refs:
+                return refs
+    return None
+
+
+def _walk(data) -> list:
+    if isinstance(data, list):
+        refs = []
+        for element in data:
+            refs.extend(_walk(element))
+        return refs
+    for _, extractor in _extractors:
+        refs = extractor(data)
+        if refs:
+            return refs
+    return []
+
+
+def extract_videos(response_data) -> list:
+    """Mọi video trong response theo thứ tự xuất hiện, bỏ URL trùng"""
+    refs = []
+    seen = set()
+    for ref in _walk(response_data):
+        if ref.url not in seen:
+            seen.add(ref.url)
+            refs.append(ref)
+    return refs
+
+
+def _bench(data, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        extract_videos(data)
+    elapsed = time.perf_counter() - start
+    print(f"{rounds} lần, {elapsed * 1e6 / rounds:.1f} µs/lần")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "bench":
+        _bench(json.loads(Path(sys.argv[2]).read_text()), int(sys.argv[3]) if len(sys.argv) > 3 else 10000)
+    elif len(sys.argv) == 2:
+        for video in extract_videos(json.loads(Path(sys.argv[1]).read_text())):
+            print(video.model_dump_json())
+    else:
+        print(__doc__)
+        sys.exit(1)
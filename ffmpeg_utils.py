@@ -0,0 +1,42 @@
+"""
+Gọi ffmpeg (binary đi kèm imageio-ffmpeg) qua subprocess.
+"""
+
+import os
+import subprocess
+from pathlib import Path
+
+_ffmpeg_exe = None
+
+
+class FFmpegError(RuntimeError):
+    """ffmpeg chạy lỗi; message chứa phần cuối stderr"""
+
+
+def ffmpeg_exe() -> str:
+    """Đường dẫn ffmpeg: biến môi trường FFMPEG_BINARY, nếu không có thì lấy từ imageio-ffmpeg"""
+    global _ffmpeg_exe
+    if _ffmpeg_exe is None:
+        _ffmpeg_exe = os.environ.get("FFMPEG_BINARY")
+        if not _ffmpeg_exe:
+            import imageio_ffmpeg
+            _ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
+    return _ffmpeg_exe
+
+
+def run_ffmpeg(args: list, timeout: float = 600) -> str:
+    """Chạy ffmpeg với args (không gồm tên binary), trả về stderr"""
+    cmd = [ffmpeg_exe(), "-hide_banner", "-nostdin", *[str(a) for a in args]]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        raise FFmpegError(f"ffmpeg timeout sau {timeout} giây") from e
+    if proc.returncode != 0:
+        raise FFmpegError(proc.stderr[-1000:])
+    return proc.stderr
+
+
+def temp_output(path: Path) -> Path:
+    """File tạm cùng thư mục, giữ đuôi để ffmpeg nhận đúng định dạng; xong thì os.replace"""
+    path = Path(path)
+    return path.with_name(f".{path.stem}.tmp{path.suffix}")
@@ -0,0 +1,175 @@
+"""
+HTTP client dùng chung cho cả process (httpx + tenacity).
+
+- Connection pool + keep-alive: các request tới cùng host (n8n, Drive) tái sử dụng
+  kết nối TCP/TLS thay vì bắt tay lại ở mỗi lần gọi.
+- Timeout connect/read cấu hình được qua biến môi trường, request nào cần đợi lâu
+  (render video) thì truyền read timeout riêng.
+- Retry với exponential backoff có jitter: method idempotent được retry khi lỗi mạng
+  hoặc 429/502/503/504; POST chỉ retry khi chưa kết nối được (request chưa được gửi).
+"""
+
+import functools
+import os
+import threading
+
+import httpx
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from log_utils import get_logger
+from metrics import Counter
+
+log = get_logger("http_client")
+
+HTTP_RETRIES_TOTAL = Counter("http_retries", "Số lần retry request HTTP", ["method"])
+
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "120"))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "3"))
+HTTP_RETRY_BACKOFF = float(os.environ.get("HTTP_RETRY_BACKOFF", "0.5"))
+HTTP_RETRY_MAX_WAIT = float(os.environ.get("HTTP_RETRY_MAX_WAIT", "10"))
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+
+class RetryableStatusError(Exception):
+    """Server trả status tạm thời (429/5xx), sẽ được retry"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def make_timeout(read: float = None, connect: float = None) -> httpx.Timeout:
+    """Timeout mặc định, có thể override read/connect cho từng request"""
+    return httpx.Timeout(
+        connect=connect or HTTP_CONNECT_TIMEOUT,
+        read=read or HTTP_READ_TIMEOUT,
+        write=HTTP_READ_TIMEOUT,
+        pool=HTTP_CONNECT_TIMEOUT,
+    )
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_client() -> httpx.Client:
+    """Client đồng bộ dùng chung (thread-safe)"""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = httpx.Client(timeout=make_timeout(), limits=_limits(), follow_redirects=True)
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Client bất đồng bộ dùng chung, chỉ dùng trên event loop nền (async_runtime)"""
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = httpx.AsyncClient(timeout=make_timeout(), limits=_limits(), follow_redirects=True)
+    return _async_client
+
+
+def _is_idempotent(method: str) -> bool:
+    return method.upper() in IDEMPOTENT_METHODS
+
+
+def _retry_predicate(method: str):
+    idempotent = _is_idempotent(method)
+
+    def should_retry(exc: BaseException) -> bool:
+        # Chưa kết nối được thì request chưa tới server, retry an toàn với mọi method
+        if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout)):
+            return True
+        return idempotent and isinstance(exc, (httpx.TransportError, RetryableStatusError))
+
+    return should_retry
+
+
+def _log_retry(method: str, retry_state):
+    HTTP_RETRIES_TOTAL.labels(method=method.upper()).inc()
+    log.warning(
+        "Request lỗi, thử lại",
+        extra={
+            "attempt": retry_state.attempt_number,
+            "error": str(retry_state.outcome.exception()),
+            "wait": round(retry_state.next_action.sleep, 2),
+        },
+    )
+
+
+def _retry_kwargs(method: str, attempts: int) -> dict:
+    return {
+        "before_sleep": functools.partial(_log_retry, method),
+        "retry": retry_if_exception(_retry_predicate(method)),
+        "stop": stop_after_attempt(attempts),
+        "wait": wait_random_exponential(multiplier=HTTP_RETRY_BACKOFF, max=HTTP_RETRY_MAX_WAIT),
+        "reraise": True,
+    }
+
+
+def _should_retry_status(method: str, response: httpx.Response, attempt_number: int, attempts: int) -> bool:
+    return (
+        response.status_code in RETRY_STATUS_CODES
+        and _is_idempotent(method)
+        and attempt_number < attempts
+    )
+
+
+def _check_retryable(method: str, response: httpx.Response, attempt_number: int, attempts: int):
+    if _should_retry_status(method, response, attempt_number, attempts):
+        response.close()
+        raise RetryableStatusError(response.status_code)
+
+
+async def _acheck_retryable(method: str, response: httpx.Response, attempt_number: int, attempts: int):
+    # Response của AsyncClient phải đóng bằng aclose(), close() sẽ raise RuntimeError
+    if _should_retry_status(method, response, attempt_number, attempts):
+        await response.aclose()
+        raise RetryableStatusError(response.status_code)
+
+
+def request(method: str, url: str, *, retries: int = None, stream: bool = False, **kwargs) -> httpx.Response:
+    """
+    Gửi request qua client dùng chung, có retry.
+    kwargs giống httpx.Client.build_request (json, headers, params, timeout, ...).
+    Với stream=True, người gọi phải tự response.close().
+    """
+    client = get_client()
+    attempts = (HTTP_RETRIES if retries is None else retries) + 1
+    for attempt in Retrying(**_retry_kwargs(method, attempts)):
+        with attempt:
+            response = client.send(client.build_request(method, url, **kwargs), stream=stream)
+            _check_retryable(method, response, attempt.retry_state.attempt_number, attempts)
+            return response
+
+
+async def arequest(method: str, url: str, *, retries: int = None, **kwargs) -> httpx.Response:
+    """Phiên bản async của request(), chạy trên event loop nền"""
+    client = get_async_client()
+    attempts = (HTTP_RETRIES if retries is None else retries) + 1
+    async for attempt in AsyncRetrying(**_retry_kwargs(method, attempts)):
+        with attempt:
+            response = await client.send(client.build_request(method, url, **kwargs))
+            await _acheck_retryable(method, response, attempt.retry_state.attempt_number, attempts)
+            return response
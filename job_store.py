@@ -0,0 +1,99 @@
+"""
+JobStore bền vững trên SQLite (generated_videos/.cache/jobs.db).
+
+Mỗi lần job thay đổi, trạng thái được ghi xuống đĩa: prompt, params, status, thời gian,
+response của n8n và đường dẫn file video local. Job vẫn được giữ trong bộ nhớ để UI đọc
+và chờ cập nhật như JobStore thường; SQLite chỉ dùng để nạp lại khi process khởi động
+lại (container restart), nhờ đó session có thể mở lại job đang chạy hoặc đã xong
+thay vì gửi lại prompt và trả tiền render thêm lần nữa.
+"""
+
+import json
+import os
+import sqlite3
+from dataclasses import fields
+from pathlib import Path
+
+from jobs import Job, JobStore
+from log_utils import get_logger
+
+log = get_logger("job_store")
+
+# Job đã xong được giữ 7 ngày trong SQLite (lâu hơn bản chỉ có trong bộ nhớ)
+JOB_DB_RETENTION_SECONDS = int(os.environ.get("JOB_DB_RETENTION_SECONDS", 7 * 24 * 60 * 60))
+
+_JSON_COLUMNS = {"params", "result"}
+# version chỉ có nghĩa trong process hiện tại nên không lưu
+_COLUMNS = [f.name for f in fields(Job) if f.name != "version"]
+
+
+class SqliteJobStore(JobStore):
+    def __init__(self, db_path: Path, retention_seconds: int = JOB_DB_RETENTION_SECONDS):
+        super().__init__(retention_seconds)
+        self._db_path = Path(db_path)
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Một connection dùng chung, mọi truy cập đều nằm trong self._lock
+        self._conn = sqlite3.connect(self._db_path, timeout=10, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    prompt TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    key TEXT,
+                    owner TEXT,
+                    priority INTEGER,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    stage TEXT,
+                    progress INTEGER,
+                    stage_message TEXT,
+                    status_url TEXT,
+                    video_path TEXT,
+                    callback_token TEXT,
+                    trace_parent TEXT
+                )
+                """
+            )
+            # DB tạo bởi phiên bản cũ: thêm các cột mới của Job
+            existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for name in _COLUMNS:
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at)")
+        self._load()
+
+    def _load(self):
+        with self._lock:
+            for row in self._conn.execute("SELECT * FROM jobs"):
+                values = {name: row[name] for name in _COLUMNS}
+                for name in _JSON_COLUMNS:
+                    if values[name] is not None:
+                        values[name] = json.loads(values[name])
+                job = Job(**values)
+                self._jobs[job.id] = job
+            self._prune_locked()
+        log.info("Đã nạp job từ SQLite", extra={"count": len(self._jobs), "db": str(self._db_path)})
+
+    def _persist_locked(self, job: Job):
+        values = [
+            json.dumps(getattr(job, name), ensure_ascii=False) if name in _JSON_COLUMNS and getattr(job, name) is not None
+            else getattr(job, name)
+            for name in _COLUMNS
+        ]
+        with self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                values,
+            )
+
+    def _delete_locked(self, job_ids: list):
+        with self._conn:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
@@ -0,0 +1,577 @@
+"""
+Hệ thống job tạo video.
+
+Thay vì giữ một request POST mở suốt quá trình render (và một thread cho mỗi request),
+UI chỉ submit prompt và nhận job id ngay. Việc gọi n8n chạy dưới dạng coroutine
+trên event loop nền:
+  - Nếu n8n trả kết quả đồng bộ → lưu kết quả vào job.
+  - Nếu n8n trả 202 / {"status": "accepted"} → chờ n8n gọi lại callbackUrl,
+    hoặc tự poll statusUrl nếu n8n trả về.
+UI chỉ việc đọc JobStore nên một process giữ được hàng trăm job cùng lúc.
+
+Các request trùng prompt + params trong lúc job đầu tiên còn chạy sẽ gắn vào
+job đó (single-flight) thay vì tạo thêm một lần render trên n8n.
+
+Job không gọi n8n ngay mà xin slot từ Scheduler (giới hạn toàn cục, quota theo owner,
+ưu tiên theo độ dài/chất lượng), nên một người dùng không chiếm hết backend render.
+
+Trong lúc render, n8n có thể POST tiến độ thật (classify, script, render, upload)
+vào eventsUrl; UI đọc lại job theo chu kỳ ngắn (fragment), không chặn script Streamlit.
+"""
+
+import asyncio
+import json
+import secrets
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import httpx
+from aiohttp import web
+
+import http_client
+import sidecar
+from async_runtime import get_loop, run_coroutine
+from log_utils import bind_correlation_id, get_logger, set_correlation_id, truncate
+from metrics import Counter, Histogram
+from tracing import begin_span, current_traceparent, start_span, use_span
+from result_cache import cache_key
+from scheduler import Scheduler, classify_priority
+
+log = get_logger("jobs")
+
+JOBS_SUBMITTED = Counter("video_jobs_submitted", "Số lần submit job (coalesced=true: gắn vào job trùng đang chạy)", ["coalesced"])
+JOB_SECONDS = Histogram("video_job_seconds", "Thời gian từ lúc submit đến khi job xong", ["status"])
+JOB_ERRORS = Counter("video_job_errors", "Job thất bại theo loại lỗi", ["type"])
+WEBHOOK_SECONDS = Histogram("n8n_webhook_seconds", "Round-trip của request POST tới webhook n8n", ["outcome"])
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_WAITING_CALLBACK = "waiting_callback"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+FINISHED_STATUSES = {JOB_SUCCEEDED, JOB_FAILED}
+ACCEPTED_STATUSES = {"accepted", "queued", "processing", "running"}
+
+# Các stage n8n báo về qua endpoint events, kèm % mặc định khi n8n không gửi progress
+JOB_STAGES = {
+    "submitted": 5,
+    "classify": 15,
+    "script": 40,
+    "render": 70,
+    "upload": 90,
+}
+# Message tiến độ n8n gửi kèm stage được cắt ở độ dài này trước khi lưu/hiển thị
+JOB_STAGE_MESSAGE_CHARS = 200
+
+# Job đã xong được giữ trong bộ nhớ 6 tiếng để session có thể đọc lại
+JOB_RETENTION_SECONDS = 6 * 60 * 60
+
+
+@dataclass
+class Job:
+    id: str
+    prompt: str
+    params: dict
+    key: str = None
+    owner: str = None
+    priority: int = None
+    status: str = JOB_QUEUED
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    result: object = None
+    error: str = None
+    stage: str = None
+    progress: int = 0
+    stage_message: str = None
+    status_url: str = None
+    video_path: str = None
+    # traceparent của span tạo job (UI/batch), span của job gắn vào cùng trace
+    trace_parent: str = None
+    version: int = 0
+    callback_token: str = field(default_factory=lambda: secrets.token_urlsafe(16))
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_result(self) -> dict:
+        """Chuyển về cùng định dạng với call_n8n_webhook()"""
+        if self.status == JOB_SUCCEEDED:
+            return {"success": True, "data": self.result}
+        return {"success": False, "error": self.error or "Job chưa hoàn thành"}
+
+
+class JobStore:
+    """Lưu job trong bộ nhớ, an toàn khi đọc/ghi từ nhiều thread
+
+    Lớp con (SqliteJobStore) ghi bền vững qua _persist_locked/_delete_locked,
+    luôn được gọi khi đang giữ lock nên thứ tự ghi khớp với thứ tự cập nhật.
+    """
+
+    def __init__(self, retention_seconds: int = JOB_RETENTION_SECONDS):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.retention_seconds = retention_seconds
+
+    def add(self, job: Job):
+        with self._lock:
+            self._prune_locked()
+            self._jobs[job.id] = job
+            self._persist_locked(job)
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def update(self, job_id: str, only_unfinished: bool = False, **fields) -> Job:
+        """Ghi các field của job; only_unfinished=True thì bỏ qua (trả None) nếu job đã xong
+
+        Kiểm tra và ghi cùng trong lock: callback có thể hoàn tất job bất cứ lúc nào trên
+        thread khác, các bước trung gian không được ghi đè kết quả đó.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (only_unfinished and job.finished):
+                return None
+            for key, value in fields.items():
+                setattr(job, key, value)
+            job.updated_at = time.time()
+            job.version += 1
+            self._persist_locked(job)
+            self._changed.notify_all()
+            return job
+
+    def wait_for_update(self, job_id: str, since_version: int, timeout: float = None) -> Job:
+        """Chặn đến khi job có version khác since_version (hoặc hết timeout)"""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self._jobs.get(job_id) is None or self._jobs[job_id].version != since_version,
+                timeout=timeout,
+            )
+            return self._jobs.get(job_id)
+
+    def list(self, limit: int = None) -> list:
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+        return jobs[:limit] if limit else jobs
+
+    def unfinished(self) -> list:
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.finished]
+
+    def _prune_locked(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [jid for jid, j in self._jobs.items() if j.finished and j.updated_at < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+        if expired:
+            self._delete_locked(expired)
+
+    def _persist_locked(self, job: Job):
+        pass
+
+    def _delete_locked(self, job_ids: list):
+        pass
+
+
+def _is_accepted(status_code: int, body) -> bool:
+    """n8n báo đã nhận job và sẽ trả kết quả sau"""
+    if status_code == 202:
+        return True
+    if isinstance(body, dict):
+        if body.get("accepted") is True:
+            return True
+        return str(body.get("status", "")).lower() in ACCEPTED_STATUSES
+    return False
+
+
+class JobManager:
+    """Submit prompt thành job và theo dõi đến khi có kết quả"""
+
+    def __init__(
+        self,
+        webhook_url: str,
+        callback_base_url: str = None,
+        store: JobStore = None,
+        request_timeout: int = 2900,
+        poll_interval: int = 10,
+        scheduler: Scheduler = None,
+        on_finished=None,
+    ):
+        self.webhook_url = webhook_url
+        self.callback_base_url = callback_base_url.rstrip("/") if callback_base_url else None
+        self.store = store or JobStore()
+        self.request_timeout = request_timeout
+        self.poll_interval = poll_interval
+        self.scheduler = scheduler or Scheduler()
+        # on_finished(job): gọi trên event loop nền khi job xong (thành công hoặc lỗi)
+        self.on_finished = on_finished
+        # cache_key → job id của job đang chạy, dùng để gộp request trùng nhau
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        # Span đang mở của job và của stage n8n hiện tại (chỉ dùng trên event loop nền)
+        self._job_spans = {}
+        self._stage_spans = {}
+        # job id → asyncio.Event đánh thức _wait_for_callback ngay khi callback tới (tạo và chờ trên loop nền)
+        self._callback_events = {}
+
+    # ---------- API cho UI ----------
+
+    def submit(self, prompt: str, params: dict = None, owner: str = None) -> str:
+        """Tạo job mới (hoặc gắn vào job trùng đang chạy) và trả về job id ngay lập tức
+
+        owner: session/user/batch dùng để tính quota trong Scheduler
+        """
+        params = dict(params or {})
+        key = cache_key(prompt, params)
+        with self._inflight_lock:
+            pending = self.store.get(self._inflight.get(key, ""))
+            if pending is not None and not pending.finished:
+                log.info("Gắn vào job đang chạy", extra={"job_id": pending.id, "prompt": prompt[:80]})
+                JOBS_SUBMITTED.labels(coalesced="true").inc()
+                return pending.id
+            job = Job(
+                id=uuid.uuid4().hex,
+                prompt=prompt,
+                params=params,
+                key=key,
+                owner=owner or "anonymous",
+                priority=classify_priority(params),
+                trace_parent=current_traceparent(),
+            )
+            self.store.add(job)
+            self._inflight[key] = job.id
+        JOBS_SUBMITTED.labels(coalesced="false").inc()
+        run_coroutine(self._run(job.id))
+        log.info("Job đã submit", extra={"job_id": job.id, "prompt": prompt[:80], "owner": job.owner, "priority": job.priority})
+        return job.id
+
+    def get(self, job_id: str) -> Job:
+        return self.store.get(job_id)
+
+    def wait_for_update(self, job_id: str, since_version: int, timeout: float = None) -> Job:
+        return self.store.wait_for_update(job_id, since_version, timeout)
+
+    def attach_file(self, job_id: str, video_path: str):
+        """Ghi lại file video local của job để session sau mở lại không phải tải lại"""
+        self.store.update(job_id, video_path=str(video_path))
+
+    def recent(self, limit: int = 10) -> list:
+        return self.store.list(limit)
+
+    def resume(self):
+        """Tiếp tục các job chưa xong sau khi process khởi động lại (store bền vững)
+
+        - queued: chưa gửi n8n → chạy lại bình thường.
+        - waiting_callback / có statusUrl: n8n vẫn đang render → chờ callback / poll tiếp.
+        - running không có statusUrl: request đồng bộ đã mất cùng process cũ → báo lỗi.
+        """
+        for job in self.store.unfinished():
+            with self._inflight_lock:
+                if job.key in self._inflight:
+                    continue
+                if job.status == JOB_RUNNING and not job.status_url:
+                    self.store.update(job.id, status=JOB_FAILED, error="Job bị gián đoạn do server khởi động lại. Vui lòng tạo lại video.")
+                    JOB_ERRORS.labels(type="interrupted").inc()
+                    continue
+                self._inflight[job.key] = job.id
+            run_coroutine(self._run(job.id, resumed=job.status != JOB_QUEUED))
+            log.info("Tiếp tục job sau khi khởi động lại", extra={"job_id": job.id, "status": job.status})
+
+    def queue_position(self, job_id: str) -> int:
+        """Vị trí trong hàng đợi của Scheduler, None nếu job đã được chạy"""
+        return self.scheduler.position(job_id)
+
+    async def wait_finished(self, job_id: str, poll_interval: float = 1.0) -> Job:
+        """Chờ job xong từ trong coroutine (không chặn event loop)"""
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job.finished:
+                return job
+            await asyncio.sleep(poll_interval)
+
+    def register_routes(self):
+        """Đăng ký endpoint callback và tiến độ trên sidecar"""
+        sidecar.add_route("POST", "/jobs/{job_id}/callback", self._callback_handler)
+        sidecar.add_route("POST", "/jobs/{job_id}/events", self._events_handler)
+
+    # ---------- Callback từ n8n ----------
+
+    def handle_callback(self, job_id: str, token: str, payload) -> bool:
+        job = self.store.get(job_id)
+        if job is None or job.finished or not secrets.compare_digest(token or "", job.callback_token):
+            return False
+        with bind_correlation_id(job_id):
+            self._apply_final_payload(job_id, payload)
+        return True
+
+    async def _callback_handler(self, request: web.Request) -> web.Response:
+        job_id = request.match_info["job_id"]
+        try:
+            payload = await request.json()
+        except Exception:
+            return web.json_response({"ok": False, "error": "Body không phải JSON"}, status=400)
+        if not self.handle_callback(job_id, request.query.get("token"), payload):
+            return web.json_response({"ok": False, "error": "Job không tồn tại"}, status=404)
+        return web.json_response({"ok": True})
+
+    def handle_event(self, job_id: str, token: str, event: dict) -> bool:
+        """Ghi nhận tiến độ thật từ n8n: {"stage": "render", "progress": 60, "message": "..."}"""
+        job = self.store.get(job_id)
+        if job is None or job.finished or not secrets.compare_digest(token or "", job.callback_token):
+            return False
+        stage = str(event.get("stage") or job.stage or "").lower() or None
+        if stage != job.stage:
+            self._begin_stage_span(job_id, stage)
+        progress = event.get("progress")
+        if progress is None:
+            progress = JOB_STAGES.get(stage, job.progress)
+        try:
+            progress = max(0, min(99, int(progress)))
+        except (TypeError, ValueError):
+            progress = job.progress
+        # n8n có thể gửi message là số/object: luôn lưu chuỗi để UI escape và hiển thị được
+        message = event.get("message")
+        message = str(message)[:JOB_STAGE_MESSAGE_CHARS] if message is not None else None
+        self.store.update(job_id, only_unfinished=True, stage=stage, progress=progress, stage_message=message)
+        return True
+
+    async def _events_handler(self, request: web.Request) -> web.Response:
+        job_id = request.match_info["job_id"]
+        try:
+            event = await request.json()
+        except Exception:
+            return web.json_response({"ok": False, "error": "Body không phải JSON"}, status=400)
+        if not isinstance(event, dict):
+            return web.json_response({"ok": False, "error": "Event phải là object"}, status=400)
+        if not self.handle_event(job_id, request.query.get("token"), event):
+            return web.json_response({"ok": False, "error": "Job không tồn tại"}, status=404)
+        return web.json_response({"ok": True})
+
+    def _apply_final_payload(self, job_id: str, payload):
+        """Payload callback/poll: {"status": "failed", "error": ...} hoặc {"data": ...} hoặc kết quả thô"""
+        if isinstance(payload, dict) and str(payload.get("status", "")).lower() in ("failed", "error"):
+            if not self.store.update(job_id, only_unfinished=True, status=JOB_FAILED, error=payload.get("error") or "n8n báo lỗi khi xử lý"):
+                return
+            JOB_ERRORS.labels(type="upstream_failed").inc()
+            log.warning("n8n báo job thất bại", extra={"error": payload.get("error")})
+            self._wake_waiter(job_id)
+            return
+        data = payload.get("data", payload) if isinstance(payload, dict) else payload
+        if not self.store.update(job_id, only_unfinished=True, status=JOB_SUCCEEDED, result=data, progress=100):
+            return
+        log.info("Job hoàn thành qua callback/poll")
+        log.debug("Kết quả từ n8n", extra={"body": truncate(data)})
+        self._wake_waiter(job_id)
+
+    def _wake_waiter(self, job_id: str):
+        """Báo _wait_for_callback job đã xong, để trả slot Scheduler và key gộp request ngay"""
+        event = self._callback_events.get(job_id)
+        if event is not None:
+            # Callback có thể tới từ thread khác (handle_callback là API public)
+            get_loop().call_soon_threadsafe(event.set)
+
+    # ---------- Worker ----------
+
+    def _build_payload(self, job: Job) -> dict:
+        payload = {"prompt": job.prompt, "timestamp": int(time.time())}
+        payload.update(job.params)
+        payload["jobId"] = job.id
+        if self.callback_base_url:
+            job_url = f"{self.callback_base_url}/jobs/{job.id}"
+            payload["callbackUrl"] = f"{job_url}/callback?token={job.callback_token}"
+            payload["eventsUrl"] = f"{job_url}/events?token={job.callback_token}"
+        return payload
+
+    def _begin_stage_span(self, job_id: str, stage: str):
+        """Mỗi stage n8n báo về là một span con của job → thấy thời gian từng bước"""
+        previous = self._stage_spans.pop(job_id, None)
+        if previous is not None:
+            previous.end()
+        job_span = self._job_spans.get(job_id)
+        if job_span is not None and stage:
+            self._stage_spans[job_id] = begin_span("n8n.stage", {"n8n.stage": stage}, parent=job_span)
+
+    async def _run(self, job_id: str, resumed: bool = False):
+        # Task có context riêng nên correlation id chỉ áp dụng cho log của job này
+        set_correlation_id(job_id)
+        job = self.store.get(job_id)
+        job_span = begin_span(
+            "video_job",
+            {"job.id": job_id, "job.owner": job.owner, "job.priority": job.priority, "job.resumed": resumed},
+            parent=job.trace_parent,
+        )
+        self._job_spans[job_id] = job_span
+        try:
+            with use_span(job_span):
+                wait_span = begin_span("scheduler.wait", {"job.priority": job.priority})
+                async with self.scheduler.slot(job_id, job.owner, job.priority):
+                    wait_span.end()
+                    if not resumed:
+                        await self._execute(job_id)
+                    elif job.status_url:
+                        await self._poll_status(job_id, job.status_url, job.created_at)
+                    else:
+                        await self._wait_for_callback(job_id, job.created_at)
+        finally:
+            self._begin_stage_span(job_id, None)
+            self._job_spans.pop(job_id, None)
+            job = self.store.get(job_id)
+            if job is not None and job.finished:
+                JOB_SECONDS.labels(status=job.status).observe(time.time() - job.created_at)
+                job_span.set_attribute("job.status", job.status)
+                if job.status == JOB_FAILED:
+                    job_span.set_error(job.error)
+            job_span.end()
+            with self._inflight_lock:
+                if job is not None and self._inflight.get(job.key) == job_id:
+                    del self._inflight[job.key]
+            if job is not None and job.finished and self.on_finished:
+                try:
+                    self.on_finished(job)
+                except Exception:
+                    log.exception("Lỗi trong on_finished của job")
+
+    async def _execute(self, job_id: str):
+        job = self.store.update(job_id, status=JOB_RUNNING, stage="submitted", progress=JOB_STAGES["submitted"])
+        start_time = time.time()
+        try:
+            payload = self._build_payload(job)
+            request_start = time.perf_counter()
+            with start_span("n8n.webhook", {"http.method": "POST", "http.url": self.webhook_url}) as span:
+                # n8n đọc traceparent (header hoặc payload) để gắn span của workflow vào cùng trace
+                payload["traceparent"] = span.traceparent
+                log.debug("Gửi payload đến n8n", extra={"payload": truncate(payload)})
+                try:
+                    response = await http_client.arequest(
+                        "POST",
+                        self.webhook_url,
+                        json=payload,
+                        headers={"traceparent": span.traceparent},
+                        timeout=http_client.make_timeout(read=self.request_timeout),
+                    )
+                    span.set_attribute("http.status_code", response.status_code)
+                    response.raise_for_status()
+                except httpx.HTTPError as e:
+                    WEBHOOK_SECONDS.labels(outcome=_error_type(e)).observe(time.perf_counter() - request_start)
+                    raise
+                response_text = response.text
+                body = _parse_json(response_text)
+                accepted = _is_accepted(response.status_code, body)
+                span.set_attribute("n8n.accepted", accepted)
+                WEBHOOK_SECONDS.labels(outcome="accepted" if accepted else "ok").observe(time.perf_counter() - request_start)
+
+            if accepted:
+                status_url = body.get("statusUrl") if isinstance(body, dict) else None
+                # Callback có thể tới trước khi đọc xong response 202: job đã xong thì giữ nguyên
+                if status_url:
+                    # Lưu statusUrl để poll tiếp được nếu process khởi động lại
+                    if self.store.update(job_id, only_unfinished=True, status_url=status_url):
+                        await self._poll_status(job_id, status_url, start_time)
+                elif self.store.update(job_id, only_unfinished=True, status=JOB_WAITING_CALLBACK):
+                    await self._wait_for_callback(job_id, start_time)
+                return
+
+            if not response_text or not response_text.strip():
+                self.store.update(job_id, status=JOB_FAILED, error="Response từ server rỗng. Vui lòng kiểm tra n8n workflow.")
+                JOB_ERRORS.labels(type="empty_response").inc()
+            elif body is None:
+                self.store.update(job_id, status=JOB_FAILED, error=f"Response không phải JSON hợp lệ. Response: {response_text[:200]}")
+                JOB_ERRORS.labels(type="invalid_response").inc()
+            else:
+                self.store.update(job_id, status=JOB_SUCCEEDED, result=body, progress=100)
+                log.info("Job hoàn thành", extra={"elapsed": round(time.time() - start_time, 2)})
+                log.debug("Response từ n8n", extra={"body": truncate(response_text)})
+        except httpx.TimeoutException:
+            self._fail_timeout(job_id, start_time)
+        except httpx.HTTPError as e:
+            self.store.update(job_id, status=JOB_FAILED, error=f"Request error: {str(e)}")
+            JOB_ERRORS.labels(type=_error_type(e)).inc()
+            log.warning("Gọi n8n lỗi", extra={"error": str(e), "error_type": type(e).__name__})
+        except Exception as e:
+            self.store.update(job_id, status=JOB_FAILED, error=str(e))
+            JOB_ERRORS.labels(type="unexpected").inc()
+            log.exception("Job lỗi không xác định")
+
+    async def _poll_status(self, job_id: str, status_url: str, start_time: float):
+        """Poll statusUrl do n8n trả về cho đến khi có kết quả"""
+        while time.time() - start_time < self.request_timeout:
+            await asyncio.sleep(self.poll_interval)
+            job = self.store.get(job_id)
+            if job is None or job.finished:
+                return
+            try:
+                response = await http_client.arequest("GET", status_url)
+            except httpx.HTTPError as e:
+                log.warning("Poll statusUrl lỗi, thử lại", extra={"error": str(e)})
+                continue
+            if response.status_code >= 400:
+                continue
+            body = _parse_json(response.text)
+            if body is not None and not _is_accepted(200, body):
+                self._apply_final_payload(job_id, body)
+                return
+        self._fail_timeout(job_id, start_time)
+
+    async def _wait_for_callback(self, job_id: str, start_time: float):
+        """Chờ callback; hết thời gian mà chưa có kết quả thì báo timeout
+
+        Callback set event nên job được giải phóng ngay; poll_interval chỉ là chu kỳ kiểm tra
+        dự phòng khi job xong bằng đường khác.
+        """
+        # Tạo event trước khi đọc store: callback tới giữa hai bước vẫn đánh thức được
+        event = self._callback_events[job_id] = asyncio.Event()
+        try:
+            while True:
+                job = self.store.get(job_id)
+                if job is None or job.finished:
+                    return
+                remaining = self.request_timeout - (time.time() - start_time)
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=min(self.poll_interval, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._callback_events.pop(job_id, None)
+        self._fail_timeout(job_id, start_time)
+
+    def _fail_timeout(self, job_id: str, start_time: float):
+        elapsed_time = time.time() - start_time
+        elapsed_minutes = int(elapsed_time // 60)
+        elapsed_seconds = int(elapsed_time % 60)
+        job = self.store.update(
+            job_id,
+            only_unfinished=True,
+            status=JOB_FAILED,
+            error=f"Timeout: Quá trình xử lý mất quá lâu ({elapsed_minutes} phút {elapsed_seconds} giây). Vui lòng thử lại với prompt ngắn hơn hoặc liên hệ hỗ trợ.",
+        )
+        if job is None:
+            return
+        JOB_ERRORS.labels(type="timeout").inc()
+        log.warning("Job timeout", extra={"elapsed": round(elapsed_time, 2)})
+
+
+def _error_type(error: httpx.HTTPError) -> str:
+    """Nhãn loại lỗi cho metrics"""
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"http_{error.response.status_code}"
+    if isinstance(error, httpx.TransportError):
+        return "transport"
+    return "http_error"
+
+
+def _parse_json(text: str):
+    if not text or not text.strip():
+        return None
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
@@ -0,0 +1,244 @@
+"""
+Chỉ mục tìm kiếm cục bộ (BM25) trên các file kiến thức của app trợ lý.
+
+Nguồn: 00.xinchao.txt, 01.system_trainning.txt, 02.assistant.txt, prompts.txt và mọi file
+.txt/.md trong KNOWLEDGE_DIR do operator thêm vào. Mỗi file được cắt thành đoạn khoảng
+KNOWLEDGE_CHUNK_WORDS từ (theo đoạn văn, đoạn quá dài thì cắt cửa sổ có chồng lấn).
+
+Chỉ mục lưu trong KNOWLEDGE_INDEX_DIR dưới dạng mảng NumPy (postings kiểu CSR theo term
+đã băm, độ dài đoạn, idf) cùng file text của các đoạn, và được mở bằng memory map nên
+khởi động không phải đọc hết vào RAM. Khi nguồn thay đổi (kích thước/mtime) chỉ mục
+được dựng lại.
+
+Truy vấn chạy hoàn toàn local; app gửi top-k đoạn kèm payload webhook để workflow n8n
+không phải tự đi tìm.
+
+Dùng từ dòng lệnh:
+    python knowledge_index.py build
+    python knowledge_index.py search "câu hỏi"
+"""
+
+import functools
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from log_utils import get_logger
+from text_vectors import VECTOR_DIM, fold_accents, term_bucket, tokenize
+
+log = get_logger("knowledge_index")
+
+KNOWLEDGE_FILES = ["00.xinchao.txt", "01.system_trainning.txt", "02.assistant.txt", "prompts.txt"]
+KNOWLEDGE_DIR = Path(os.environ.get("KNOWLEDGE_DIR", "knowledge"))
+KNOWLEDGE_INDEX_DIR = Path(os.environ.get("KNOWLEDGE_INDEX_DIR", ".knowledge_index"))
+KNOWLEDGE_CHUNK_WORDS = int(os.environ.get("KNOWLEDGE_CHUNK_WORDS", "120"))
+KNOWLEDGE_CHUNK_OVERLAP = int(os.environ.get("KNOWLEDGE_CHUNK_OVERLAP", "20"))
+KNOWLEDGE_TOP_K = int(os.environ.get("KNOWLEDGE_TOP_K", "3"))
+
+# Tham số BM25 chuẩn
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_INDEX_VERSION = 1
+# Hai thread cùng dựng lại chỉ mục sẽ ghi chung thư mục tạm (đặt theo pid)
+_build_lock = threading.Lock()
+_ARRAYS = ("postings_ptr", "postings_doc", "postings_tf", "doc_len", "idf", "text_offsets")
+
+
+def source_files(knowledge_dir: Path = KNOWLEDGE_DIR) -> list:
+    files = [Path(name) for name in KNOWLEDGE_FILES if Path(name).is_file()]
+    if Path(knowledge_dir).is_dir():
+        files.extend(sorted(p for p in Path(knowledge_dir).rglob("*") if p.suffix in (".txt", ".md") and p.is_file()))
+    return files
+
+
+def chunk_text(text: str, chunk_words: int = KNOWLEDGE_CHUNK_WORDS, overlap: int = KNOWLEDGE_CHUNK_OVERLAP) -> list:
+    """Gộp các đoạn văn liền nhau đến khoảng chunk_words từ; đoạn quá dài thì cắt cửa sổ"""
+    chunks = []
+    current = []
+    for paragraph in (p.strip() for p in text.replace("\r\n", "\n").split("\n\n")):
+        words = paragraph.split()
+        if not words:
+            continue
+        if len(words) > chunk_words:
+            if current:
+                chunks.append(" ".join(current))
+                current = []
+            step = max(1, chunk_words - overlap)
+            for start in range(0, len(words), step):
+                chunks.append(" ".join(words[start:start + chunk_words]))
+                if start + chunk_words >= len(words):
+                    break
+            continue
+        if current and len(current) + len(words) > chunk_words:
+            chunks.append(" ".join(current))
+            current = []
+        current.extend(words)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_terms(word: str, dim: int) -> tuple:
+    return term_bucket("w:" + word, dim), term_bucket("f:" + fold_accents(word), dim)
+
+
+def _terms(text: str, dim: int) -> list:
+    """Term đã băm của một đoạn: từ nguyên dạng và từ bỏ dấu (câu hỏi gõ không dấu vẫn khớp)"""
+    terms = []
+    for word in tokenize(text):
+        terms.extend(_word_terms(word, dim))
+    return terms
+
+
+def _signature(files: list) -> list:
+    return [{"path": str(p), "size": p.stat().st_size, "mtime": p.stat().st_mtime} for p in files]
+
+
+def _is_fresh(manifest: dict, files: list) -> bool:
+    """Chỉ mục khớp phiên bản, cấu hình cắt đoạn và chữ ký (size, mtime) của các file nguồn"""
+    try:
+        return (
+            manifest.get("version") == _INDEX_VERSION
+            and manifest.get("chunk_words") == KNOWLEDGE_CHUNK_WORDS
+            and manifest.get("sources") == _signature(files)
+        )
+    except OSError:
+        # File nguồn vừa bị xoá giữa lúc liệt kê và stat
+        return False
+
+
+def build_index(files: list, index_dir: Path = KNOWLEDGE_INDEX_DIR, dim: int = VECTOR_DIM) -> dict:
+    """Cắt đoạn, dựng postings BM25 và ghi ra index_dir (thay thế nguyên khối)"""
+    start = time.perf_counter()
+    passages = []
+    for path in files:
+        text = Path(path).read_text(encoding="utf-8", errors="replace")
+        passages.extend((str(path), chunk) for chunk in chunk_text(text))
+
+    doc_terms = [np.array(_terms(chunk, dim), dtype=np.int64) for _, chunk in passages]
+    doc_len = np.array([len(terms) for terms in doc_terms], dtype=np.float32)
+    count = len(passages)
+    # Postings theo term: đếm cặp (term, doc) bằng một lần np.unique, kết quả đã sắp theo
+    # term rồi đến doc nên lưu thẳng dạng CSR
+    all_terms = np.concatenate(doc_terms) if count else np.zeros(0, dtype=np.int64)
+    all_docs = np.repeat(np.arange(count, dtype=np.int64), doc_len.astype(np.int64))
+    pair_keys, counts = np.unique(all_terms * max(count, 1) + all_docs, return_counts=True)
+    postings_term = pair_keys // max(count, 1)
+    postings_doc = (pair_keys % max(count, 1)).astype(np.int32)
+    postings_tf = counts.astype(np.float32)
+    postings_ptr = np.searchsorted(postings_term, np.arange(dim + 1)).astype(np.int64)
+    df = np.diff(postings_ptr).astype(np.float32)
+    idf = np.log(1 + (count - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    encoded = [chunk.encode("utf-8") for _, chunk in passages]
+    text_offsets = np.zeros(count + 1, dtype=np.int64)
+    text_offsets[1:] = np.cumsum([len(chunk) for chunk in encoded])
+
+    index_dir = Path(index_dir)
+    tmp_dir = index_dir.with_name(f"{index_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    arrays = {
+        "postings_ptr": postings_ptr, "postings_doc": postings_doc, "postings_tf": postings_tf,
+        "doc_len": doc_len, "idf": idf, "text_offsets": text_offsets,
+    }
+    for name, array in arrays.items():
+        np.save(tmp_dir / f"{name}.npy", array)
+    (tmp_dir / "passages.bin").write_bytes(b"".join(encoded))
+    manifest = {
+        "version": _INDEX_VERSION,
+        "dim": dim,
+        "chunk_words": KNOWLEDGE_CHUNK_WORDS,
+        "sources": _signature(files),
+        "passage_sources": [source for source, _ in passages],
+        "avg_doc_len": float(doc_len.mean()) if count else 0.0,
+        "built_at": time.time(),
+    }
+    (tmp_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False))
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.replace(tmp_dir, index_dir)
+    log.info(
+        "Đã dựng chỉ mục kiến thức",
+        extra={"files": len(files), "passages": count, "elapsed": round(time.perf_counter() - start, 3)},
+    )
+    return manifest
+
+
+class KnowledgeIndex:
+    def __init__(self, index_dir: Path = KNOWLEDGE_INDEX_DIR):
+        self.index_dir = Path(index_dir)
+        self.manifest = json.loads((self.index_dir / "manifest.json").read_text())
+        self.dim = self.manifest["dim"]
+        self.avg_doc_len = self.manifest["avg_doc_len"] or 1.0
+        self.sources = self.manifest["passage_sources"]
+        for name in _ARRAYS:
+            setattr(self, name, np.load(self.index_dir / f"{name}.npy", mmap_mode="r"))
+        self._text = np.memmap(self.index_dir / "passages.bin", dtype=np.uint8, mode="r") if self.text_offsets[-1] else None
+
+    @classmethod
+    def load_or_build(cls, index_dir: Path = KNOWLEDGE_INDEX_DIR, knowledge_dir: Path = KNOWLEDGE_DIR):
+        """Mở chỉ mục có sẵn; dựng lại nếu chưa có, khác phiên bản hoặc nguồn đã thay đổi"""
+        with _build_lock:
+            files = source_files(knowledge_dir)
+            try:
+                fresh = _is_fresh(json.loads((Path(index_dir) / "manifest.json").read_text()), files)
+            except (OSError, ValueError):
+                fresh = False
+            if not fresh:
+                build_index(files, index_dir)
+            return cls(index_dir)
+
+    def is_fresh(self, knowledge_dir: Path = KNOWLEDGE_DIR) -> bool:
+        """Nguồn vẫn giống lúc dựng chỉ mục này (chỉ stat file, đủ rẻ để gọi mỗi câu hỏi)"""
+        return _is_fresh(self.manifest, source_files(knowledge_dir))
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def passage(self, doc: int) -> str:
+        start, end = int(self.text_offsets[doc]), int(self.text_offsets[doc + 1])
+        return bytes(self._text[start:end]).decode("utf-8")
+
+    def search(self, query: str, k: int = KNOWLEDGE_TOP_K) -> list:
+        """Top-k đoạn theo điểm BM25: [{"source", "text", "score"}], bỏ đoạn không khớp term nào"""
+        if not len(self) or k <= 0:
+            return []
+        scores = np.zeros(len(self), dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len / self.avg_doc_len)
+        for term in set(_terms(query, self.dim)):
+            start, end = int(self.postings_ptr[term]), int(self.postings_ptr[term + 1])
+            if start == end:
+                continue
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end]
+            scores[docs] += self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm[docs])
+        k = min(k, len(self))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"source": self.sources[doc], "text": self.passage(int(doc)), "score": round(float(scores[doc]), 4)}
+            for doc in top
+            if scores[doc] > 0
+        ]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "build":
+        print(json.dumps(build_index(source_files()), ensure_ascii=False, indent=2))
+    elif len(sys.argv) == 3 and sys.argv[1] == "search":
+        start = time.perf_counter()
+        index = KnowledgeIndex.load_or_build()
+        results = index.search(sys.argv[2])
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        print(f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    else:
+        print(__doc__)
+        sys.exit(1)
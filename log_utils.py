@@ -0,0 +1,130 @@
+"""
+Logging có cấu trúc dùng chung cho cả hai app thay cho print().
+
+- Mức log qua LOG_LEVEL (mặc định INFO): các dump payload/response đầy đủ chỉ ở DEBUG,
+  nên production không tốn CPU/IO cho chúng.
+- LOG_FORMAT=json (mặc định) ghi mỗi record một dòng JSON; LOG_FORMAT=text cho dev.
+- Mỗi record mang correlation id (job id / session id) lấy từ contextvar, nên log của
+  một job trên event loop nền, thread download và script Streamlit nối được với nhau.
+- Field dài (body response, payload) bị cắt ở LOG_MAX_FIELD_CHARS ký tự.
+- Record có extra={"sample": 0.1} chỉ được ghi với xác suất 10% (log lặp nhiều lần).
+
+Dùng:
+    log = get_logger(__name__)
+    log.info("Job hoàn thành", extra={"elapsed": 1.2})
+    log.debug("Response", extra={"body": truncate(data)})
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_MAX_FIELD_CHARS = int(os.environ.get("LOG_MAX_FIELD_CHARS", "2000"))
+
+ROOT_LOGGER = "app"
+
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+
+# Thuộc tính có sẵn của LogRecord, còn lại là field truyền qua extra=
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "sample"}
+_configured = False
+
+
+def truncate(value, limit: int = None) -> str:
+    """Chuỗi hoá (JSON nếu được) và cắt bớt giá trị lớn để đưa vào log"""
+    limit = limit or LOG_MAX_FIELD_CHARS
+    if not isinstance(value, str):
+        try:
+            value = json.dumps(value, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            value = repr(value)
+    if len(value) > limit:
+        return f"{value[:limit]}…(+{len(value) - limit} ký tự)"
+    return value
+
+
+def set_correlation_id(value: str):
+    return correlation_id.set(value)
+
+
+@contextmanager
+def bind_correlation_id(value: str):
+    token = correlation_id.set(value)
+    try:
+        yield
+    finally:
+        correlation_id.reset(token)
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {
+        key: value if isinstance(value, (int, float, bool)) or value is None else truncate(value)
+        for key, value in vars(record).items()
+        if key not in _RESERVED
+    }
+
+
+class _ContextFilter(logging.Filter):
+    """Gắn correlation id và bỏ bớt record được đánh dấu lấy mẫu"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        sample = getattr(record, "sample", None)
+        if sample is not None and random.random() >= sample:
+            return False
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate(record.getMessage()),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exc"] = truncate(self.formatException(record.exc_info))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = _extra_fields(record)
+        job = fields.pop("correlation_id", None)
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:<7} "
+        line += f"[{job[:12]}] " if job else ""
+        line += truncate(record.getMessage())
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Cài handler cho logger gốc "app" (idempotent, không đụng logger của Streamlit)"""
+    global _configured
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    if _configured:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    handler.addFilter(_ContextFilter())
+    root.addHandler(handler)
+    root.propagate = False
+    _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
@@ -0,0 +1,76 @@
+"""
+Phục vụ file trong generated_videos/ qua sidecar thay vì nhúng bytes vào Streamlit.
+
+web.FileResponse của aiohttp dùng sendfile (zero-copy), hỗ trợ Range (tua video),
+ETag/Last-Modified + If-None-Match/If-Modified-Since (304), nên bộ nhớ của một lần
+xem trang không còn tăng theo số lượng/dung lượng video trong thư viện.
+Player và nút tải về chỉ trỏ link tới /media/<tên file>.
+"""
+
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+from aiohttp import web
+
+import sidecar
+
+# URL mà trình duyệt dùng để truy cập sidecar (qua Traefik khi deploy)
+MEDIA_BASE_URL = os.environ.get("MEDIA_BASE_URL", f"http://localhost:{sidecar.SIDECAR_PORT}")
+
+# Chỉ phục vụ các loại file media, không lộ file .part, .json, .db
+MEDIA_TYPES = {
+    ".mp4": "video/mp4",
+    ".webm": "video/webm",
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+}
+PRIVATE_DIRS = {".cache"}
+
+
+class MediaServer:
+    def __init__(self, video_dir: Path, base_url: str = MEDIA_BASE_URL):
+        self.video_dir = Path(video_dir).resolve()
+        self.base_url = base_url.rstrip("/")
+
+    def register_routes(self):
+        sidecar.add_route("GET", "/media/{path:.+}", self._handle)
+        sidecar.add_route("HEAD", "/media/{path:.+}", self._handle)
+
+    def available(self) -> bool:
+        return sidecar.is_running()
+
+    def url_for(self, path, download: bool = False) -> str:
+        """Link tới file (path tuyệt đối hoặc tương đối trong video_dir)"""
+        relative = Path(path).resolve().relative_to(self.video_dir).as_posix()
+        url = f"{self.base_url}/media/{quote(relative)}"
+        return url + "?download=1" if download else url
+
+    def _resolve(self, relative: str) -> Path:
+        path = (self.video_dir / relative).resolve()
+        try:
+            parts = path.relative_to(self.video_dir).parts
+        except ValueError:
+            return None
+        if not parts or parts[0] in PRIVATE_DIRS or path.suffix.lower() not in MEDIA_TYPES:
+            return None
+        return path if path.is_file() else None
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        path = self._resolve(request.match_info["path"])
+        if path is None:
+            raise web.HTTPNotFound()
+        headers = {
+            "Content-Type": MEDIA_TYPES[path.suffix.lower()],
+            "Cache-Control": "public, max-age=3600",
+            "Accept-Ranges": "bytes",
+            # Player HLS (hls.js) chạy trong iframe component, tải playlist/segment bằng XHR
+            "Access-Control-Allow-Origin": "*",
+        }
+        if request.query.get("download"):
+            headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(path.name)}"
+        return web.FileResponse(path, headers=headers)
@@ -0,0 +1,225 @@
+"""
+Metrics dạng Prometheus (counter / histogram / gauge) cho cả hai app, xem tại GET /metrics
+trên sidecar.
+
+Tự cài đặt gọn thay vì thêm prometheus_client: chỉ cần vài loại metric, an toàn khi ghi
+từ nhiều thread (script Streamlit, event loop nền, thread download) và xuất đúng text
+exposition format nên Prometheus/Grafana scrape trực tiếp được.
+
+Dùng:
+    WEBHOOK_SECONDS = Histogram("n8n_webhook_seconds", "Thời gian gọi webhook n8n", ["outcome"])
+    WEBHOOK_SECONDS.labels(outcome="ok").observe(elapsed)
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+import sidecar
+
+# Bucket mặc định (giây) trải từ request nhanh đến render video nhiều phút
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 2400)
+BYTES_BUCKETS = (1 << 20, 10 << 20, 50 << 20, 100 << 20, 500 << 20, 1 << 30, 4 << 30)
+
+_registry = {}
+_registry_lock = threading.RLock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: dict = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __new__(cls, name: str, *args, **kwargs):
+        # Script Streamlit chạy lại mỗi rerun: khai báo lại cùng tên trả về metric đã có
+        with _registry_lock:
+            existing = _registry.get(name)
+            if existing is not None:
+                if type(existing) is not cls:
+                    raise ValueError(f"Metric {name} đã được khai báo với kiểu khác")
+                return existing
+            metric = super().__new__(cls)
+            metric._initialized = False
+            _registry[name] = metric
+            return metric
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        if self._initialized:
+            return
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def labels(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        """Metric không có label dùng trực tiếp: COUNTER.inc()"""
+        return self.labels()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def render(self, name, labelnames, key) -> list:
+        return [f"{name}_total{_format_labels(labelnames, key)} {_format_value(self._value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: tuple):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for index, bound in enumerate(self._buckets):
+                if value <= bound:
+                    self._counts[index] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name, labelnames, key) -> list:
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self._buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, {'le': _format_value(bound)})} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labelnames, key, {'le': '+Inf'})} {count}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets: tuple = DEFAULT_BUCKETS):
+        if not self._initialized:
+            self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0.0
+        self._function = None
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function):
+        """Giá trị được đọc lúc scrape (ví dụ độ dài hàng đợi)"""
+        self._function = function
+
+    def render(self, name, labelnames, key) -> list:
+        value = self._function() if self._function else self._value
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+
+def render() -> str:
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def _handle(request: web.Request) -> web.Response:
+    return web.Response(
+        text=render(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8", "Cache-Control": "no-store"},
+    )
+
+
+def register_routes():
+    sidecar.add_route("GET", "/metrics", _handle)
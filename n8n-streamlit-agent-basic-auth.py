@@ -1,132 +1,311 @@
 import streamlit as st
-import requests
+import httpx
 import uuid
 import json
+import itertools
+import time
+
+import http_client
+import metrics
+import resources
+import sidecar
+from chat_history import prune_spilled
+from chat_sessions import ChatSessionStore
+from log_utils import get_logger, set_correlation_id, truncate
+
+log = get_logger("chat")
+
+# Khai báo lại mỗi rerun vẫn trả về cùng metric (xem metrics.py)
+CHAT_SECONDS = metrics.Histogram("chat_request_seconds", "Thời gian trả lời một lượt chat", ["mode", "outcome"])
+CHAT_FIRST_TOKEN_SECONDS = metrics.Histogram("chat_first_token_seconds", "Thời gian đến đoạn text đầu tiên (chế độ stream)")
 # abcadsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsdsds
 # Hàm đọc nội dung từ file văn bản
 #xyz
 def rfile(name_file):
-    try:
-        with open(name_file, "r", encoding="utf-8") as file:
-            return file.read()
-    except FileNotFoundError:
+    content = resources.read_text(name_file)
+    if content is None:
         st.error(f"File {name_file} không tồn tại.")
+    return content
 
 # Constants
 BEARER_TOKEN = st.secrets.get("BEARER_TOKEN")
 WEBHOOK_URL = st.secrets.get("WEBHOOK_URL")
+# Hiển thị phản hồi theo từng token nếu workflow n8n bật streaming
+STREAM_RESPONSES = st.secrets.get("STREAM_RESPONSES", True)
+
+# Mỗi lần chỉ render số lượt hỏi-đáp gần nhất này; bấm "Xem tin nhắn cũ hơn" để mở thêm
+CHAT_WINDOW_TURNS = int(st.secrets.get("CHAT_WINDOW_TURNS", 10))
+
+# Các loại item mà n8n gửi khi webhook ở chế độ streaming (mỗi dòng một JSON)
+N8N_STREAM_TYPES = {"begin", "item", "end", "error"}
+
+# Các tài nguyên gọi ở mọi rerun: tắt spinner để lần cache hit không phải dựng element + thread
+@st.cache_resource(show_spinner=False)
+def start_metrics_server() -> bool:
+    """GET /metrics trên sidecar, một lần cho cả process"""
+    metrics.register_routes()
+    return sidecar.start()
+
+@st.cache_resource(show_spinner=False)
+def prune_chat_history() -> int:
+    """Dọn file lịch sử của session cũ, một lần mỗi process"""
+    return prune_spilled()
+
+@st.cache_resource(show_spinner=False)
+def get_session_store() -> ChatSessionStore:
+    """Lịch sử + summary của mọi session, dùng chung trong process"""
+    return ChatSessionStore()
+
+@st.cache_resource(show_spinner=False)
+def load_knowledge_index():
+    """Chỉ mục BM25 của các file kiến thức (memory map), mở/dựng một lần cho đến khi nguồn đổi"""
+    try:
+        # Import NumPy ở câu hỏi đầu tiên thay vì lúc mở trang
+        from knowledge_index import KnowledgeIndex
+        return KnowledgeIndex.load_or_build()
+    except Exception:
+        # Không có chỉ mục thì vẫn chat bình thường, chỉ không kèm đoạn tham khảo
+        log.exception("Không mở/dựng được chỉ mục kiến thức")
+        return None
+
+def get_knowledge_index():
+    """Chỉ mục hiện hành; file nguồn đổi (size/mtime) sau khi app chạy thì dựng lại"""
+    index = load_knowledge_index()
+    if index is not None and not index.is_fresh():
+        log.info("File kiến thức đã thay đổi, dựng lại chỉ mục")
+        load_knowledge_index.clear()
+        index = load_knowledge_index()
+    return index
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache():
+    """Cache câu trả lời dùng chung cho mọi session (câu hỏi lặp lại không gọi webhook)"""
+    from answer_cache import AnswerCache
+    return AnswerCache()
 
 def generate_session_id():
     return str(uuid.uuid4())
 
-def send_message_to_llm(session_id, message):
+def parse_session_id(value):
+    """Chỉ nhận session id dạng UUID (giá trị lạ trên URL thì tạo session mới)"""
+    try:
+        return str(uuid.UUID(value)) if value else None
+    except ValueError:
+        return None
+
+def build_payload(session_id, message, context=None, passages=None):
+    """Payload gửi webhook n8n, dùng chung cho chế độ thường và streaming"""
+    return {
+        "sessionId": session_id,
+        "chatInput": message,
+        # Summary + vài lượt gần nhất (kích thước cố định, xem chat_sessions.py)
+        "context": context,
+        # Top-k đoạn liên quan từ file kiến thức (knowledge_index.py)
+        "passages": passages or []
+    }
+
+def send_message_to_llm(session_id, message, context=None, passages=None):
     headers = {
         "Authorization": f"Bearer {BEARER_TOKEN}",
         "Content-Type": "application/json"
     }
-    payload = {
-        "sessionId": session_id,
-        "chatInput": message
-    }
+    payload = build_payload(session_id, message, context, passages)
     try:
-        response = requests.post(WEBHOOK_URL, json=payload, headers=headers)
+        response = http_client.request("POST", WEBHOOK_URL, json=payload, headers=headers)
         response.raise_for_status()
         response_data = response.json()
-        print('Response hỏi đáp:', response_data)
+        log.debug("Response hỏi đáp", extra={"body": truncate(response_data)})
         # Trích xuất contract — xử lý các trường 'output' và 'text'
         contract = response_data.get('output', "No output")
-        print('Contract nhận được:', contract)
         # Trả về object theo định dạng N8nOutputItems
         return [{"json": {"contract": contract}}]
     
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, ValueError) as e:
+        log.warning("Gọi LLM lỗi", extra={"error": str(e), "error_type": type(e).__name__})
         return [{"json": {"contract": f"Error: Failed to connect to the LLM - {str(e)}"}}]
 
+def _text_from_data(data):
+    """Lấy phần text từ một chunk: item n8n, {"output": ...} hoặc text thô"""
+    try:
+        item = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(item, dict):
+        if item.get("type") in N8N_STREAM_TYPES:
+            return item.get("content", "") if item["type"] in ("item", "error") else ""
+        return item.get("output", item.get("text", ""))
+    return data
+
+def _iter_stream_chunks(response):
+    """Đọc phản hồi streaming (SSE, JSON lines của n8n, text) hoặc JSON một lần"""
+    content_type = response.headers.get("content-type", "")
+    if "text/event-stream" in content_type:
+        for line in response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            yield _text_from_data(data)
+        return
+    if content_type.startswith("text/plain"):
+        yield from response.iter_text()
+        return
+
+    # n8n streaming trả JSON lines; workflow không streaming thì trả một JSON {"output": ...}
+    buffered = []
+    for line in response.iter_lines():
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = None
+        if isinstance(item, dict) and item.get("type") in N8N_STREAM_TYPES:
+            if item["type"] == "item":
+                yield item.get("content", "")
+            elif item["type"] == "error":
+                yield f"Error: {item.get('content', 'n8n báo lỗi')}"
+            continue
+        buffered.append(line)
+    if buffered:
+        response_data = json.loads("\n".join(buffered))
+        log.debug("Response hỏi đáp", extra={"body": truncate(response_data)})
+        yield response_data.get('output', "No output") if isinstance(response_data, dict) else str(response_data)
+
+def stream_message_to_llm(session_id, message, context=None, passages=None):
+    """Gửi tin nhắn và trả về generator các đoạn text theo thứ tự nhận được"""
+    headers = {
+        "Authorization": f"Bearer {BEARER_TOKEN}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream, application/json"
+    }
+    payload = build_payload(session_id, message, context, passages)
+    try:
+        response = http_client.request("POST", WEBHOOK_URL, json=payload, headers=headers, stream=True)
+        try:
+            response.raise_for_status()
+            yield from _iter_stream_chunks(response)
+        finally:
+            response.close()
+    except (httpx.HTTPError, ValueError) as e:
+        log.warning("Stream từ LLM lỗi", extra={"error": str(e), "error_type": type(e).__name__})
+        yield f"Error: Failed to connect to the LLM - {str(e)}"
+
 def display_output(output):
     """Hiển thị nội dung hợp đồng"""
     contract = output.get('json', {}).get('contract', "No contract received")
     st.markdown(contract, unsafe_allow_html=True)
 
+def render_message(message):
+    if message["role"] == "user":
+        st.markdown(f'<div class="user">{message["content"]}</div>', unsafe_allow_html=True)
+    elif message["role"] == "assistant":
+        # Lịch sử chỉ lưu text của câu trả lời (bản ghi cũ có thể vẫn là item n8n)
+        content = message["content"]
+        display_output(content if isinstance(content, dict) else {"json": {"contract": content}})
+
+def show_older_messages():
+    st.session_state.visible_messages += CHAT_WINDOW_TURNS * 2
+
 def main():
     st.set_page_config(page_title="Trợ lý AI", page_icon="🤖", layout="centered")
+    start_metrics_server()
+    prune_chat_history()
 
-    st.markdown(
-        """
-        <style>
-            .assistant {
-                padding: 10px;
-                border-radius: 10px;
-                max-width: 75%;
-                background: none; /* Màu trong suốt */
-                text-align: left;
-            }
-            .user {
-                padding: 10px;
-                border-radius: 10px;
-                max-width: 75%;
-                background: none; /* Màu trong suốt */
-                text-align: right;
-                margin-left: auto;
-            }
-            .assistant::before { content: "🤖 "; font-weight: bold; }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
+    # CSS (assets/chat.css), logo và lời chào được cache, chỉ đọc lại khi file thay đổi
+    st.markdown(resources.style_tag("chat.css"), unsafe_allow_html=True)
     
     # Hiển thị logo (nếu có)
-    try:
-        col1, col2, col3 = st.columns([3, 2, 3])
-        with col2:
-            st.image("logo.png")
-    except:
-        pass
+    logo = resources.read_bytes("logo.png")
+    if logo:
+        try:
+            col1, col2, col3 = st.columns([3, 2, 3])
+            with col2:
+                st.image(logo)
+        except Exception:
+            pass
     
     # Đọc nội dung tiêu đề từ file
-    try:
-        with open("00.xinchao.txt", "r", encoding="utf-8") as file:
-            title_content = file.read()
-    except Exception as e:
-        title_content = "Trợ lý AI"
+    title_content = resources.read_text("00.xinchao.txt", "Trợ lý AI")
 
     st.markdown(
         f"""<h1 style="text-align: center; font-size: 24px;">{title_content}</h1>""",
         unsafe_allow_html=True
     )
 
-    # Khởi tạo session state
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    # Khởi tạo session state; session id nằm trên URL (?session=) để tải lại trang vẫn
+    # tiếp tục được hội thoại đã lưu phía server
     if "session_id" not in st.session_state:
-        st.session_state.session_id = generate_session_id()
+        st.session_state.session_id = parse_session_id(st.query_params.get("session")) or generate_session_id()
+    if st.query_params.get("session") != st.session_state.session_id:
+        st.query_params["session"] = st.session_state.session_id
+    if "visible_messages" not in st.session_state:
+        st.session_state.visible_messages = CHAT_WINDOW_TURNS * 2
+    session_id = st.session_state.session_id
+    sessions = get_session_store()
+    # Log của lượt chat gắn với session id
+    set_correlation_id(session_id)
 
-    # Hiển thị lịch sử tin nhắn
-    for message in st.session_state.messages:
-        if message["role"] == "user":
-            st.markdown(f'<div class="user">{message["content"]}</div>', unsafe_allow_html=True)
-        elif message["role"] == "assistant":
-            display_output(message["content"])
+    # Chỉ hiển thị các tin nhắn gần nhất; tin cũ hơn (có thể đã nằm trên đĩa) tải khi cần
+    hidden = sessions.length(session_id) - st.session_state.visible_messages
+    if hidden > 0:
+        st.button(f"⬆️ Xem tin nhắn cũ hơn ({hidden} tin)", on_click=show_older_messages, use_container_width=True)
+    for message in sessions.window(session_id, st.session_state.visible_messages):
+        render_message(message)
 
     # Ô nhập liệu cho người dùng
     if prompt := st.chat_input("Nhập nội dung cần trao đổi ở đây nhé?"):
-        # Lưu tin nhắn của user vào session state
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        # Context lấy trước khi thêm câu hỏi mới (câu hỏi đã đi trong chatInput)
+        context = sessions.context(session_id)
+        knowledge = get_knowledge_index()
+        sessions.append(session_id, "user", prompt)
+        # Lượt mới thu cửa sổ về mặc định (áp dụng từ lần render sau)
+        st.session_state.visible_messages = CHAT_WINDOW_TURNS * 2
         
         # Hiển thị tin nhắn user vừa gửi
         st.markdown(f'<div class="user">{prompt}</div>', unsafe_allow_html=True)
 
-        # Gửi yêu cầu đến LLM và nhận phản hồi
-        with st.spinner("Đang chờ phản hồi từ AI..."):
-            llm_response = send_message_to_llm(st.session_state.session_id, prompt)
-
-        # Lưu phản hồi của AI vào session state
-        st.session_state.messages.append({"role": "assistant", "content": llm_response[0]})
-        
-        # Hiển thị phản hồi của AI
-        display_output(llm_response[0])
+        request_start = time.perf_counter()
+        answer_cache = get_answer_cache()
+        # Chỉ dùng cache cho câu mở đầu hội thoại (xem answer_cache.py)
+        cached = answer_cache.get(prompt, context)
+        # Đoạn tham khảo chỉ cần khi thật sự gọi webhook
+        passages = knowledge.search(prompt) if knowledge and not cached else []
+        if passages:
+            log.debug("Đoạn kiến thức kèm theo", extra={"passages": truncate(passages)})
+        if cached:
+            # Câu hỏi đã gặp (hoặc gần giống): trả lời ngay, không gọi webhook
+            mode = "cache"
+            log.info("Trả lời từ cache", extra={"kind": cached.kind, "score": round(cached.score, 3)})
+            llm_response = [{"json": {"contract": cached.answer}}]
+            display_output(llm_response[0])
+            st.caption("⚡ Trả lời từ bộ nhớ đệm")
+        elif STREAM_RESPONSES:
+            mode = "stream"
+            # Chờ token đầu tiên trong spinner, sau đó hiển thị dần từng đoạn
+            with st.spinner("Đang chờ phản hồi từ AI..."):
+                chunks = stream_message_to_llm(session_id, prompt, context, passages)
+                first_chunk = next(chunks, "")
+            CHAT_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - request_start)
+            contract = st.write_stream(itertools.chain([first_chunk], chunks))
+            log.debug("Contract nhận được", extra={"body": truncate(contract)})
+            llm_response = [{"json": {"contract": contract}}]
+        else:
+            mode = "single"
+            # Gửi yêu cầu đến LLM và nhận phản hồi
+            with st.spinner("Đang chờ phản hồi từ AI..."):
+                llm_response = send_message_to_llm(session_id, prompt, context, passages)
+            
+            # Hiển thị phản hồi của AI
+            display_output(llm_response[0])
+        answer = str(llm_response[0]["json"]["contract"])
+        outcome = "error" if answer.startswith("Error:") else "ok"
+        CHAT_SECONDS.labels(mode=mode, outcome=outcome).observe(time.perf_counter() - request_start)
+        if mode != "cache":
+            answer_cache.put(prompt, answer, context)
 
-        # Rerun để cập nhật giao diện
-        st.rerun()
+        # Lưu phản hồi của AI; tin nhắn đã hiển thị ở trên nên không cần rerun
+        sessions.append(session_id, "assistant", answer)
 
 if __name__ == "__main__":
-    main()
+    with resources.script_timer("chat", st.session_state):
+        main()
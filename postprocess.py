@@ -0,0 +1,190 @@
+"""
+Hậu xử lý video local: ghép nhiều clip, remux/transcode sang MP4 H.264 phát được trên web.
+
+- Ghép clip: nếu mọi clip cùng codec/độ phân giải/fps/âm thanh thì dùng concat demuxer
+  với -c copy (không encode lại); ngược lại chuẩn hoá từng clip rồi mới ghép.
+- finalize_video(): video đã là H.264 yuv420p + AAC thì chỉ remux để đưa moov lên đầu
+  (faststart) nếu cần; chỉ transcode khi codec không phát được trên trình duyệt.
+- Mọi việc chạy trong process pool (spawn) nên encode không chiếm CPU/GIL của server.
+
+Dùng từ dòng lệnh:
+    python postprocess.py merge output.mp4 clip1.mp4 clip2.mp4 ...
+    python postprocess.py finalize video.mp4
+"""
+
+import multiprocessing
+import os
+import re
+import struct
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from ffmpeg_utils import FFmpegError, run_ffmpeg, temp_output
+
+POSTPROCESS_WORKERS = int(os.environ.get("POSTPROCESS_WORKERS", "2"))
+TRANSCODE_PRESET = os.environ.get("TRANSCODE_PRESET", "veryfast")
+TRANSCODE_CRF = os.environ.get("TRANSCODE_CRF", "23")
+
+WEB_VIDEO_CODECS = {"h264"}
+WEB_AUDIO_CODECS = {"aac", None}
+
+_VIDEO_RE = re.compile(r"Stream #\d+:\d+.*?: Video: (\w+)[^,]*, (\w+)[^,]*, (\d+)x(\d+)")
+_FPS_RE = re.compile(r"([\d.]+) fps")
+_AUDIO_RE = re.compile(r"Stream #\d+:\d+.*?: Audio: (\w+)[^,]*, (\d+) Hz, ([\w.]+)")
+
+_executor = None
+
+
+def probe_streams(path) -> dict:
+    """Đọc codec/độ phân giải/fps/âm thanh từ output của `ffmpeg -i`"""
+    try:
+        stderr = run_ffmpeg(["-i", path])
+    except FFmpegError as e:
+        # ffmpeg -i không có output luôn trả mã lỗi, thông tin stream vẫn nằm trong stderr
+        stderr = str(e)
+    info = {"vcodec": None, "pix_fmt": None, "width": None, "height": None, "fps": None,
+            "acodec": None, "sample_rate": None, "channels": None}
+    video = _VIDEO_RE.search(stderr)
+    if video:
+        info["vcodec"], info["pix_fmt"] = video.group(1), video.group(2)
+        info["width"], info["height"] = int(video.group(3)), int(video.group(4))
+        fps = _FPS_RE.search(stderr[video.start():].split("\n", 1)[0])
+        info["fps"] = fps.group(1) if fps else None
+    audio = _AUDIO_RE.search(stderr)
+    if audio:
+        info["acodec"], info["sample_rate"], info["channels"] = audio.group(1), int(audio.group(2)), audio.group(3)
+    return info
+
+
+def has_faststart(path) -> bool:
+    """moov đứng trước mdat thì trình duyệt phát được ngay khi mới tải phần đầu"""
+    with open(path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            size, kind = struct.unpack(">I4s", f.read(8))
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+            elif size == 0:
+                size = file_size - offset
+            if kind == b"moov":
+                return True
+            if kind == b"mdat" or size < 8:
+                return False
+            offset += size
+    return False
+
+
+def is_web_friendly(info: dict) -> bool:
+    return (
+        info["vcodec"] in WEB_VIDEO_CODECS
+        and info["pix_fmt"] == "yuv420p"
+        and info["acodec"] in WEB_AUDIO_CODECS
+    )
+
+
+def _transcode_args(info: dict = None) -> list:
+    args = ["-c:v", "libx264", "-preset", TRANSCODE_PRESET, "-crf", TRANSCODE_CRF, "-pix_fmt", "yuv420p"]
+    if info and info["width"] and info["height"]:
+        # libx264 yêu cầu kích thước chẵn
+        args += ["-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2"]
+    return args + ["-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart"]
+
+
+def finalize_video(path: str) -> str:
+    """Đảm bảo video phát được trên web; trả về "ok", "remux" hoặc "transcode" """
+    path = Path(path)
+    info = probe_streams(path)
+    if is_web_friendly(info):
+        if has_faststart(path):
+            return "ok"
+        action, codec_args = "remux", ["-c", "copy", "-movflags", "+faststart"]
+    else:
+        action, codec_args = "transcode", _transcode_args(info)
+    tmp = temp_output(path)
+    run_ffmpeg(["-y", "-i", path, "-map", "0:v:0", "-map", "0:a:0?", *codec_args, tmp], timeout=3600)
+    os.replace(tmp, path)
+    return action
+
+
+def _stream_signature(info: dict) -> tuple:
+    return (info["vcodec"], info["pix_fmt"], info["width"], info["height"], info["fps"],
+            info["acodec"], info["sample_rate"], info["channels"])
+
+
+def _concat_entry(path: Path) -> str:
+    """Một dòng trong file danh sách của concat demuxer (escape dấu nháy đơn)"""
+    escaped = str(path).replace("'", "'\\''")
+    return f"file '{escaped}'\n"
+
+
+def merge_clips(clip_paths: list, output: str) -> str:
+    """Ghép các clip theo thứ tự thành một MP4 faststart; trả về "copy" hoặc "transcode" """
+    clips = [Path(p).resolve() for p in clip_paths]
+    output = Path(output)
+    if not clips:
+        raise ValueError("Không có clip nào để ghép")
+    infos = [probe_streams(clip) for clip in clips]
+    same_streams = len({_stream_signature(info) for info in infos}) == 1
+    can_copy = same_streams and is_web_friendly(infos[0])
+
+    with tempfile.TemporaryDirectory(dir=output.parent) as work_dir:
+        work_dir = Path(work_dir)
+        if not can_copy:
+            # Chuẩn hoá từng clip về cùng định dạng (theo clip đầu) để concat không lỗi
+            first = infos[0]
+            scale = f"scale={first['width'] or 1280}:{first['height'] or 720}:force_original_aspect_ratio=decrease," \
+                    f"pad={first['width'] or 1280}:{first['height'] or 720}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+            fps = first["fps"] or "30"
+            normalized = []
+            for index, clip in enumerate(clips):
+                target = work_dir / f"clip_{index:04d}.mp4"
+                run_ffmpeg([
+                    "-y", "-i", clip, "-f", "lavfi", "-i", "anullsrc=channel_layout=stereo:sample_rate=48000",
+                    "-map", "0:v:0", "-map", "0:a:0?" if infos[index]["acodec"] else "1:a:0", "-shortest",
+                    "-vf", f"{scale},fps={fps}", "-ar", "48000", "-ac", "2",
+                    *_transcode_args(), target,
+                ], timeout=3600)
+                normalized.append(target)
+            clips = normalized
+
+        list_file = work_dir / "clips.txt"
+        list_file.write_text("".join(_concat_entry(clip) for clip in clips))
+        tmp = temp_output(output)
+        run_ffmpeg(["-y", "-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", "-movflags", "+faststart", tmp], timeout=3600)
+        os.replace(tmp, output)
+    return "copy" if can_copy else "transcode"
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Process pool dùng chung; spawn thay vì fork vì process Streamlit có nhiều thread"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=POSTPROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def submit_finalize(path: str):
+    """Chạy finalize_video trong process pool, trả về Future"""
+    return get_executor().submit(finalize_video, str(path))
+
+
+def submit_merge(clip_paths: list, output: str):
+    """Chạy merge_clips trong process pool, trả về Future"""
+    return get_executor().submit(merge_clips, [str(p) for p in clip_paths], str(output))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "merge":
+        print(merge_clips(sys.argv[3:], sys.argv[2]))
+    elif len(sys.argv) == 3 and sys.argv[1] == "finalize":
+        print(finalize_video(sys.argv[2]))
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,137 @@
+"""
+Đóng gói HLS nhiều mức chất lượng (480p / 720p / source) cho video đã lưu.
+
+Kết quả nằm trong generated_videos/.hls/<tên video>/ gồm master.m3u8 và một playlist +
+các segment .ts cho mỗi rendition. Player (hls.js hoặc HLS native của Safari) chọn
+rendition theo băng thông, nên video 4K khởi động nhanh trên mạng chậm và không phải
+tải full bitrate. Rendition lớn hơn video gốc thì bỏ qua.
+Mọi rendition (kể cả "source", giữ độ phân giải gốc) đều được encode lại với keyframe ép
+tại mỗi bội số HLS_SEGMENT_SECONDS, nên segment của các rendition dài đúng bằng nhau và
+thẳng hàng: player chuyển rendition ở ranh giới segment không bị giật. Copy stream gốc
+thì segment bị cắt theo keyframe có sẵn của encoder n8n (thường 8 s hoặc hơn).
+Việc đóng gói chạy trong process pool của postprocess, không chặn UI.
+
+HLS là tuỳ chọn và mặc định tắt (HLS_ENABLED=1 để bật): mỗi video tốn thêm tới ba lần
+encode x264. Không đọc được độ phân giải của video gốc thì chỉ đóng gói rendition "source".
+"""
+
+import os
+import shutil
+from pathlib import Path
+
+from ffmpeg_utils import run_ffmpeg
+from postprocess import get_executor, probe_streams
+
+HLS_ENABLED = os.environ.get("HLS_ENABLED", "0") not in ("0", "false", "False")
+HLS_SEGMENT_SECONDS = int(os.environ.get("HLS_SEGMENT_SECONDS", "4"))
+
+# (tên, cạnh ngắn, video bitrate, audio bitrate)
+RENDITION_LADDER = [
+    ("480p", 480, "1000k", "96k"),
+    ("720p", 720, "2500k", "128k"),
+]
+
+
+def hls_dir(video_dir: Path, video_name: str) -> Path:
+    return Path(video_dir) / ".hls" / Path(video_name).stem
+
+
+def master_playlist(video_dir: Path, video_name: str) -> Path:
+    """master.m3u8 nếu đã đóng gói và không cũ hơn video, ngược lại None"""
+    master = hls_dir(video_dir, video_name) / "master.m3u8"
+    try:
+        if master.stat().st_mtime >= (Path(video_dir) / video_name).stat().st_mtime:
+            return master
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def remove_hls(video_dir: Path, video_name: str):
+    shutil.rmtree(hls_dir(video_dir, video_name), ignore_errors=True)
+
+
+def _hls_args(out_dir: Path) -> list:
+    return [
+        "-f", "hls", "-hls_time", HLS_SEGMENT_SECONDS, "-hls_playlist_type", "vod",
+        "-hls_segment_filename", out_dir / "seg_%04d.ts", out_dir / "index.m3u8",
+    ]
+
+
+def _bits(rate: str) -> int:
+    return int(rate.rstrip("k")) * 1000
+
+
+def package_hls(video_path: str) -> str:
+    """Tạo ladder + master playlist cho một video; trả về đường dẫn master.m3u8"""
+    video_path = Path(video_path)
+    video_dir = video_path.parent
+    target = hls_dir(video_dir, video_path.name)
+    work = target.with_name(f".{target.name}.tmp")
+    shutil.rmtree(work, ignore_errors=True)
+    work.mkdir(parents=True)
+
+    info = probe_streams(video_path)
+    width, height = info["width"] or 0, info["height"] or 0
+    portrait = height > width
+    has_audio = info["acodec"] is not None
+    # Keyframe theo thời gian (không theo số frame) nên đúng với mọi fps của video gốc
+    keyframes = ["-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})", "-sc_threshold", "0"]
+    variants = []
+
+    # ffprobe không trả về kích thước thì không tính được tỉ lệ scale → chỉ còn rendition gốc
+    ladder = RENDITION_LADDER if width and height else []
+    for name, size, video_rate, audio_rate in ladder:
+        if size >= min(width, height):
+            continue
+        out_dir = work / name
+        out_dir.mkdir()
+        scale = f"scale={size}:-2" if portrait else f"scale=-2:{size}"
+        run_ffmpeg([
+            "-y", "-i", video_path, "-map", "0:v:0", "-map", "0:a:0?",
+            "-vf", scale, "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+            "-b:v", video_rate, "-maxrate", video_rate, "-bufsize", f"{2 * int(video_rate[:-1])}k", *keyframes,
+            "-c:a", "aac", "-b:a", audio_rate, "-ac", "2", *_hls_args(out_dir),
+        ], timeout=3600)
+        # scale=-2 làm tròn cạnh còn lại về số chẵn gần nhất
+        res_w, res_h = (size, 2 * round(height * size / width / 2)) if portrait else (2 * round(width * size / height / 2), size)
+        variants.append((name, _bits(video_rate) + (_bits(audio_rate) if has_audio else 0), res_w, res_h))
+
+    # Rendition gốc: giữ độ phân giải, encode chất lượng cao với cùng lịch keyframe
+    out_dir = work / "source"
+    out_dir.mkdir()
+    run_ffmpeg([
+        "-y", "-i", video_path, "-map", "0:v:0", "-map", "0:a:0?",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "20", *keyframes,
+        "-c:a", "aac", *_hls_args(out_dir),
+    ], timeout=3600)
+    duration = _playlist_duration(out_dir / "index.m3u8")
+    source_bytes = sum(segment.stat().st_size for segment in out_dir.glob("seg_*.ts"))
+    source_bandwidth = int(source_bytes * 8 / duration) if duration else 8_000_000
+    variants.append(("source", source_bandwidth, width, height))
+
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for name, bandwidth, res_w, res_h in variants:
+        resolution = f",RESOLUTION={res_w}x{res_h}" if res_w and res_h else ""
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth}{resolution}")
+        lines.append(f"{name}/index.m3u8")
+    (work / "master.m3u8").write_text("\n".join(lines) + "\n")
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(work, target)
+    return str(target / "master.m3u8")
+
+
+def _playlist_duration(playlist: Path) -> float:
+    total = 0.0
+    for line in playlist.read_text().splitlines():
+        if line.startswith("#EXTINF:"):
+            total += float(line[8:].split(",")[0])
+    return total
+
+
+def submit_package(video_path: str):
+    """Đóng gói HLS trong process pool, trả về Future (None nếu tắt HLS)"""
+    if not HLS_ENABLED:
+        return None
+    return get_executor().submit(package_hls, str(video_path))
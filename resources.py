@@ -0,0 +1,167 @@
+"""
+Tài nguyên dùng chung cho hai app Streamlit, giữ ở cấp module để không phải làm lại mỗi rerun.
+
+Streamlit chạy lại cả script ở mỗi lần tương tác nhưng module đã import thì vẫn nằm trong
+process, nên:
+- File tĩnh (CSS trong assets/, logo, lời chào...) đọc qua read_text/read_bytes được cache
+  theo chữ ký (mtime_ns, size): mỗi lượt chỉ tốn một lần stat, sửa file trên server thì
+  lượt sau tự đọc lại, không cần khởi động lại app.
+- Module nặng chỉ dùng ở vài nhánh (pydantic qua extractors, NumPy...) import bằng
+  lazy_import: chỉ import thật ở lần đầu truy cập thuộc tính.
+- Thời gian chạy mỗi lượt script ghi vào histogram streamlit_script_seconds{app, run}
+  (run="first" cho lượt đầu của một phiên trình duyệt, "rerun" cho các lượt sau).
+
+Đo bằng AppTest (thời gian tổng gồm cả phần AppTest biên dịch lại script mỗi lượt, server
+thật thì cache bytecode; cột "script" là thời gian chạy thân script):
+    python resources.py bench app.py 20
+    python resources.py bench n8n-streamlit-agent-basic-auth.py 20
+"""
+
+import functools
+import importlib
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from metrics import Histogram
+
+ASSETS_DIR = Path(__file__).resolve().parent / "assets"
+
+SCRIPT_SECONDS = Histogram("streamlit_script_seconds", "Thời gian chạy một lượt script Streamlit", ["app", "run"])
+
+_FIRST_RUN_KEY = "_resources_script_ran"
+
+# (tên loader, đường dẫn) → (chữ ký file, giá trị đã nạp)
+_file_cache = {}
+# Lượt script gần nhất: (app, giây), dùng cho lệnh bench
+_last_run = None
+
+
+def file_signature(path) -> tuple:
+    """(mtime_ns, size) của file, None nếu không đọc được"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def cached_file(loader):
+    """Decorator cho hàm loader(path): chỉ chạy lại khi file đổi; file thiếu/lỗi thì trả default"""
+
+    @functools.wraps(loader)
+    def wrapper(path, default=None):
+        path = os.fspath(path)
+        signature = file_signature(path)
+        if signature is None:
+            return default
+        key = (loader.__qualname__, path)
+        cached = _file_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        try:
+            value = loader(path)
+        except (OSError, ValueError):
+            return default
+        _file_cache[key] = (signature, value)
+        return value
+
+    return wrapper
+
+
+@cached_file
+def read_text(path) -> str:
+    return Path(path).read_text(encoding="utf-8")
+
+
+@cached_file
+def read_bytes(path) -> bytes:
+    return Path(path).read_bytes()
+
+
+def style_tag(name: str) -> str:
+    """Thẻ <style> từ file CSS trong assets/ (rỗng nếu thiếu file)"""
+    css = read_text(ASSETS_DIR / name, "")
+    return f"<style>\n{css}</style>" if css else ""
+
+
+@functools.lru_cache(maxsize=None)
+def ensure_dir(path) -> Path:
+    """Tạo thư mục một lần mỗi process thay vì mkdir ở mỗi lượt script"""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class LazyModule:
+    """Đại diện cho một module, chỉ import ở lần đầu truy cập thuộc tính"""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr):
+        # import_module của module đã nạp chỉ là tra sys.modules
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self) -> str:
+        loaded = "đã import" if self._name in sys.modules else "chưa import"
+        return f"<LazyModule {self._name} ({loaded})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+@contextmanager
+def script_timer(app: str, session_state):
+    """Đo một lượt chạy script; session_state là st.session_state của phiên hiện tại"""
+    global _last_run
+    run = "rerun" if session_state.get(_FIRST_RUN_KEY) else "first"
+    session_state[_FIRST_RUN_KEY] = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SCRIPT_SECONDS.labels(app=app, run=run).observe(elapsed)
+        _last_run = (app, elapsed)
+
+
+def bench(script: str, runs: int = 20) -> dict:
+    """Chạy script bằng AppTest: lượt đầu (gồm import, khởi tạo tài nguyên) rồi runs lượt rerun"""
+    from streamlit.testing.v1 import AppTest
+
+    app_test = AppTest.from_file(script, default_timeout=60)
+    samples = []
+    for _ in range(runs + 1):
+        start = time.perf_counter()
+        app_test.run()
+        samples.append((time.perf_counter() - start, _last_run[1] if _last_run else 0.0))
+    if app_test.exception:
+        raise RuntimeError(f"{script} lỗi: {[e.value for e in app_test.exception]}")
+    first, reruns = samples[0], sorted(samples[1:])
+    script_reruns = sorted(sample[1] for sample in samples[1:])
+    return {
+        "script": script,
+        "first_ms": round(first[0] * 1000, 1),
+        "first_script_ms": round(first[1] * 1000, 1),
+        "rerun_median_ms": round(reruns[len(reruns) // 2][0] * 1000, 1),
+        "rerun_script_median_ms": round(script_reruns[len(script_reruns) // 2] * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "bench":
+        # App import "resources" như module riêng (khác __main__): đọc số đo từ module đó
+        import resources
+
+        result = resources.bench(sys.argv[2], int(sys.argv[3]) if len(sys.argv) == 4 else 20)
+        print(
+            f"{result['script']}: lượt đầu {result['first_ms']} ms (script {result['first_script_ms']} ms), "
+            f"rerun trung vị {result['rerun_median_ms']} ms (script {result['rerun_script_median_ms']} ms)"
+        )
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,181 @@
+"""
+Cache kết quả tạo video theo nội dung (prompt đã chuẩn hoá + video_params).
+
+Mỗi entry giữ một bản video riêng trong thư mục cache (hard link tới file trong
+generated_videos nên không tốn thêm dung lượng) cùng metadata response của n8n.
+Prompt + tham số giống hệt lần trước sẽ trả về ngay mà không cần render lại.
+Entry hết hạn theo TTL; khi tổng dung lượng vượt ngưỡng thì xoá entry ít dùng nhất (LRU).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from pathlib import Path
+
+from metrics import Counter
+
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get("RESULT_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+
+CACHE_LOOKUPS = Counter("result_cache_lookups", "Tra cứu cache kết quả (hit / miss / expired)", ["result"])
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Chuẩn hoá prompt: Unicode NFC, bỏ khoảng trắng thừa, không phân biệt hoa thường"""
+    prompt = unicodedata.normalize("NFC", prompt or "")
+    return " ".join(prompt.split()).casefold()
+
+
+def cache_key(prompt: str, params: dict = None) -> str:
+    """Hash nội dung của prompt + params, thứ tự key trong params không ảnh hưởng"""
+    canonical = json.dumps(
+        {"prompt": normalize_prompt(prompt), "params": params or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Cache bền vững (SQLite + file video) cho kết quả tạo video"""
+
+    def __init__(
+        self,
+        video_dir: Path,
+        ttl_seconds: int = RESULT_CACHE_TTL_SECONDS,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+    ):
+        self.video_dir = Path(video_dir)
+        self.cache_dir = self.video_dir / ".cache"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._db_path = self.cache_dir / "results.db"
+        self._lock = threading.Lock()
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    prompt TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    video_name TEXT NOT NULL,
+                    response TEXT,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self._db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _blob_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.mp4"
+
+    def get(self, prompt: str, params: dict = None) -> dict:
+        """Trả về {"video_path", "video_name", "response"} nếu có cache hợp lệ, ngược lại None"""
+        key = cache_key(prompt, params)
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            row = conn.execute("SELECT * FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                CACHE_LOOKUPS.labels(result="miss").inc()
+                return None
+            blob = self._blob_path(key)
+            if now - row["created_at"] > self.ttl_seconds or not blob.exists():
+                self._delete_locked(conn, key)
+                CACHE_LOOKUPS.labels(result="expired").inc()
+                return None
+            CACHE_LOOKUPS.labels(result="hit").inc()
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+
+        # File trong thư viện có thể đã bị xoá → khôi phục từ bản cache
+        video_path = self.video_dir / row["video_name"]
+        if not video_path.exists():
+            _link_or_copy(blob, video_path)
+        return {
+            "video_path": str(video_path),
+            "video_name": row["video_name"],
+            "response": json.loads(row["response"]) if row["response"] else None,
+        }
+
+    def put(self, prompt: str, params: dict, video_path: str, response_data=None):
+        """Lưu video vừa tạo vào cache"""
+        video_path = Path(video_path)
+        key = cache_key(prompt, params)
+        blob = self._blob_path(key)
+        if blob.exists():
+            blob.unlink()
+        _link_or_copy(video_path, blob)
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    prompt,
+                    json.dumps(params or {}, sort_keys=True, ensure_ascii=False),
+                    video_path.name,
+                    json.dumps(response_data, ensure_ascii=False) if response_data is not None else None,
+                    blob.stat().st_size,
+                    now,
+                    now,
+                ),
+            )
+            self._evict_locked(conn)
+
+    def remove_video(self, video_name: str):
+        """Xoá các entry trỏ tới video này (người dùng đã xoá video khỏi thư viện)"""
+        with self._lock, self._transaction() as conn:
+            for row in conn.execute("SELECT key FROM results WHERE video_name = ?", (video_name,)).fetchall():
+                self._delete_locked(conn, row["key"])
+
+    def clear(self):
+        """Xoá toàn bộ cache (dùng khi người dùng xoá hết video)"""
+        with self._lock, self._transaction() as conn:
+            for row in conn.execute("SELECT key FROM results").fetchall():
+                self._delete_locked(conn, row["key"])
+
+    def _evict_locked(self, conn: sqlite3.Connection):
+        """Xoá entry hết hạn, sau đó xoá theo LRU đến khi dưới ngưỡng dung lượng"""
+        cutoff = time.time() - self.ttl_seconds
+        for row in conn.execute("SELECT key FROM results WHERE created_at < ?", (cutoff,)).fetchall():
+            self._delete_locked(conn, row["key"])
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for row in conn.execute("SELECT key, size FROM results ORDER BY last_access ASC").fetchall():
+            self._delete_locked(conn, row["key"])
+            total -= row["size"]
+            if total <= self.max_bytes:
+                break
+
+    def _delete_locked(self, conn: sqlite3.Connection, key: str):
+        conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        blob = self._blob_path(key)
+        if blob.exists():
+            blob.unlink()
+
+
+def _link_or_copy(src: Path, dst: Path):
+    """Hard link nếu được (không tốn dung lượng), ngược lại copy"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
@@ -0,0 +1,156 @@
+"""
+Bộ lập lịch giữa UI và n8n: giới hạn số job render cùng lúc và chia đều cho người dùng.
+
+- Giới hạn toàn cục (SCHEDULER_MAX_CONCURRENT) số job đang chiếm backend render.
+- Mỗi owner (session/user/batch) chỉ chạy tối đa SCHEDULER_PER_OWNER job cùng lúc; job
+  của owner đã hết quota được bỏ qua chứ không chặn hàng đợi (không head-of-line blocking).
+- Lớp ưu tiên theo chi phí render: video ngắn/HD chạy trước video 60s/4K. Job chờ lâu
+  được tăng dần ưu tiên (aging) nên job nặng không bị bỏ đói.
+- position() cho UI biết job đang đứng thứ mấy trong hàng đợi.
+
+Mọi thao tác acquire/release chạy trên event loop nền; position() đọc được từ thread khác.
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from metrics import Gauge, Histogram
+
+SCHEDULER_MAX_CONCURRENT = int(os.environ.get("SCHEDULER_MAX_CONCURRENT", "4"))
+SCHEDULER_PER_OWNER = int(os.environ.get("SCHEDULER_PER_OWNER", "2"))
+# Chờ mỗi khoảng này thì job được tăng một bậc ưu tiên
+SCHEDULER_AGING_SECONDS = float(os.environ.get("SCHEDULER_AGING_SECONDS", "120"))
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITY_LABELS = {PRIORITY_HIGH: "cao", PRIORITY_NORMAL: "thường", PRIORITY_LOW: "thấp"}
+
+QUEUE_WAIT_SECONDS = Histogram("scheduler_queue_wait_seconds", "Thời gian job chờ slot render", ["priority"])
+JOBS_RUNNING = Gauge("scheduler_jobs_running", "Số job đang chiếm slot render")
+JOBS_WAITING = Gauge("scheduler_jobs_waiting", "Số job đang xếp hàng")
+
+
+def classify_priority(params: dict) -> int:
+    """Video ngắn/HD rẻ → ưu tiên cao; video dài hoặc 4K → ưu tiên thấp"""
+    try:
+        duration = int(params.get("duration", 10))
+    except (TypeError, ValueError):
+        duration = 10
+    quality = params.get("quality", "HD")
+    if duration >= 45 or quality == "4K":
+        return PRIORITY_LOW
+    if duration <= 15 and quality == "HD":
+        return PRIORITY_HIGH
+    return PRIORITY_NORMAL
+
+
+@dataclass
+class _Waiter:
+    job_id: str
+    owner: str
+    priority: int
+    seq: int
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    def sort_key(self, now: float, aging_seconds: float) -> tuple:
+        waited_levels = int((now - self.enqueued_at) // aging_seconds) if aging_seconds > 0 else 0
+        return (max(PRIORITY_HIGH, self.priority - waited_levels), self.seq)
+
+
+class Scheduler:
+    def __init__(
+        self,
+        max_concurrent: int = SCHEDULER_MAX_CONCURRENT,
+        per_owner: int = SCHEDULER_PER_OWNER,
+        aging_seconds: float = SCHEDULER_AGING_SECONDS,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.per_owner = max(1, per_owner)
+        self.aging_seconds = aging_seconds
+        self._waiting = []
+        self._running = {}  # owner → số job đang chạy
+        self._running_total = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        JOBS_RUNNING.set_function(lambda: self._running_total)
+        JOBS_WAITING.set_function(lambda: len(self._waiting))
+
+    @asynccontextmanager
+    async def slot(self, job_id: str, owner: str, priority: int):
+        """Giữ một slot render trong suốt khối with"""
+        await self.acquire(job_id, owner, priority)
+        try:
+            yield
+        finally:
+            self.release(owner)
+
+    async def acquire(self, job_id: str, owner: str, priority: int):
+        waiter = _Waiter(job_id, owner, priority, next(self._seq), asyncio.get_running_loop().create_future())
+        with self._lock:
+            self._waiting.append(waiter)
+            self._dispatch_locked()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiting:
+                    self._waiting.remove(waiter)
+                elif waiter.future.done() and not waiter.future.cancelled():
+                    # Đã được cấp slot nhưng bị huỷ ngay sau đó → trả slot lại
+                    self._release_locked(owner)
+            raise
+
+    def release(self, owner: str):
+        with self._lock:
+            self._release_locked(owner)
+
+    def position(self, job_id: str) -> int:
+        """Vị trí (từ 1) của job trong hàng đợi, None nếu job không còn chờ"""
+        with self._lock:
+            now = time.monotonic()
+            ordered = sorted(self._waiting, key=lambda w: w.sort_key(now, self.aging_seconds))
+            # Ước lượng theo quota: job thứ n của một owner phải chờ n // per_owner lượt
+            seen = {}
+            rounds = []
+            for waiter in ordered:
+                rank = seen.get(waiter.owner, 0)
+                seen[waiter.owner] = rank + 1
+                rounds.append((rank // self.per_owner, waiter.sort_key(now, self.aging_seconds), waiter.job_id))
+            for index, (_, _, waiting_id) in enumerate(sorted(rounds), start=1):
+                if waiting_id == job_id:
+                    return index
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"running": self._running_total, "waiting": len(self._waiting), "max_concurrent": self.max_concurrent}
+
+    def _release_locked(self, owner: str):
+        self._running_total -= 1
+        self._running[owner] -= 1
+        if not self._running[owner]:
+            del self._running[owner]
+        self._dispatch_locked()
+
+    def _dispatch_locked(self):
+        """Cấp slot cho job ưu tiên nhất mà owner còn quota"""
+        now = time.monotonic()
+        while self._running_total < self.max_concurrent and self._waiting:
+            eligible = [w for w in self._waiting if self._running.get(w.owner, 0) < self.per_owner]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: w.sort_key(now, self.aging_seconds))
+            self._waiting.remove(waiter)
+            if waiter.future.done():
+                continue
+            self._running_total += 1
+            self._running[waiter.owner] = self._running.get(waiter.owner, 0) + 1
+            QUEUE_WAIT_SECONDS.labels(priority=waiter.priority).observe(now - waiter.enqueued_at)
+            waiter.future.set_result(None)
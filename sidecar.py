@@ -0,0 +1,74 @@
+"""
+Sidecar HTTP server (aiohttp) chạy trên event loop nền, cạnh Streamlit.
+
+Streamlit không cho khai báo route riêng, nên các endpoint nhẹ mà n8n hoặc trình duyệt
+cần gọi trực tiếp (callback job, ...) được đặt ở đây.
+Các module đăng ký route bằng add_route() rồi gọi start() một lần cho cả process.
+
+Streamlit có thể chạy lại hàm @st.cache_resource (xoá cache, sửa code) trong khi sidecar
+vẫn chạy: đăng ký lại cùng method + path thì handler mới thay handler cũ, vì router chỉ
+giữ một hàm chuyển tiếp tra _routes mỗi request.
+"""
+
+import os
+
+from aiohttp import web
+
+from async_runtime import run_coroutine
+from log_utils import get_logger
+
+log = get_logger("sidecar")
+
+SIDECAR_HOST = os.environ.get("SIDECAR_HOST", "0.0.0.0")
+SIDECAR_PORT = int(os.environ.get("SIDECAR_PORT", "8503"))
+
+# (method, path) → handler hiện hành, theo thứ tự đăng ký
+_routes = {}
+_runner = None
+
+
+def add_route(method: str, path: str, handler):
+    """Đăng ký route; route mới (method + path chưa có) phải đăng ký trước start()"""
+    key = (method, path)
+    if _runner is not None and key not in _routes:
+        raise RuntimeError("Sidecar đã chạy, không thể đăng ký thêm route")
+    _routes[key] = handler
+
+
+def _dispatch(key: tuple):
+    async def handle(request: web.Request) -> web.StreamResponse:
+        return await _routes[key](request)
+
+    return handle
+
+
+def is_running() -> bool:
+    return _runner is not None
+
+
+async def _start(host: str, port: int):
+    global _runner
+    app = web.Application()
+    for method, path in _routes:
+        app.router.add_route(method, path, _dispatch((method, path)))
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError:
+        await runner.cleanup()
+        raise
+    _runner = runner
+
+
+def start(host: str = SIDECAR_HOST, port: int = SIDECAR_PORT) -> bool:
+    """Khởi động sidecar (idempotent). Trả về False nếu không bind được port."""
+    if _runner is not None:
+        return True
+    try:
+        run_coroutine(_start(host, port)).result(timeout=10)
+    except OSError as e:
+        log.warning("Sidecar không bind được", extra={"host": host, "port": port, "error": str(e)})
+        return False
+    log.info("Sidecar đang chạy", extra={"url": f"http://{host}:{port}"})
+    return True
@@ -0,0 +1,49 @@
+from answer_cache import AnswerCache
+
+FOLLOW_UP = {"summary": "", "recentMessages": [{"role": "user", "content": "shop bán những gì?"}]}
+
+
+def test_exact_and_unaccented_questions_hit():
+    cache = AnswerCache()
+    cache.put("Shop mở cửa lúc mấy giờ?", "8 giờ sáng")
+    assert cache.get("shop mở cửa lúc mấy giờ").kind == "exact"
+    match = cache.get("shop mo cua luc may gio?")
+    assert match is not None and match.answer == "8 giờ sáng"
+
+
+def test_different_numbers_or_negation_never_match():
+    cache = AnswerCache(threshold=0.5)
+    cache.put("giá gói 100 video là bao nhiêu", "1 triệu")
+    cache.put("shop có nhận thanh toán thẻ không", "Có")
+    assert cache.get("giá gói 200 video là bao nhiêu") is None
+    assert cache.get("shop không nhận thanh toán thẻ à") is None
+
+
+def test_short_questions_and_errors_are_not_cached():
+    cache = AnswerCache()
+    cache.put("còn gì", "nhiều lắm")
+    cache.put("shop có ship cod không", "Error: timeout")
+    assert cache.get("còn gì") is None
+    assert cache.get("shop có ship cod không") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_follow_up_questions_bypass_shared_cache():
+    cache = AnswerCache()
+    cache.put("còn cái thứ hai thì sao", "Cái thứ hai giá 50k", FOLLOW_UP)
+    assert cache.stats()["entries"] == 0
+
+    cache.put("còn cái thứ hai thì sao", "Câu trả lời của session khác")
+    assert cache.get("còn cái thứ hai thì sao", FOLLOW_UP) is None
+    assert cache.get("còn cái thứ hai thì sao", {"summary": "", "recentMessages": []}) is not None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put("shop ở đâu vậy", "Hà Nội")
+    cache.put("shop có ship cod không", "Có")
+    assert cache.get("shop ở đâu vậy") is not None
+    cache.put("shop mở cửa mấy giờ", "8 giờ")
+    assert cache.get("shop có ship cod không") is None
+    assert cache.get("shop ở đâu vậy") is not None
+    assert cache.stats()["evicted"]["lru"] == 1
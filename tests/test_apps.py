@@ -0,0 +1,25 @@
+"""Chạy thử mỗi app Streamlit một lượt bằng AppTest (không cần webhook n8n)"""
+
+from pathlib import Path
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Các app ghi generated_videos/, .chat_history/... theo thư mục hiện tại
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize("script", ["app.py", "n8n-streamlit-agent-basic-auth.py"])
+def test_app_renders_without_exceptions(workdir, script):
+    app_test = AppTest.from_file(str(ROOT / script), default_timeout=60)
+    app_test.run()
+    assert not app_test.exception, [e.value for e in app_test.exception]
+    # Lượt rerun dùng lại tài nguyên đã cache
+    app_test.run()
+    assert not app_test.exception, [e.value for e in app_test.exception]
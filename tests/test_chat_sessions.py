@@ -0,0 +1,57 @@
+import chat_sessions
+from chat_history import ChatHistory
+from chat_sessions import ChatSessionStore
+
+
+def _chat(store: ChatSessionStore, session_id: str, turns: int):
+    for index in range(turns):
+        store.append(session_id, "user", f"câu hỏi {index}")
+        store.append(session_id, "assistant", f"trả lời {index}")
+
+
+def test_history_survives_restart_without_flush(tmp_path):
+    history = ChatHistory("s1", max_in_memory=4, spill_dir=tmp_path)
+    for index in range(7):
+        history.append("user", f"tin {index}")
+    assert history.spilled > 0
+
+    # Process mới: không ai gọi flush() nhưng mọi tin nhắn đã có trên đĩa
+    reopened = ChatHistory("s1", max_in_memory=4, spill_dir=tmp_path)
+    assert len(reopened) == 7
+    assert [m["content"] for m in reopened.window(3)] == ["tin 4", "tin 5", "tin 6"]
+    assert reopened.slice(0, 2) == history.slice(0, 2)
+
+
+def test_partial_last_line_is_dropped(tmp_path):
+    history = ChatHistory("s1", spill_dir=tmp_path)
+    history.append("user", "xin chào")
+    with open(history.spill_path, "ab") as f:
+        f.write(b'{"role": "assistant", "cont')
+
+    reopened = ChatHistory("s1", spill_dir=tmp_path)
+    assert len(reopened) == 1
+    reopened.append("assistant", "chào bạn")
+    assert [m["content"] for m in ChatHistory("s1", spill_dir=tmp_path).window(5)] == ["xin chào", "chào bạn"]
+
+
+def test_context_is_bounded_and_summary_persists(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_sessions, "CHAT_CONTEXT_TURNS", 2)
+    store = ChatSessionStore(spill_dir=tmp_path)
+    _chat(store, "s1", 6)
+
+    context = store.context("s1")
+    assert len(context["recentMessages"]) <= 2 * 2 + 1
+    assert "câu hỏi 0" in context["summary"]
+
+    # Store mới (restart) không có eviction/flush trước đó: vẫn cùng lịch sử và summary
+    restarted = ChatSessionStore(spill_dir=tmp_path)
+    assert restarted.length("s1") == 12
+    assert restarted.context("s1") == context
+
+
+def test_evicted_session_reloads_from_disk(tmp_path):
+    store = ChatSessionStore(memory_budget=0, spill_dir=tmp_path)
+    _chat(store, "s1", 2)
+    _chat(store, "s2", 1)
+    assert "s1" not in store._sessions
+    assert [m["content"] for m in store.window("s1", 2)] == ["câu hỏi 1", "trả lời 1"]
@@ -0,0 +1,77 @@
+import re
+
+import httpx
+import pytest
+
+import downloader
+import http_client
+from downloader import download_file
+
+DATA = bytes(range(256)) * 64  # 16 KiB
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """CDN giả hỗ trợ Range; state["broken"] làm mọi request từ nửa sau của file lỗi mạng"""
+    state = {"ranges": [], "ranged": True, "etag": '"v1"', "broken": False}
+
+    def handle(request):
+        match = re.match(r"bytes=(\d+)-(\d+)", request.headers.get("range", ""))
+        if not state["ranged"] or match is None:
+            return httpx.Response(200, content=DATA, headers={"ETag": state["etag"]})
+        start, end = int(match.group(1)), int(match.group(2))
+        state["ranges"].append((start, end))
+        if state["broken"] and start >= len(DATA) // 2:
+            raise httpx.ConnectError("mất kết nối", request=request)
+        return httpx.Response(
+            206,
+            content=DATA[start:end + 1],
+            headers={"Content-Range": f"bytes {start}-{end}/{len(DATA)}", "ETag": state["etag"]},
+        )
+
+    monkeypatch.setattr(http_client, "_client", httpx.Client(transport=httpx.MockTransport(handle)))
+    monkeypatch.setattr(http_client, "HTTP_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(downloader, "DOWNLOAD_MIN_SEGMENT", 4096)
+    monkeypatch.setattr(downloader, "DOWNLOAD_SEGMENT_RETRIES", 0)
+    return state
+
+
+def test_ranged_download_uses_parallel_segments(server, tmp_path):
+    dest = download_file("http://cdn.test/a.mp4", tmp_path / "a.mp4", connections=4)
+    assert dest.read_bytes() == DATA
+    # Probe bytes=0-0 rồi 4 đoạn 4 KiB
+    assert sorted(server["ranges"][1:]) == [(0, 4095), (4096, 8191), (8192, 12287), (12288, 16383)]
+    assert not (tmp_path / "a.mp4.part").exists()
+    assert not (tmp_path / "a.mp4.part.json").exists()
+
+
+def test_server_without_range_streams_whole_file(server, tmp_path):
+    server["ranged"] = False
+    assert download_file("http://cdn.test/a.mp4", tmp_path / "a.mp4").read_bytes() == DATA
+
+
+def test_interrupted_download_resumes_from_part_file(server, tmp_path):
+    dest = tmp_path / "a.mp4"
+    server["broken"] = True
+    with pytest.raises(httpx.ConnectError):
+        download_file("http://cdn.test/a.mp4", dest, connections=4)
+    assert not dest.exists()
+    assert (tmp_path / "a.mp4.part.json").exists()
+
+    server["broken"] = False
+    server["ranges"].clear()
+    assert download_file("http://cdn.test/a.mp4", dest, connections=4).read_bytes() == DATA
+    # Chỉ tải lại các đoạn còn thiếu ở nửa sau
+    assert all(start >= len(DATA) // 2 for start, _ in server["ranges"][1:])
+
+
+def test_changed_file_on_server_restarts_download(server, tmp_path):
+    dest = tmp_path / "a.mp4"
+    server["broken"] = True
+    with pytest.raises(httpx.ConnectError):
+        download_file("http://cdn.test/a.mp4", dest, connections=4)
+
+    server.update(broken=False, etag='"v2"')
+    server["ranges"].clear()
+    assert download_file("http://cdn.test/a.mp4", dest, connections=4).read_bytes() == DATA
+    assert (0, 4095) in server["ranges"]
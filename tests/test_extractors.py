@@ -0,0 +1,48 @@
+import extractors
+from extractors import extract_videos, register_extractor
+
+
+def test_drive_files_become_direct_downloads_with_preview():
+    refs = extract_videos([
+        {"id": "a", "name": "v1.mp4", "mimeType": "video/mp4",
+         "webViewLink": "https://drive.google.com/file/d/AAA/view?usp=drivesdk"},
+        {"id": "b", "name": "../../etc/v2", "webContentLink": "https://drive.google.com/uc?id=BBB&export=download"},
+    ])
+    assert [ref.url for ref in refs] == [
+        "https://drive.google.com/uc?export=download&id=AAA",
+        "https://drive.google.com/uc?export=download&id=BBB",
+    ]
+    assert refs[0].preview_url == "https://drive.google.com/file/d/AAA/preview"
+    # Tên từ n8n không được thoát ra ngoài thư mục video
+    assert refs[1].filename("fallback") == "v2.mp4"
+
+
+def test_generic_url_keys_and_plain_strings():
+    assert extract_videos({"video_url": "https://x.com/a.mp4", "name": "a"})[0].filename("f") == "a.mp4"
+    assert extract_videos({"url": "", "downloadUrl": "https://x.com/b.mp4"})[0].url == "https://x.com/b.mp4"
+    assert extract_videos("https://drive.google.com/open?id=DDD")[0].source == "plain_url"
+
+
+def test_nested_n8n_items_keep_order_and_drop_duplicates():
+    response = [{"json": {"videos": [
+        {"url": "https://x.com/1.mp4"}, {"url": "https://x.com/2.mp4"}, {"url": "https://x.com/1.mp4"},
+    ]}}]
+    assert [ref.url for ref in extract_videos(response)] == ["https://x.com/1.mp4", "https://x.com/2.mp4"]
+
+
+def test_unrecognised_responses_yield_nothing():
+    for response in ({"message": "ok"}, [], None, 42, {"url": "/local/path.mp4"}):
+        assert extract_videos(response) == []
+
+
+def test_registered_extractor_runs_before_builtins(monkeypatch):
+    monkeypatch.setattr(extractors, "_extractors", list(extractors._extractors))
+
+    @register_extractor("custom", first=True)
+    def custom(item):
+        if isinstance(item, dict) and "clip" in item:
+            return [extractors.VideoRef(url=item["clip"], source="custom")]
+        return None
+
+    refs = extract_videos({"clip": "https://x.com/c.mp4", "url": "https://x.com/other.mp4"})
+    assert [(ref.url, ref.source) for ref in refs] == [("https://x.com/c.mp4", "custom")]
@@ -0,0 +1,56 @@
+import asyncio
+
+import httpx
+import pytest
+
+import http_client
+
+
+def _flaky_handler(statuses):
+    """Trả lần lượt các status trong statuses, ghi lại số lần được gọi"""
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1], json={"ok": True})
+
+    return handler, calls
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_RETRY_BACKOFF", 0)
+
+
+def test_request_retries_transient_status(monkeypatch):
+    handler, calls = _flaky_handler([503, 200])
+    monkeypatch.setattr(http_client, "_client", httpx.Client(transport=httpx.MockTransport(handler)))
+    response = http_client.request("GET", "http://n8n.test/status")
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+def test_arequest_retries_transient_status(monkeypatch):
+    handler, calls = _flaky_handler([503, 200])
+
+    async def run():
+        monkeypatch.setattr(http_client, "_async_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        return await http_client.arequest("GET", "http://n8n.test/status")
+
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+def test_post_is_not_retried_on_status(monkeypatch):
+    handler, calls = _flaky_handler([503, 200])
+    monkeypatch.setattr(http_client, "_client", httpx.Client(transport=httpx.MockTransport(handler)))
+    assert http_client.request("POST", "http://n8n.test/hook").status_code == 503
+    assert len(calls) == 1
+
+
+def test_last_attempt_returns_the_error_response(monkeypatch):
+    handler, calls = _flaky_handler([503])
+    monkeypatch.setattr(http_client, "_client", httpx.Client(transport=httpx.MockTransport(handler)))
+    assert http_client.request("GET", "http://n8n.test/status", retries=2).status_code == 503
+    assert len(calls) == 3
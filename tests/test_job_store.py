@@ -0,0 +1,36 @@
+import time
+
+from job_store import SqliteJobStore
+from jobs import JOB_QUEUED, JOB_SUCCEEDED, Job
+
+
+def test_jobs_survive_reopen(tmp_path):
+    db = tmp_path / "jobs.db"
+    store = SqliteJobStore(db)
+    store.add(Job(id="j1", prompt="con mèo", params={"duration": 10}, owner="s1"))
+    store.update("j1", status=JOB_SUCCEEDED, result={"videoUrl": "https://x.test/a.mp4"}, video_path="/tmp/a.mp4")
+    store.add(Job(id="j2", prompt="con chó", params={}))
+
+    reopened = SqliteJobStore(db)
+    job = reopened.get("j1")
+    assert job.status == JOB_SUCCEEDED
+    assert job.params == {"duration": 10}
+    assert job.result == {"videoUrl": "https://x.test/a.mp4"}
+    assert job.video_path == "/tmp/a.mp4"
+    assert [j.id for j in reopened.unfinished()] == ["j2"]
+    assert reopened.get("j2").status == JOB_QUEUED
+
+
+def test_finished_jobs_past_retention_are_pruned(tmp_path):
+    db = tmp_path / "jobs.db"
+    store = SqliteJobStore(db)
+    store.add(Job(id="old", prompt="p", params={}))
+    store.update("old", status=JOB_SUCCEEDED)
+    store.add(Job(id="running", prompt="p", params={}))
+    time.sleep(0.05)
+
+    reopened = SqliteJobStore(db, retention_seconds=0.01)
+    assert reopened.get("old") is None
+    assert reopened.get("running") is not None
+    # Đã xoá cả trong SQLite, không chỉ trong bộ nhớ
+    assert SqliteJobStore(db).get("old") is None
@@ -0,0 +1,121 @@
+import json
+import time
+
+import httpx
+import pytest
+
+import http_client
+from jobs import JOB_FAILED, JOB_SUCCEEDED, Job, JobManager, JobStore
+from scheduler import Scheduler
+
+WEBHOOK_URL = "http://n8n.test/webhook"
+
+
+@pytest.fixture
+def n8n(monkeypatch):
+    """Thay webhook n8n bằng handler của từng test (MockTransport trên client async dùng chung)"""
+    state = {"handler": None, "payloads": []}
+
+    def handle(request):
+        payload = json.loads(request.content)
+        state["payloads"].append(payload)
+        return state["handler"](payload)
+
+    monkeypatch.setattr(http_client, "_async_client", httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+    return state
+
+
+def _manager(**kwargs) -> JobManager:
+    kwargs.setdefault("request_timeout", 3)
+    kwargs.setdefault("poll_interval", 0.05)
+    return JobManager(WEBHOOK_URL, store=JobStore(), scheduler=Scheduler(4, 4), **kwargs)
+
+
+def _wait_finished(manager: JobManager, job_id: str, timeout: float = 5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job.finished:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job chưa xong: {manager.get(job_id)}")
+
+
+def test_synchronous_response_completes_job(n8n):
+    n8n["handler"] = lambda payload: httpx.Response(200, json={"url": "https://x.test/a.mp4"})
+    manager = _manager()
+    job = _wait_finished(manager, manager.submit("con mèo", {"duration": 5}))
+    assert job.status == JOB_SUCCEEDED
+    assert job.result == {"url": "https://x.test/a.mp4"}
+    assert n8n["payloads"][0]["prompt"] == "con mèo"
+    assert n8n["payloads"][0]["duration"] == 5
+
+
+def test_callback_before_accepted_response_keeps_result(n8n):
+    manager = _manager(callback_base_url="http://sidecar.test")
+
+    def accept_after_callback(payload):
+        # n8n xong và gọi callback trước khi response 202 của webhook về tới app
+        job = manager.get(payload["jobId"])
+        assert manager.handle_callback(job.id, job.callback_token, {"data": {"url": "https://x.test/b.mp4"}})
+        return httpx.Response(202, json={"status": "accepted"})
+
+    n8n["handler"] = accept_after_callback
+    job_id = manager.submit("con chó")
+    job = _wait_finished(manager, job_id)
+    time.sleep(0.2)  # quá vài chu kỳ poll_interval: không được bị ghi đè thành timeout
+    job = manager.get(job_id)
+    assert job.status == JOB_SUCCEEDED
+    assert job.result == {"url": "https://x.test/b.mp4"}
+
+
+def test_callback_after_accepted_response_completes_job(n8n):
+    n8n["handler"] = lambda payload: httpx.Response(202, json={"status": "accepted"})
+    manager = _manager(callback_base_url="http://sidecar.test")
+    job_id = manager.submit("con gà")
+    deadline = time.time() + 5
+    while manager.get(job_id).status != "waiting_callback" and time.time() < deadline:
+        time.sleep(0.01)
+    job = manager.get(job_id)
+    assert not manager.handle_callback(job_id, "sai-token", {"data": {}})
+    assert manager.handle_callback(job_id, job.callback_token, {"status": "failed", "error": "render lỗi"})
+    job = _wait_finished(manager, job_id)
+    assert job.status == JOB_FAILED
+    assert job.error == "render lỗi"
+
+
+def test_accepted_job_without_callback_times_out(n8n):
+    n8n["handler"] = lambda payload: httpx.Response(202, json={"status": "accepted"})
+    manager = _manager(request_timeout=0.2)
+    job = _wait_finished(manager, manager.submit("con vịt"))
+    assert job.status == JOB_FAILED
+    assert job.error.startswith("Timeout")
+
+
+def test_identical_requests_in_flight_share_one_job(n8n):
+    n8n["handler"] = lambda payload: httpx.Response(202, json={"status": "accepted"})
+    manager = _manager()
+    first = manager.submit("Con Mèo", {"duration": 5, "quality": "hd"})
+    assert manager.submit("con   mèo", {"quality": "hd", "duration": 5}) == first
+    assert manager.submit("con mèo", {"duration": 10}) != first
+
+
+def test_update_only_unfinished_does_not_overwrite_result():
+    store = JobStore()
+    store.add(Job(id="j1", prompt="p", params={}))
+    store.update("j1", status=JOB_SUCCEEDED, result={"ok": True})
+    assert store.update("j1", only_unfinished=True, status="waiting_callback") is None
+    assert store.get("j1").status == JOB_SUCCEEDED
+
+
+def test_event_message_is_coerced_to_short_string(n8n):
+    n8n["handler"] = lambda payload: httpx.Response(202, json={"status": "accepted"})
+    manager = _manager(callback_base_url="http://sidecar.test")
+    job_id = manager.submit("con cá")
+    token = manager.get(job_id).callback_token
+    assert manager.handle_event(job_id, token, {"stage": "render", "message": 42})
+    assert manager.get(job_id).stage_message == "42"
+    assert manager.handle_event(job_id, token, {"stage": "render", "message": {"step": "x" * 500}})
+    assert len(manager.get(job_id).stage_message) == 200
+    assert manager.handle_event(job_id, token, {"stage": "upload"})
+    assert manager.get(job_id).stage_message is None
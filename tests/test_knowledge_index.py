@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from knowledge_index import KnowledgeIndex, chunk_text
+
+
+@pytest.fixture
+def knowledge_dir(tmp_path, monkeypatch):
+    # File kiến thức mặc định ở thư mục hiện tại không được lẫn vào chỉ mục của test
+    monkeypatch.chdir(tmp_path)
+    directory = tmp_path / "knowledge"
+    directory.mkdir()
+    (directory / "giao_hang.md").write_text(
+        "Shop giao hàng toàn quốc trong 3 đến 5 ngày.\n\nPhí vận chuyển miễn phí cho đơn từ 500 nghìn.",
+        encoding="utf-8",
+    )
+    (directory / "doi_tra.txt").write_text("Khách được đổi trả sản phẩm lỗi trong vòng 7 ngày.", encoding="utf-8")
+    return directory
+
+
+def test_chunk_text_groups_paragraphs_and_windows_long_ones():
+    assert chunk_text("một hai\n\nba bốn", chunk_words=10) == ["một hai ba bốn"]
+    long_paragraph = " ".join(str(i) for i in range(25))
+    chunks = chunk_text(long_paragraph, chunk_words=10, overlap=2)
+    assert chunks[0].split() == [str(i) for i in range(10)]
+    assert chunks[1].split()[0] == "8"
+    assert chunks[-1].split()[-1] == "24"
+
+
+def test_search_ranks_matching_passage_and_ignores_accents(knowledge_dir, tmp_path):
+    index = KnowledgeIndex.load_or_build(tmp_path / "index", knowledge_dir)
+    assert len(index) == 2
+
+    results = index.search("đổi trả sản phẩm", k=3)
+    assert results[0]["source"].endswith("doi_tra.txt")
+    assert index.search("doi tra san pham", k=1)[0]["text"] == results[0]["text"]
+    assert index.search("xyz") == []
+
+
+def test_index_is_rebuilt_when_sources_change(knowledge_dir, tmp_path):
+    index = KnowledgeIndex.load_or_build(tmp_path / "index", knowledge_dir)
+    assert index.is_fresh(knowledge_dir)
+
+    added = knowledge_dir / "bao_hanh.txt"
+    added.write_text("Bảo hành điện tử 12 tháng tại cửa hàng.", encoding="utf-8")
+    assert not index.is_fresh(knowledge_dir)
+    rebuilt = KnowledgeIndex.load_or_build(tmp_path / "index", knowledge_dir)
+    assert rebuilt.search("bảo hành", k=1)[0]["source"].endswith("bao_hanh.txt")
+
+    os.utime(added, (0, 0))
+    assert not rebuilt.is_fresh(knowledge_dir)
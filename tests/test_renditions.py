@@ -0,0 +1,32 @@
+import pytest
+
+import renditions
+from ffmpeg_utils import run_ffmpeg
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "clip.mp4"
+    run_ffmpeg(["-y", "-f", "lavfi", "-i", "testsrc=size=1280x720:rate=10:duration=1", "-pix_fmt", "yuv420p", path])
+    return path
+
+
+def _master(path: str) -> list:
+    return [line for line in open(path).read().splitlines() if line.startswith("#EXT-X-STREAM-INF")]
+
+
+def test_ladder_skips_renditions_not_smaller_than_source(video):
+    master = renditions.package_hls(str(video))
+    assert master == str(renditions.master_playlist(video.parent, video.name))
+    variants = _master(master)
+    assert len(variants) == 2
+    assert variants[0].endswith("RESOLUTION=854x480")
+    assert variants[1].endswith("RESOLUTION=1280x720")
+
+
+def test_unknown_dimensions_package_source_only(video, monkeypatch):
+    probed = renditions.probe_streams(video)
+    monkeypatch.setattr(renditions, "probe_streams", lambda path: {**probed, "width": None, "height": 0})
+    variants = _master(renditions.package_hls(str(video)))
+    assert len(variants) == 1
+    assert "RESOLUTION" not in variants[0]
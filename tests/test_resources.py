@@ -0,0 +1,71 @@
+import os
+import sys
+
+import resources
+
+
+def _touch(path, text, mtime_ns):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_cached_file_reloads_only_when_file_changes(tmp_path):
+    calls = []
+
+    @resources.cached_file
+    def load(path):
+        calls.append(path)
+        return open(path, encoding="utf-8").read()
+
+    path = tmp_path / "greeting.txt"
+    _touch(path, "xin chào", 1_000_000_000)
+    assert load(path) == "xin chào"
+    assert load(path) == "xin chào"
+    assert len(calls) == 1
+
+    # Cùng kích thước, chỉ khác mtime vẫn phải đọc lại
+    _touch(path, "xin chao", 2_000_000_000)
+    assert load(path) == "xin chao"
+    assert len(calls) == 2
+
+
+def test_cached_file_returns_default_for_missing_or_unreadable(tmp_path):
+    assert resources.read_text(tmp_path / "missing.txt", "mặc định") == "mặc định"
+
+    path = tmp_path / "binary.txt"
+    path.write_bytes(b"\xff\xfe\x00")
+    assert resources.read_text(path, "") == ""
+
+
+def test_style_tag_wraps_css_and_skips_missing_asset():
+    assert resources.style_tag("app.css").startswith("<style>")
+    assert resources.style_tag("khong-co.css") == ""
+
+
+def test_lazy_import_defers_until_attribute_access(tmp_path, monkeypatch):
+    (tmp_path / "lazy_probe_module.py").write_text("VALUE = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_probe_module", raising=False)
+
+    module = resources.lazy_import("lazy_probe_module")
+    assert "lazy_probe_module" not in sys.modules
+    assert module.VALUE == 42
+    assert "lazy_probe_module" in sys.modules
+    monkeypatch.delitem(sys.modules, "lazy_probe_module")
+
+
+def _observations(run: str) -> int:
+    child = resources.SCRIPT_SECONDS.labels(app="test", run=run)
+    count_line = child.render("m", (), ())[-1]
+    return int(count_line.rsplit(" ", 1)[1])
+
+
+def test_script_timer_labels_first_run_and_reruns():
+    session_state = {}
+    before = _observations("first"), _observations("rerun")
+    for _ in range(3):
+        with resources.script_timer("test", session_state):
+            pass
+    assert _observations("first") - before[0] == 1
+    assert _observations("rerun") - before[1] == 2
+    assert resources._last_run[0] == "test"
@@ -0,0 +1,82 @@
+import time
+
+import httpx
+
+import http_client
+from jobs import JOB_SUCCEEDED
+from result_cache import ResultCache, cache_key
+from video_service import VideoService
+
+PARAMS = {"duration": 10, "quality": "HD"}
+
+
+def _video(video_dir, name: str, size: int = 16):
+    path = video_dir / name
+    path.write_bytes(b"\0" * size)
+    return path
+
+
+def test_key_ignores_case_whitespace_and_param_order():
+    assert cache_key("  Con  Mèo ", {"a": 1, "b": 2}) == cache_key("con mèo", {"b": 2, "a": 1})
+    assert cache_key("con mèo", {"a": 1}) != cache_key("con mèo", {"a": 2})
+
+
+def test_hit_restores_deleted_library_file(tmp_path):
+    cache = ResultCache(tmp_path)
+    video = _video(tmp_path, "a.mp4")
+    cache.put("con mèo", PARAMS, video, {"videoUrl": "http://cdn.test/a.mp4"})
+    video.unlink()
+
+    hit = cache.get("Con mèo", PARAMS)
+    assert hit["video_name"] == "a.mp4"
+    assert hit["response"] == {"videoUrl": "http://cdn.test/a.mp4"}
+    assert video.exists()
+    assert cache.get("con mèo", {"duration": 30}) is None
+
+
+def test_expired_and_removed_entries_miss(tmp_path):
+    cache = ResultCache(tmp_path, ttl_seconds=0)
+    cache.put("con mèo", PARAMS, _video(tmp_path, "a.mp4"))
+    time.sleep(0.01)
+    assert cache.get("con mèo", PARAMS) is None
+
+    cache = ResultCache(tmp_path)
+    cache.put("con chó", PARAMS, _video(tmp_path, "b.mp4"))
+    cache.remove_video("b.mp4")
+    assert cache.get("con chó", PARAMS) is None
+
+
+def test_evicts_least_recently_used_over_size_limit(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=40)
+    cache.put("một", PARAMS, _video(tmp_path, "1.mp4"))
+    cache.put("hai", PARAMS, _video(tmp_path, "2.mp4"))
+    assert cache.get("một", PARAMS) is not None  # "hai" giờ là entry ít dùng nhất
+    cache.put("ba", PARAMS, _video(tmp_path, "3.mp4"))
+
+    assert cache.get("hai", PARAMS) is None
+    assert cache.get("một", PARAMS) is not None
+    assert cache.get("ba", PARAMS) is not None
+
+
+def test_finished_job_fills_cache_without_materialize_call(tmp_path, monkeypatch):
+    def n8n(request):
+        return httpx.Response(200, json={"videoUrl": "http://cdn.test/clip.mp4"})
+
+    def cdn(request):
+        return httpx.Response(200, content=b"video-bytes", headers={"Content-Type": "video/mp4"})
+
+    monkeypatch.setattr(http_client, "_async_client", httpx.AsyncClient(transport=httpx.MockTransport(n8n)))
+    monkeypatch.setattr(http_client, "_client", httpx.Client(transport=httpx.MockTransport(cdn)))
+    service = VideoService(tmp_path, "http://n8n.test/webhook")
+    # Không cần ffmpeg: bỏ qua bước faststart/HLS
+    monkeypatch.setattr(service, "_finalize", lambda filepath: None)
+
+    job_id = service.submit("con mèo", PARAMS, owner="api:test").job_id
+    deadline = time.time() + 5
+    while time.time() < deadline and service.results.get("con mèo", PARAMS) is None:
+        time.sleep(0.02)
+
+    assert service.get(job_id).status == JOB_SUCCEEDED
+    cached = service.submit("con mèo", PARAMS).cached
+    assert cached is not None
+    assert open(cached["video_path"], "rb").read() == b"video-bytes"
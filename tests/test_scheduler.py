@@ -0,0 +1,74 @@
+import asyncio
+
+from scheduler import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, Scheduler, classify_priority
+
+
+def _granted(tasks) -> list:
+    return [name for name, task in tasks.items() if task.done()]
+
+
+def test_classify_priority():
+    assert classify_priority({"duration": 10, "quality": "HD"}) == PRIORITY_HIGH
+    assert classify_priority({"duration": 30, "quality": "HD"}) == PRIORITY_NORMAL
+    assert classify_priority({"duration": 60, "quality": "HD"}) == PRIORITY_LOW
+    assert classify_priority({"duration": 10, "quality": "4K"}) == PRIORITY_LOW
+    assert classify_priority({"duration": "abc"}) == PRIORITY_HIGH
+
+
+def test_global_cap_and_per_owner_quota():
+    async def scenario():
+        scheduler = Scheduler(max_concurrent=3, per_owner=2, aging_seconds=0)
+        tasks = {}
+        for name, owner in [("a1", "a"), ("a2", "a"), ("a3", "a"), ("b1", "b"), ("b2", "b")]:
+            tasks[name] = asyncio.create_task(scheduler.acquire(name, owner, PRIORITY_NORMAL))
+        await asyncio.sleep(0)
+        # a3 không chặn b1 dù xếp hàng trước (không head-of-line blocking)
+        assert sorted(_granted(tasks)) == ["a1", "a2", "b1"]
+        assert scheduler.stats() == {"running": 3, "waiting": 2, "max_concurrent": 3}
+
+        scheduler.release("a")
+        await asyncio.sleep(0)
+        assert "a3" in _granted(tasks) and "b2" not in _granted(tasks)
+
+        scheduler.release("b")
+        await asyncio.sleep(0)
+        assert "b2" in _granted(tasks)
+
+    asyncio.run(scenario())
+
+
+def test_priority_order_and_position():
+    async def scenario():
+        scheduler = Scheduler(max_concurrent=1, per_owner=1, aging_seconds=0)
+        await scheduler.acquire("running", "x", PRIORITY_NORMAL)
+        low = asyncio.create_task(scheduler.acquire("low", "a", PRIORITY_LOW))
+        high = asyncio.create_task(scheduler.acquire("high", "b", PRIORITY_HIGH))
+        await asyncio.sleep(0)
+        assert scheduler.position("high") == 1
+        assert scheduler.position("low") == 2
+        assert scheduler.position("running") is None
+
+        scheduler.release("x")
+        await asyncio.sleep(0)
+        assert high.done() and not low.done()
+        scheduler.release("b")
+        await asyncio.sleep(0)
+        assert low.done()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        scheduler = Scheduler(max_concurrent=1, per_owner=1, aging_seconds=0)
+        await scheduler.acquire("running", "x", PRIORITY_NORMAL)
+        waiting = asyncio.create_task(scheduler.acquire("waiting", "a", PRIORITY_NORMAL))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.stats()["waiting"] == 0
+
+        scheduler.release("x")
+        assert scheduler.stats()["running"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,66 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from video_api import VideoAPI, can_expose
+from video_service import Submission
+
+
+class StubService:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, prompt, params, owner=None):
+        self.submitted.append((prompt, params, owner))
+        return Submission(job_id="job-1")
+
+    def get(self, job_id):
+        return None
+
+    def describe(self, job):
+        return {}
+
+
+def _post(api: VideoAPI, body: dict, headers: dict = None):
+    async def run():
+        app = web.Application()
+        app.router.add_post("/api/videos", api._submit)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post("/api/videos", json=body, headers=headers or {})
+            return response.status, await response.json()
+
+    return asyncio.run(run())
+
+
+def test_api_without_token_only_exposed_on_loopback():
+    assert can_expose("127.0.0.1", token=None)
+    assert not can_expose("0.0.0.0", token=None)
+    assert can_expose("0.0.0.0", token="secret")
+
+
+def test_client_owner_requires_token():
+    service = StubService()
+    status, body = _post(VideoAPI(service, token=None), {"prompt": "con mèo", "owner": "user-42"})
+    assert status == 400 and not body["ok"]
+    assert service.submitted == []
+
+    status, _ = _post(VideoAPI(service, token=None), {"prompt": "con mèo"})
+    assert status == 202
+    assert service.submitted[-1][2] == "api:default"
+
+
+def test_token_is_enforced_and_allows_owner():
+    service = StubService()
+    api = VideoAPI(service, token="secret")
+    assert _post(api, {"prompt": "con mèo"})[0] == 401
+    status, _ = _post(api, {"prompt": "con mèo", "owner": "user-42"}, {"Authorization": "Bearer secret"})
+    assert status == 202
+    assert service.submitted[-1][2] == "api:user-42"
+
+
+def test_params_outside_whitelist_are_rejected():
+    service = StubService()
+    status, _ = _post(VideoAPI(service, token=None), {"prompt": "x", "params": {"webhook": "http://evil"}})
+    assert status == 400
+    assert service.submitted == []
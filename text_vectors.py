@@ -0,0 +1,75 @@
+"""
+Vector hoá văn bản tiếng Việt bằng NumPy, không cần model embedding.
+
+Đặc trưng gồm từ, cặp từ liền nhau và 3-gram ký tự, đều lấy từ dạng đã bỏ dấu: câu gõ không
+dấu cho ra đúng vector của câu có dấu, 3-gram giúp chịu được gõ sai. Đặc trưng được băm
+(crc32, ổn định giữa các process) vào vector dim chiều với tf dạng log(1 + count). Dùng cho so khớp câu hỏi gần giống và tìm đoạn văn bản liên quan.
+"""
+
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+VECTOR_DIM = 4096
+
+_WORD_RE = re.compile(r"\w+")
+
+# Trọng số theo loại đặc trưng: khớp nguyên từ quan trọng hơn khớp 3-gram ký tự
+_WORD_WEIGHT = 1.0
+_BIGRAM_WEIGHT = 0.5
+_CHAR_WEIGHT = 0.3
+
+
+# Viết tắt hay gặp khi chat và từ đệm cuối câu (không mang nghĩa khi so khớp)
+_ABBREVIATIONS = {
+    "ko": "không", "k": "không", "khong": "không", "hok": "không", "hông": "không", "kg": "không",
+    "dc": "được", "đc": "được", "sp": "sản phẩm", "sđt": "số điện thoại", "sdt": "số điện thoại",
+}
+_FILLERS = {"ạ", "à", "ạh", "nhé", "nha", "nhỉ", "ơi", "hả", "vậy", "thế"}
+
+
+def fold_accents(word: str) -> str:
+    """Bỏ dấu tiếng Việt (người dùng hay gõ không dấu)"""
+    word = unicodedata.normalize("NFD", word.replace("đ", "d"))
+    return "".join(ch for ch in word if unicodedata.category(ch) != "Mn")
+
+
+def tokenize(text: str) -> list:
+    """Từ đã chuẩn hoá: Unicode NFC, chữ thường, mở viết tắt, bỏ dấu câu và từ đệm"""
+    words = []
+    for word in _WORD_RE.findall(unicodedata.normalize("NFC", text or "").casefold()):
+        word = _ABBREVIATIONS.get(word, word)
+        if word not in _FILLERS:
+            words.extend(word.split())
+    return words
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(tokenize(text))
+
+
+def term_bucket(feature: str, dim: int = VECTOR_DIM) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % dim
+
+
+def vectorize(text: str, dim: int = VECTOR_DIM) -> np.ndarray:
+    """Vector tf (chưa nhân idf, chưa chuẩn hoá) của một đoạn văn bản"""
+    counts = {}
+    # Không giữ đặc trưng có dấu: nếu có, câu gõ không dấu sẽ thiếu hẳn các đặc trưng đó và
+    # idf của chúng kéo điểm xuống thấp hơn cả câu có dấu nhưng khác nghĩa
+    words = [fold_accents(word) for word in tokenize(text)]
+    for index, word in enumerate(words):
+        features = [("w:" + word, _WORD_WEIGHT)]
+        if index:
+            features.append((f"b:{words[index - 1]} {word}", _BIGRAM_WEIGHT))
+        padded = f" {word} "
+        features.extend(("c:" + padded[i:i + 3], _CHAR_WEIGHT) for i in range(len(padded) - 2))
+        for feature, weight in features:
+            bucket = term_bucket(feature, dim)
+            counts[bucket] = counts.get(bucket, 0.0) + weight
+    vector = np.zeros(dim, dtype=np.float32)
+    if counts:
+        vector[list(counts)] = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    return vector
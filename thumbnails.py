@@ -0,0 +1,111 @@
+"""
+Sinh poster frame (JPEG) và preview ngắn độ phân giải thấp cho video đã lưu.
+
+Gallery hiển thị poster + preview thay vì nhúng player đầy đủ cho mỗi video, nên trình
+duyệt không phải tải metadata của từng file; video gốc chỉ được tải khi người dùng bấm xem.
+Việc encode chạy trong thread pool nền (ffmpeg là process riêng), kết quả cache trên đĩa
+trong generated_videos/.thumbs/ và chỉ tạo lại khi video mới hơn bản cache.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from ffmpeg_utils import FFmpegError, run_ffmpeg, temp_output
+from log_utils import get_logger, truncate
+
+log = get_logger("thumbnails")
+
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", "2"))
+POSTER_WIDTH = 480
+PREVIEW_WIDTH = 320
+PREVIEW_SECONDS = 4
+PREVIEW_FPS = 12
+
+
+class ThumbnailPipeline:
+    def __init__(self, video_dir: Path, on_ready=None, workers: int = THUMBNAIL_WORKERS):
+        """on_ready(video_name, poster_relative_path) được gọi khi sinh xong"""
+        self.video_dir = Path(video_dir)
+        self.thumb_dir = self.video_dir / ".thumbs"
+        self.thumb_dir.mkdir(parents=True, exist_ok=True)
+        self.on_ready = on_ready
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def poster_path(self, video_name: str) -> Path:
+        return self.thumb_dir / f"{Path(video_name).stem}.jpg"
+
+    def preview_path(self, video_name: str) -> Path:
+        return self.thumb_dir / f"{Path(video_name).stem}.preview.mp4"
+
+    def is_fresh(self, video_name: str) -> bool:
+        """Poster + preview tồn tại và không cũ hơn video"""
+        try:
+            video_mtime = (self.video_dir / video_name).stat().st_mtime
+            return all(
+                path.stat().st_mtime >= video_mtime
+                for path in (self.poster_path(video_name), self.preview_path(video_name))
+            )
+        except FileNotFoundError:
+            return False
+
+    def submit(self, video_name: str) -> bool:
+        """Đưa video vào hàng đợi sinh thumbnail (bỏ qua nếu đang xử lý hoặc đã có)"""
+        with self._lock:
+            if video_name in self._pending:
+                return False
+            if self.is_fresh(video_name):
+                return False
+            self._pending.add(video_name)
+        self._executor.submit(self._process, video_name)
+        return True
+
+    def remove(self, video_name: str):
+        """Xoá poster + preview khi video bị xoá"""
+        for path in (self.poster_path(video_name), self.preview_path(video_name)):
+            path.unlink(missing_ok=True)
+
+    def _process(self, video_name: str):
+        try:
+            video_path = self.video_dir / video_name
+            if not video_path.exists():
+                return
+            self._make_poster(video_path, self.poster_path(video_name))
+            self._make_preview(video_path, self.preview_path(video_name))
+            log.info("Đã tạo thumbnail", extra={"video": video_name})
+            if self.on_ready:
+                self.on_ready(video_name, self.poster_path(video_name).relative_to(self.video_dir).as_posix())
+        except FFmpegError as e:
+            log.warning("Không tạo được thumbnail", extra={"video": video_name, "error": truncate(str(e), 500)})
+        finally:
+            with self._lock:
+                self._pending.discard(video_name)
+
+    def _make_poster(self, video_path: Path, poster: Path):
+        tmp = temp_output(poster)
+        # Lấy frame ở giây thứ 1 (tránh frame đen đầu video); video quá ngắn thì lấy frame đầu
+        for seek in ("1", "0"):
+            try:
+                run_ffmpeg([
+                    "-y", "-ss", seek, "-i", video_path,
+                    "-frames:v", "1", "-vf", f"scale={POSTER_WIDTH}:-2", "-q:v", "4", tmp,
+                ])
+            except FFmpegError:
+                if seek == "0":
+                    raise
+            if tmp.exists() and tmp.stat().st_size > 0:
+                break
+        os.replace(tmp, poster)
+
+    def _make_preview(self, video_path: Path, preview: Path):
+        tmp = temp_output(preview)
+        run_ffmpeg([
+            "-y", "-i", video_path, "-t", PREVIEW_SECONDS, "-an",
+            "-vf", f"scale={PREVIEW_WIDTH}:-2,fps={PREVIEW_FPS}",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "32", "-pix_fmt", "yuv420p",
+            "-movflags", "+faststart", tmp,
+        ])
+        os.replace(tmp, preview)
@@ -0,0 +1,179 @@
+"""
+Tracing tương thích OpenTelemetry / W3C Trace Context, không cần thêm dependency.
+
+Một lần tạo video là một trace: span của thao tác trên UI → job (gồm thời gian xếp hàng)
+→ request webhook n8n → từng stage n8n báo về (classify, script, render, upload) → tách
+URL trong response → tải video. Header `traceparent` (và field "traceparent" trong payload)
+được gửi kèm webhook để workflow n8n gắn span của nó vào cùng trace.
+
+Span kết thúc được ghi ra file JSONL (TRACE_EXPORT_PATH) với các field theo OTLP
+(traceId, spanId, parentSpanId, startTimeUnixNano, ...) nên xem offline được hoặc đẩy
+tiếp sang collector. File được xoay vòng khi vượt TRACE_MAX_BYTES.
+
+Dùng:
+    with start_span("download_video", {"url": url}) as span:
+        ...
+        span.set_attribute("bytes", size)
+"""
+
+import contextvars
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "1") not in ("0", "false", "False")
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "generated_videos/.cache/traces.jsonl")
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", 50 * 1024 * 1024))
+SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "video-generator")
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class SpanContext:
+    """Định danh của span (có thể đến từ process khác qua traceparent)"""
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+def parse_traceparent(value: str) -> SpanContext:
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return SpanContext(match.group(1), match.group(2))
+
+
+class Span(SpanContext):
+    def __init__(self, name: str, parent: SpanContext = None, attributes: dict = None):
+        super().__init__(parent.trace_id if parent else secrets.token_hex(16), secrets.token_hex(8))
+        self.name = name
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = "UNSET"
+        self.status_message = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, attributes: dict = None):
+        self.events.append({"name": name, "timeUnixNano": time.time_ns(), "attributes": attributes or {}})
+
+    def record_exception(self, error: BaseException):
+        self.status = "ERROR"
+        self.status_message = str(error)[:500]
+        self.add_event("exception", {"exception.type": type(error).__name__, "exception.message": str(error)[:500]})
+
+    def set_error(self, message: str):
+        self.status = "ERROR"
+        self.status_message = message[:500] if message else None
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.status == "UNSET":
+            self.status = "OK"
+        _exporter.export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": self.status, "message": self.status_message},
+            "resource": {"service.name": SERVICE_NAME},
+        }
+
+
+class FileSpanExporter:
+    """Ghi span đã kết thúc ra file JSONL, xoay vòng sang .1 khi quá lớn"""
+
+    def __init__(self, path: str = TRACE_EXPORT_PATH, max_bytes: int = TRACE_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        if not TRACING_ENABLED:
+            return
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                if self.path.stat().st_size > self.max_bytes:
+                    os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+            except FileNotFoundError:
+                pass
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+_exporter = FileSpanExporter()
+
+
+def set_exporter(exporter):
+    global _exporter
+    _exporter = exporter
+
+
+def current_span() -> Span:
+    return _current_span.get()
+
+
+def set_current_span(span: Span):
+    """Đặt span hiện tại không qua with (script Streamlit); trả về token của contextvar"""
+    return _current_span.set(span)
+
+
+def current_traceparent() -> str:
+    span = _current_span.get()
+    return span.traceparent if span else None
+
+
+def begin_span(name: str, attributes: dict = None, parent=None) -> Span:
+    """Tạo span phải tự end(); parent là SpanContext, chuỗi traceparent hoặc mặc định span hiện tại"""
+    if isinstance(parent, str):
+        parent = parse_traceparent(parent)
+    return Span(name, parent or _current_span.get(), attributes)
+
+
+@contextmanager
+def use_span(span: Span, end_on_exit: bool = False):
+    """Đặt span làm span hiện tại trong khối with (span con tự gắn vào)"""
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        if end_on_exit:
+            span.end()
+
+
+@contextmanager
+def start_span(name: str, attributes: dict = None, parent=None):
+    with use_span(begin_span(name, attributes, parent), end_on_exit=True) as span:
+        yield span
@@ -0,0 +1,206 @@
+"""
+HTTP API tạo video (aiohttp trên sidecar) để service khác dùng không cần qua trình duyệt.
+
+    POST /api/videos               {"prompt": "...", "params": {"duration": 10, ...}, "owner": "..."}
+                                   → 202 {"job": {...}}; cùng prompt + params đã có video
+                                     thì 200 {"cached": true, "video": {...}}
+    GET  /api/videos?limit=20      → {"jobs": [...]} các job gần nhất
+    GET  /api/videos/{job_id}      → {"job": {...}}: status, stage, %, vị trí hàng đợi
+    GET  /api/videos/{job_id}/result
+                                   → 200 {"video": {url, download_url, hls_url}} khi đã có file;
+                                     202 khi đang tải/ghép; 409 khi job chưa xong;
+                                     502 khi job lỗi hoặc không tải được video
+
+Đặt VIDEO_API_TOKEN thì mọi request phải kèm "Authorization: Bearer <token>". Không có token
+thì API chỉ được mở khi sidecar chỉ nghe localhost (app.py bỏ qua các route này, chạy riêng
+thì phải chỉ rõ --insecure), và client không được tự chọn owner để né quota của Scheduler.
+
+Trong app.py các route này chạy chung sidecar với UI. Chạy riêng (không Streamlit) để
+scale phần API độc lập:
+    python video_api.py --port 8504
+Mỗi instance giữ job store SQLite trong VIDEO_DIR của nó, nên khi chạy nhiều instance
+sau load balancer thì route theo job id (sticky) hoặc mỗi instance một volume riêng.
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import threading
+from pathlib import Path
+
+from aiohttp import web
+
+import metrics
+import sidecar
+from batch import PARAM_KEYS
+from jobs import FINISHED_STATUSES, JOB_FAILED
+from log_utils import get_logger
+from video_service import VideoService
+
+log = get_logger("video_api")
+
+VIDEO_API_TOKEN = os.environ.get("VIDEO_API_TOKEN")
+VIDEO_API_MAX_PROMPT_CHARS = int(os.environ.get("VIDEO_API_MAX_PROMPT_CHARS", "4000"))
+VIDEO_API_MAX_LIST = 100
+
+_LOCAL_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+
+def can_expose(host: str, token: str = VIDEO_API_TOKEN) -> bool:
+    """API không token chỉ an toàn khi sidecar không nhận kết nối từ máy khác"""
+    return bool(token) or host in _LOCAL_HOSTS
+
+
+class VideoAPI:
+    def __init__(self, service: VideoService, token: str = VIDEO_API_TOKEN):
+        self.service = service
+        self.token = token
+
+    def register_routes(self):
+        sidecar.add_route("POST", "/api/videos", self._submit)
+        sidecar.add_route("GET", "/api/videos", self._list)
+        sidecar.add_route("GET", "/api/videos/{job_id}", self._status)
+        sidecar.add_route("GET", "/api/videos/{job_id}/result", self._result)
+
+    def _authorized(self, request: web.Request) -> bool:
+        if not self.token:
+            return True
+        header = request.headers.get("Authorization", "")
+        return secrets.compare_digest(header, f"Bearer {self.token}")
+
+    def _error(self, message: str, status: int) -> web.Response:
+        return web.json_response({"ok": False, "error": message}, status=status)
+
+    async def _submit(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return self._error("Sai hoặc thiếu token", 401)
+        try:
+            body = await request.json()
+        except Exception:
+            return self._error("Body không phải JSON", 400)
+        if not isinstance(body, dict):
+            return self._error("Body phải là object", 400)
+        prompt = body.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            return self._error("Thiếu prompt", 400)
+        if len(prompt) > VIDEO_API_MAX_PROMPT_CHARS:
+            return self._error(f"Prompt dài quá {VIDEO_API_MAX_PROMPT_CHARS} ký tự", 400)
+        params = body.get("params") or {}
+        if not isinstance(params, dict) or set(params) - set(PARAM_KEYS):
+            # Chỉ nhận các tham số mà UI/batch gửi, không cho ghi đè field khác của payload n8n
+            return self._error(f"params chỉ gồm {', '.join(PARAM_KEYS)}", 400)
+        # Quota của Scheduler tính theo owner; tách riêng khỏi session của UI. Không có token thì
+        # ai cũng gửi được, nên không cho tự đặt owner (mỗi lần một owner mới là né được quota)
+        if body.get("owner") and not self.token:
+            return self._error("owner chỉ dùng được khi đặt VIDEO_API_TOKEN", 400)
+        owner = f"api:{body.get('owner') or 'default'}"
+
+        # Tra cache, ghi job xuống SQLite... là I/O chặn: chạy ngoài event loop của sidecar
+        # (loop này còn phục vụ callback của mọi job và /media)
+        submission = await asyncio.to_thread(self.service.submit, prompt.strip(), params, owner=owner)
+        if submission.cached:
+            video = await asyncio.to_thread(self.service.links, submission.cached["video_path"])
+            return web.json_response({"ok": True, "cached": True, "video": video})
+        job = await asyncio.to_thread(self._describe, submission.job_id)
+        return web.json_response({"ok": True, "cached": False, "job": job}, status=202)
+
+    async def _list(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return self._error("Sai hoặc thiếu token", 401)
+        try:
+            limit = max(1, min(VIDEO_API_MAX_LIST, int(request.query.get("limit", "20"))))
+        except ValueError:
+            return self._error("limit phải là số", 400)
+        jobs = await asyncio.to_thread(self._recent, limit)
+        return web.json_response({"ok": True, "jobs": jobs})
+
+    async def _status(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return self._error("Sai hoặc thiếu token", 401)
+        job = await asyncio.to_thread(self._describe, request.match_info["job_id"])
+        if job is None:
+            return self._error("Job không tồn tại", 404)
+        return web.json_response({"ok": True, "job": job})
+
+    async def _result(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return self._error("Sai hoặc thiếu token", 401)
+        job = await asyncio.to_thread(self.service.get, request.match_info["job_id"])
+        if job is None:
+            return self._error("Job không tồn tại", 404)
+        if job.status not in FINISHED_STATUSES:
+            return web.json_response({"ok": False, "status": job.status, "error": "Job chưa xong"}, status=409)
+        if job.status == JOB_FAILED:
+            # n8n render lỗi: cùng mã với trường hợp không tải được video bên dưới
+            return web.json_response({"ok": False, "status": job.status, "error": job.error}, status=502)
+        # Tải/ghép file chạy trên thread pool của VideoService; client poll lại đến khi xong
+        future = self.service.submit_materialize(job.id)
+        if not future.done():
+            return web.json_response({"ok": True, "status": "materializing"}, status=202)
+        outcome = future.result()
+        sources = [video.url for video in outcome.videos]
+        if not outcome.ready:
+            body = {"ok": False, "status": job.status, "error": outcome.error, "sources": sources}
+            if not outcome.videos:
+                body["response"] = outcome.response
+            return web.json_response(body, status=502)
+        video = await asyncio.to_thread(self.service.links, outcome.video_path)
+        return web.json_response({"ok": True, "status": job.status, "video": video, "sources": sources})
+
+    def _describe(self, job_id: str) -> dict:
+        job = self.service.get(job_id)
+        return self.service.describe(job) if job is not None else None
+
+    def _recent(self, limit: int) -> list:
+        return [self.service.describe(job) for job in self.service.jobs.recent(limit)]
+
+
+def load_setting(name: str, default: str = None) -> str:
+    """Biến môi trường, nếu không có thì đọc .streamlit/secrets.toml (giống app.py)"""
+    if os.environ.get(name):
+        return os.environ[name]
+    secrets_path = Path(__file__).parent / ".streamlit" / "secrets.toml"
+    if not secrets_path.exists():
+        return default
+    import toml
+    return toml.load(secrets_path).get(name, default)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Chạy HTTP API tạo video (không kèm Streamlit)")
+    parser.add_argument("--host", default=sidecar.SIDECAR_HOST)
+    parser.add_argument("--port", type=int, default=sidecar.SIDECAR_PORT)
+    parser.add_argument("--video-dir", default=os.environ.get("VIDEO_DIR", "generated_videos"))
+    parser.add_argument("--webhook-url", default=None, help="URL webhook n8n (mặc định WEBHOOK_URL)")
+    parser.add_argument("--insecure", action="store_true", help="Cho chạy không token trên địa chỉ không phải localhost")
+    args = parser.parse_args(argv)
+
+    if not can_expose(args.host) and not args.insecure:
+        parser.error(f"Chưa đặt VIDEO_API_TOKEN: API sẽ mở cho mọi client trên {args.host}. Đặt token, dùng --host 127.0.0.1 hoặc thêm --insecure")
+
+    webhook_url = args.webhook_url or load_setting("WEBHOOK_URL")
+    if not webhook_url:
+        parser.error("Chưa cấu hình WEBHOOK_URL")
+    service = VideoService(
+        Path(args.video_dir),
+        webhook_url,
+        callback_base_url=load_setting("JOB_CALLBACK_BASE_URL"),
+        media_base_url=load_setting("MEDIA_BASE_URL", f"http://localhost:{args.port}"),
+    )
+    service.register_routes()
+    VideoAPI(service).register_routes()
+    metrics.register_routes()
+    if not service.start(args.host, args.port):
+        return 1
+    log.info("Video API đang chạy", extra={"url": f"http://{args.host}:{args.port}/api/videos"})
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Chỉ mục metadata (SQLite) cho video trong generated_videos/.
+
+Gallery và sidebar đọc từ chỉ mục này (có phân trang + tìm kiếm) thay vì glob + stat
+toàn bộ thư mục ở mỗi lần rerun. sync() chỉ quét lại thư mục khi mtime của thư mục
+thay đổi (file được thêm/xoá/rename), và chỉ đọc lại file có size/mtime khác trước.
+Thời lượng video đọc từ box mvhd của MP4 (chỉ đọc vài header, không decode).
+"""
+
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+VIDEO_SUFFIX = ".mp4"
+
+
+def probe_mp4_duration(path) -> float:
+    """Đọc thời lượng (giây) từ moov/mvhd; trả về None nếu không đọc được"""
+    try:
+        with open(path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            moov = _find_box(f, b"moov", 0, file_size)
+            if moov is None:
+                return None
+            mvhd = _find_box(f, b"mvhd", *moov)
+            if mvhd is None:
+                return None
+            f.seek(mvhd[0])
+            version = f.read(4)[0]
+            if version == 1:
+                f.seek(16, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">IQ", f.read(12))
+            else:
+                f.seek(8, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">II", f.read(8))
+            return duration / timescale if timescale else None
+    except (OSError, struct.error, IndexError):
+        return None
+
+
+def _find_box(f, box_type: bytes, start: int, end: int):
+    """Tìm box trong khoảng [start, end), trả về (payload_start, payload_end)"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return None
+        if kind == box_type:
+            return offset + header, offset + size
+        offset += size
+    return None
+
+
+class VideoIndex:
+    """Metadata video: size, mtime, prompt, params, duration, thumbnail"""
+
+    def __init__(self, video_dir: Path):
+        self.video_dir = Path(video_dir)
+        db_dir = self.video_dir / ".cache"
+        db_dir.mkdir(parents=True, exist_ok=True)
+        self._db_path = db_dir / "index.db"
+        self._lock = threading.Lock()
+        self._dir_mtime = None
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS videos (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    prompt TEXT,
+                    params TEXT,
+                    duration REAL,
+                    thumbnail TEXT,
+                    indexed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS videos_mtime ON videos (mtime DESC)")
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self._db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def sync(self, force: bool = False):
+        """Cập nhật chỉ mục theo thư mục; gần như miễn phí khi thư mục không đổi"""
+        try:
+            dir_mtime = os.stat(self.video_dir).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if not force and dir_mtime == self._dir_mtime:
+            return
+
+        on_disk = {}
+        with os.scandir(self.video_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(VIDEO_SUFFIX):
+                    stat = entry.stat()
+                    on_disk[entry.name] = (stat.st_size, stat.st_mtime)
+
+        with self._lock, self._transaction() as conn:
+            indexed = {row["name"]: (row["size"], row["mtime"]) for row in conn.execute("SELECT name, size, mtime FROM videos")}
+            removed = [(name,) for name in indexed.keys() - on_disk.keys()]
+            conn.executemany("DELETE FROM videos WHERE name = ?", removed)
+            now = time.time()
+            for name, (size, mtime) in on_disk.items():
+                if indexed.get(name) == (size, mtime):
+                    continue
+                conn.execute(
+                    """
+                    INSERT INTO videos (name, size, mtime, duration, indexed_at) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET
+                        size = excluded.size, mtime = excluded.mtime,
+                        duration = excluded.duration, indexed_at = excluded.indexed_at
+                    """,
+                    (name, size, mtime, probe_mp4_duration(self.video_dir / name), now),
+                )
+        self._dir_mtime = dir_mtime
+
+    def record(self, video_path, prompt: str = None, params: dict = None):
+        """Ghi video vừa tạo kèm prompt/params (gọi sau khi tải xong)"""
+        path = Path(video_path)
+        stat = path.stat()
+        with self._lock, self._transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO videos (name, size, mtime, prompt, params, duration, indexed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    size = excluded.size, mtime = excluded.mtime,
+                    prompt = COALESCE(excluded.prompt, prompt),
+                    params = COALESCE(excluded.params, params),
+                    duration = excluded.duration, indexed_at = excluded.indexed_at
+                """,
+                (
+                    path.name,
+                    stat.st_size,
+                    stat.st_mtime,
+                    prompt,
+                    json.dumps(params, ensure_ascii=False) if params else None,
+                    probe_mp4_duration(path),
+                    time.time(),
+                ),
+            )
+
+    def set_thumbnail(self, name: str, thumbnail: str):
+        with self._lock, self._transaction() as conn:
+            conn.execute("UPDATE videos SET thumbnail = ? WHERE name = ?", (thumbnail, name))
+
+    def count(self, search: str = None) -> int:
+        where, args = _search_clause(search)
+        with self._transaction() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM videos {where}", args).fetchone()[0]
+
+    def page(self, offset: int = 0, limit: int = 10, search: str = None) -> list:
+        """Danh sách video mới nhất trước, có phân trang và tìm theo tên/prompt"""
+        where, args = _search_clause(search)
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM videos {where} ORDER BY mtime DESC LIMIT ? OFFSET ?",
+                (*args, limit, offset),
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def remove(self, name: str):
+        with self._lock, self._transaction() as conn:
+            conn.execute("DELETE FROM videos WHERE name = ?", (name,))
+
+    def names(self) -> list:
+        with self._transaction() as conn:
+            return [row["name"] for row in conn.execute("SELECT name FROM videos")]
+
+
+def _search_clause(search: str):
+    if not search or not search.strip():
+        return "", ()
+    pattern = f"%{search.strip()}%"
+    return "WHERE name LIKE ? OR prompt LIKE ?", (pattern, pattern)
+
+
+def _row_to_dict(row: sqlite3.Row) -> dict:
+    item = dict(row)
+    item["params"] = json.loads(item["params"]) if item["params"] else None
+    return item
@@ -0,0 +1,347 @@
+"""
+Lõi tạo video, không phụ thuộc Streamlit.
+
+Gom các bước trước đây nằm trong main() của app.py:
+  - gửi prompt thành job (JobManager gọi webhook n8n, chờ callback/poll) hoặc trả ngay
+    từ ResultCache nếu cùng prompt + params đã có video,
+  - trích URL video từ response (extractors.py),
+  - tải / ghép nhiều clip, tối ưu cho web, đóng gói HLS,
+  - lưu cache kết quả, chỉ mục thư viện và thumbnail ngay khi job thành công.
+
+app.py (UI) và video_api.py (HTTP API) là hai client mỏng dùng chung một VideoService:
+    service = VideoService(Path("generated_videos"), webhook_url)
+    service.register_routes()          # callback job + /media trên sidecar
+    service.start()                    # chạy sidecar, tiếp tục job dở
+    submission = service.submit(prompt, params, owner="...")
+    outcome = service.materialize(submission.job_id)   # chặn đến khi có file local
+
+Việc tải file chạy trên thread pool riêng và gộp theo job id: UI và API cùng hỏi một
+job thì chỉ tải một lần.
+"""
+
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import sidecar
+from downloader import download_file, download_many
+from job_store import SqliteJobStore
+from jobs import JOB_SUCCEEDED, Job, JobManager
+from log_utils import get_logger, set_correlation_id, truncate
+from media_server import MEDIA_BASE_URL, MediaServer
+from postprocess import submit_finalize, submit_merge
+from renditions import master_playlist, remove_hls, submit_package
+from resources import lazy_import
+from result_cache import ResultCache
+from scheduler import Scheduler
+from thumbnails import ThumbnailPipeline
+from tracing import start_span
+from video_index import VideoIndex
+
+# pydantic (~0.1 s lúc import) chỉ cần khi đã có kết quả từ n8n
+extractors = lazy_import("extractors")
+
+log = get_logger("video_service")
+
+MATERIALIZE_WORKERS = int(os.environ.get("MATERIALIZE_WORKERS", "2"))
+# Lần tải trước lỗi thì chờ chừng này giây mới thử lại (tránh client poll liên tục gây tải lại liên tục)
+MATERIALIZE_RETRY_SECONDS = int(os.environ.get("MATERIALIZE_RETRY_SECONDS", "60"))
+# Số kết quả tải gần nhất giữ lại để UI/API đọc
+_MAX_TRACKED_MATERIALIZATIONS = 256
+
+# Thư mục video → VideoService dùng chung trong process (xem shared_service)
+_services = {}
+_services_lock = threading.Lock()
+
+
+@dataclass
+class Submission:
+    job_id: str = None
+    # Kết quả ResultCache.get() khi cùng prompt + params đã có video (không tạo job)
+    cached: dict = None
+
+
+@dataclass
+class VideoOutcome:
+    """Kết quả xử lý response của một job đã xong"""
+    response: object = None
+    videos: list = field(default_factory=list)
+    filename: str = None
+    video_path: str = None
+    error: str = None
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.video_path) and os.path.exists(self.video_path)
+
+
+class VideoService:
+    def __init__(
+        self,
+        video_dir: Path,
+        webhook_url: str,
+        callback_base_url: str = None,
+        media_base_url: str = MEDIA_BASE_URL,
+        scheduler: Scheduler = None,
+    ):
+        self.video_dir = Path(video_dir)
+        self.video_dir.mkdir(parents=True, exist_ok=True)
+        # Job lưu trong SQLite nên restart container không làm mất job đang chạy/đã xong
+        store = SqliteJobStore(self.video_dir / ".cache" / "jobs.db")
+        self.jobs = JobManager(
+            webhook_url,
+            callback_base_url=callback_base_url,
+            store=store,
+            scheduler=scheduler,
+            on_finished=self._on_job_finished,
+        )
+        self.media = MediaServer(self.video_dir, media_base_url)
+        self.results = ResultCache(self.video_dir)
+        self.index = VideoIndex(self.video_dir)
+        self.thumbnails = ThumbnailPipeline(self.video_dir, on_ready=self.index.set_thumbnail)
+        self._executor = ThreadPoolExecutor(MATERIALIZE_WORKERS, thread_name_prefix="materialize")
+        # job id → (thời điểm bắt đầu, Future[VideoOutcome]) theo thứ tự cũ → mới
+        self._materializations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register_routes(self):
+        """Endpoint callback/tiến độ của job và /media trên sidecar (gọi trước start())"""
+        self.jobs.register_routes()
+        self.media.register_routes()
+
+    def start(self, host: str = sidecar.SIDECAR_HOST, port: int = sidecar.SIDECAR_PORT) -> bool:
+        """Chạy sidecar rồi tiếp tục các job chưa xong; trả về False nếu sidecar không bind được"""
+        started = sidecar.start(host, port)
+        self.jobs.resume()
+        return started
+
+    # ---------- Tạo video ----------
+
+    def submit(self, prompt: str, params: dict = None, owner: str = None) -> Submission:
+        """Cùng prompt + params đã từng tạo → trả về ngay từ cache, ngược lại tạo job"""
+        cached = self.results.get(prompt, params)
+        if cached:
+            return Submission(cached=cached)
+        return Submission(job_id=self.jobs.submit(prompt, params, owner=owner))
+
+    def get(self, job_id: str) -> Job:
+        return self.jobs.get(job_id)
+
+    def _on_job_finished(self, job: Job):
+        """Job thành công → tải video và lưu cache ngay, không đợi UI/API hỏi kết quả
+
+        Job của batch hay job API không ai gọi /result vẫn vào ResultCache, nên lần gửi
+        lại cùng prompt + params trả về ngay.
+        """
+        if job.status == JOB_SUCCEEDED:
+            self.submit_materialize(job.id)
+
+    def extract(self, response_data) -> list:
+        """Các video (VideoRef) trong response của n8n, xem extractors.py cho các dạng được hỗ trợ"""
+        log.debug("Xử lý response data", extra={"type": type(response_data).__name__, "body": truncate(response_data)})
+        with start_span("extract_video_url", {"response.type": type(response_data).__name__}) as span:
+            videos = extractors.extract_videos(response_data)
+            span.set_attribute("video.found", bool(videos))
+            span.set_attribute("video.count", len(videos))
+        if videos:
+            log.info("Tìm thấy video URL", extra={"count": len(videos), "urls": [v.url for v in videos]})
+        else:
+            log.warning("Không tìm thấy video URL trong response", extra={"type": type(response_data).__name__})
+        return videos
+
+    def output_filename(self, job: Job, videos: list) -> str:
+        """Tên file local: tên của video (hoặc merged_… khi phải ghép nhiều clip) kèm id job
+
+        n8n hay đặt cùng một tên cho các video khác nhau; có id job thì file đã có trên đĩa
+        chắc chắn là của chính job này, không phải video của prompt khác trùng tên.
+        """
+        if len(videos) == 1:
+            stem = Path(videos[0].filename("video")).stem
+            return extractors.safe_filename(f"{stem}_{job.id[:8]}", f"video_{job.id[:8]}")
+        first_stem = Path(videos[0].filename("video")).stem
+        return extractors.safe_filename(f"merged_{first_stem}_{job.id[:8]}", f"merged_{job.id[:8]}")
+
+    def materialize(self, job_id: str) -> VideoOutcome:
+        """Tải/ghép/tối ưu video của job đã xong và trả về file local (chặn đến khi xong)"""
+        return self.submit_materialize(job_id).result()
+
+    def submit_materialize(self, job_id: str) -> Future:
+        """Như materialize() nhưng trả về Future; job đang được xử lý thì dùng chung Future đó"""
+        with self._lock:
+            entry = self._materializations.get(job_id)
+            if entry is not None:
+                started_at, future = entry
+                # Lần trước lỗi (mạng, link hết hạn...) hoặc file đã bị xoá thì cho xử lý lại
+                failed = future.done() and (future.exception() is not None or not future.result().ready)
+                if not failed or time.time() - started_at < MATERIALIZE_RETRY_SECONDS:
+                    return future
+                del self._materializations[job_id]
+            future = self._executor.submit(self._materialize, job_id)
+            self._materializations[job_id] = (time.time(), future)
+            while len(self._materializations) > _MAX_TRACKED_MATERIALIZATIONS:
+                self._materializations.popitem(last=False)
+        return future
+
+    def _materialize(self, job_id: str) -> VideoOutcome:
+        # Thread của pool được dùng lại giữa các job → gắn lại correlation id mỗi lần
+        set_correlation_id(job_id)
+        job = self.jobs.get(job_id)
+        if job is None or job.status != JOB_SUCCEEDED:
+            return VideoOutcome(error="Job không tồn tại hoặc chưa thành công")
+        outcome = VideoOutcome(response=job.result)
+        with start_span("materialize_video", {"job.id": job_id}, parent=job.trace_parent) as span:
+            try:
+                outcome.videos = self.extract(job.result)
+                if not outcome.videos:
+                    outcome.error = "Không tìm thấy URL video trong response. Vui lòng kiểm tra n8n workflow."
+                    return outcome
+                outcome.filename = self.output_filename(job, outcome.videos)
+                filepath = self.video_dir / outcome.filename
+                # Job mở lại đã có file local thì dùng luôn, không tải lại
+                if job.video_path and os.path.exists(job.video_path):
+                    outcome.video_path = job.video_path
+                    return outcome
+                if filepath.exists():
+                    # Lần xử lý trước của cùng job đã tải xong (tên file gắn id job)
+                    log.info("File của job đã có, không tải lại", extra={"file": str(filepath)})
+                else:
+                    if len(outcome.videos) == 1:
+                        self._download(outcome.videos[0].url, filepath)
+                    else:
+                        self._download_and_merge(outcome.videos, filepath)
+                    if not filepath.exists():
+                        outcome.error = "Không thể tải video về. Vui lòng thử lại."
+                        return outcome
+                    self._finalize(filepath)
+                # Lưu vào cache để lần sau cùng prompt + params trả về ngay
+                self.results.put(job.prompt, job.params, filepath, job.result)
+                self.jobs.attach_file(job.id, filepath)
+                self.index.record(filepath, job.prompt, job.params)
+                self.thumbnails.submit(filepath.name)
+                outcome.video_path = str(filepath)
+            except Exception as e:
+                span.record_exception(e)
+                log.exception("Lỗi khi tải/xử lý video", extra={"file": outcome.filename})
+                outcome.error = f"Lỗi khi tải video: {e}"
+            return outcome
+
+    def _download(self, url: str, filepath: Path):
+        with start_span("download_video_from_url", {"http.url": url}) as span:
+            log.info("Bắt đầu tải video", extra={"url": url, "file": str(filepath)})
+            start_time = time.time()
+
+            def log_progress(downloaded: int, total: int):
+                # downloader đã giới hạn 1 lần/giây; chỉ giữ lại một phần khi ghi log
+                log.debug("Đang tải", extra={"downloaded": downloaded, "total": total, "sample": 0.2})
+
+            # Song song theo Range nếu server hỗ trợ, ghi vào .part rồi rename
+            download_file(url, filepath, progress_cb=log_progress)
+            file_size = os.path.getsize(filepath)
+            span.set_attribute("download.bytes", file_size)
+            log.info("Tải video xong", extra={"file": str(filepath), "bytes": file_size, "elapsed": round(time.time() - start_time, 2)})
+
+    def _download_and_merge(self, videos: list, output: Path):
+        """Tải song song mọi clip rồi ghép theo thứ tự thành một file"""
+        with start_span("download_and_merge_videos", {"video.count": len(videos), "file": output.name}):
+            # Clip để trong thư mục ẩn (không hiện trong gallery); tải dở thì lần sau tiếp tục
+            clip_dir = self.video_dir / ".clips" / output.stem
+            clip_dir.mkdir(parents=True, exist_ok=True)
+            items = [
+                (video.url, clip_dir / f"{index:03d}_{video.filename(f'clip_{index}')}")
+                for index, video in enumerate(videos)
+            ]
+            start_time = time.time()
+            clips = download_many(items)
+            action = submit_merge(clips, output).result()
+            shutil.rmtree(clip_dir, ignore_errors=True)
+            log.info("Đã ghép video", extra={"file": str(output), "clips": len(clips), "action": action, "elapsed": round(time.time() - start_time, 2)})
+
+    def _finalize(self, filepath: Path):
+        """Remux (faststart) / transcode H.264 khi cần, rồi đóng gói HLS chạy nền"""
+        try:
+            action = submit_finalize(str(filepath)).result()
+            log.info("Hậu xử lý video xong", extra={"video": filepath.name, "action": action})
+        except Exception as e:
+            # Không chặn hiển thị: vẫn dùng file gốc nếu hậu xử lý lỗi
+            log.warning("Hậu xử lý video lỗi, dùng file gốc", extra={"video": filepath.name, "error": truncate(str(e), 500)})
+        future = submit_package(str(filepath))
+        if future is None:
+            return
+
+        def log_result(done):
+            if done.exception():
+                log.warning("Đóng gói HLS lỗi", extra={"video": filepath.name, "error": truncate(str(done.exception()), 500)})
+            else:
+                log.info("Đã đóng gói HLS", extra={"master": done.result()})
+
+        future.add_done_callback(log_result)
+
+    # ---------- Thư viện ----------
+
+    def links(self, video_path) -> dict:
+        """Link xem/tải/HLS của video qua sidecar"""
+        name = os.path.basename(video_path)
+        master = master_playlist(self.video_dir, name)
+        return {
+            "name": name,
+            "size": os.path.getsize(video_path),
+            "url": self.media.url_for(video_path),
+            "download_url": self.media.url_for(video_path, download=True),
+            "hls_url": self.media.url_for(master) if master else None,
+        }
+
+    def describe(self, job: Job) -> dict:
+        """Trạng thái job dạng JSON cho API"""
+        info = {
+            "id": job.id,
+            "status": job.status,
+            "stage": job.stage,
+            "progress": job.progress,
+            "message": job.stage_message,
+            "prompt": job.prompt,
+            "params": job.params,
+            "created_at": job.created_at,
+            "updated_at": job.updated_at,
+            "error": job.error,
+            "queue_position": self.jobs.queue_position(job.id),
+        }
+        if job.video_path and os.path.exists(job.video_path):
+            info["video"] = self.links(job.video_path)
+        return info
+
+    def delete_video(self, name: str):
+        """Xoá video khỏi thư viện cùng thumbnail, bản HLS và entry cache trỏ tới nó"""
+        (self.video_dir / name).unlink(missing_ok=True)
+        # Không thì lần gửi lại cùng prompt sẽ khôi phục video vừa xoá từ bản cache
+        self.results.remove_video(name)
+        self.index.remove(name)
+        self.thumbnails.remove(name)
+        remove_hls(self.video_dir, name)
+
+    def delete_all(self):
+        for video in self.video_dir.glob("*.mp4"):
+            video.unlink()
+            self.thumbnails.remove(video.name)
+            remove_hls(self.video_dir, video.name)
+        self.results.clear()
+        self.index.sync(force=True)
+
+
+def shared_service(video_dir: Path, webhook_url: str, **kwargs) -> VideoService:
+    """VideoService duy nhất của thư mục này trong process, tạo ở lần gọi đầu
+
+    @st.cache_resource có thể chạy lại (xoá cache, sửa code) trong khi sidecar và job của
+    service cũ vẫn chạy; service thứ hai trên cùng jobs.db sẽ giữ một bản trạng thái job
+    khác và nhận callback thay cho JobManager đang chờ.
+    """
+    key = Path(video_dir).resolve()
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = _services[key] = VideoService(video_dir, webhook_url, **kwargs)
+        return service